@@ -1,69 +1,34 @@
 import os
-import shutil
-import base64
+import time
 import hashlib
-from datetime import datetime
 import streamlit as st
-import sqlite3
-import re
-import fitz
-
-# Banco de dados SQLite
-conn = sqlite3.connect('document_manager.db', check_same_thread=False)
-c = conn.cursor()
-c.execute('''CREATE TABLE IF NOT EXISTS users (
-    username TEXT PRIMARY KEY,
-    password TEXT,
-    projects TEXT,
-    permissions TEXT
-)''')
-c.execute('''CREATE TABLE IF NOT EXISTS logs (
-    timestamp TEXT,
-    user TEXT,
-    action TEXT,
-    file TEXT
-)''')
-c.execute('''CREATE TABLE IF NOT EXISTS clients (
-    name TEXT PRIMARY KEY
-)''')
-c.execute('''CREATE TABLE IF NOT EXISTS projects (
-    name TEXT PRIMARY KEY,
-    client TEXT
-)''')
-# Tabela de comentários
-c.execute('''
-CREATE TABLE IF NOT EXISTS comments (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    file_path TEXT,
-    username TEXT,
-    timestamp TEXT,
-    comment TEXT
-)
-''')
-conn.commit()
-BASE_DIR = "uploads"
-os.makedirs(BASE_DIR, exist_ok=True)
+from gestao import metrics, servicos as camada_servicos
+from gestao.revisions import extrair_info_arquivo
+
+# Cronometragem desta execução (rerun): spans por seção e consultas SQL
+metrics.iniciar_execucao()
+
+# Serviços criados uma vez por processo: esquema, caches, fila e servidor de
+# arquivos. A cada rerun só se obtém a conexão da thread atual.
+@st.cache_resource
+def iniciar_servicos():
+    return camada_servicos.Servicos().iniciar()
+
+servicos = iniciar_servicos()
+BASE_DIR = servicos.base_dir
+# Links com o host pelo qual este navegador chegou ao app (GESTAO_FILES_URL tem precedência)
+_contexto = getattr(st, "context", None)
+servidor_arquivos = servicos.servidor_arquivos.para_host(_contexto.headers.get("Host") if _contexto else None)
 
 if "disciplinas" not in st.session_state:
-    st.session_state.disciplinas = ["GES", "PRO", "MEC", "MET", "CIV", "ELE", "AEI"]
+    st.session_state.disciplinas = list(camada_servicos.DISCIPLINAS_PADRAO)
 if "fases" not in st.session_state:
-    st.session_state.fases = ["FEL1", "FEL2", "FEL3", "Executivo"]
+    st.session_state.fases = list(camada_servicos.FASES_PADRAO)
 if "projetos_registrados" not in st.session_state:
     st.session_state.projetos_registrados = []
 if "clientes_registrados" not in st.session_state:
     st.session_state.clientes_registrados = []
 
-def get_project_path(project, discipline, phase):
-    path = os.path.join(BASE_DIR, project, discipline, phase)
-    os.makedirs(path, exist_ok=True)
-    return path
-
-def log_action(user, action, file, note=None):
-    log_entry = f"{file} ({note})" if note else file
-    c.execute("INSERT INTO logs (timestamp, user, action, file) VALUES (?, ?, ?, ?)",
-              (datetime.now().isoformat(), user, action, log_entry))
-    conn.commit()
-
 def file_icon(file_name):
     if file_name.lower().endswith(".pdf"):
         return "📄"
@@ -75,28 +40,146 @@ def file_icon(file_name):
 def hash_key(text):
     return hashlib.md5(text.encode()).hexdigest()
 
-def extrair_info_arquivo(nome_arquivo):
-    padrao = r"(.+?)r(\d+)v(\d+).*?\.\w+$"
-    match = re.match(padrao, nome_arquivo)
-    if match:
-        nome_base = match.group(1).rstrip(" _-")
-        revisao = f"r{match.group(2)}"
-        versao = f"v{match.group(3)}"
-        return nome_base, revisao, versao
-    return None, None, None
-
-def salvar_comentario(file_path, username, comment):
-    timestamp = datetime.now().isoformat()
-    c.execute('''INSERT INTO comments (file_path, username, timestamp, comment)
-                 VALUES (?, ?, ?, ?)''', (file_path, username, timestamp, comment))
-    conn.commit()
-    log_action(username, "comentário", file_path)
-
-def obter_comentarios(file_path):
-    return c.execute('''SELECT username, timestamp, comment
-                        FROM comments
-                        WHERE file_path=?
-                        ORDER BY timestamp DESC''', (file_path,)).fetchall()
+TAMANHO_PAGINA_ARVORE = 20
+TAMANHO_PAGINA_COMENTARIOS = 20
+PREVIAS_POR_BUSCA = 10
+BUSCA_LIMITE = int(os.environ.get("GESTAO_BUSCA_LIMITE", 100))
+BUSCA_ORCAMENTO_S = float(os.environ.get("GESTAO_BUSCA_ORCAMENTO", 3.0))
+ORDENACOES_ARVORE = {"Nome": "nome", "Revisão": "revisao", "Data de modificação": "mtime"}
+
+def no_aberto(rotulo, chave, nivel=0):
+    # Nós da árvore só materializam os filhos quando abertos pelo usuário
+    return st.checkbox("\u2003" * nivel + rotulo, key=hash_key("arv_" + chave))
+
+@metrics.medido("arvore")
+def render_arvore_projeto(proj, username, user_permissions, chave="", nivel=0):
+    chave = f"{chave}/{proj}"
+    if not no_aberto(f"📁 Projeto: {proj}", chave, nivel):
+        return
+
+    for disc in servicos.listar_disciplinas(proj):
+        chave_disc = f"{chave}/{disc}"
+        if not no_aberto(f"📂 Disciplina: {disc}", chave_disc, nivel + 1):
+            continue
+        if "download" in user_permissions:
+            url_zip = servidor_arquivos.url_zip(os.path.join(BASE_DIR, proj, disc))
+            st.markdown(f'<a href="{url_zip}">📦 Baixar disciplina {disc} (.zip)</a>', unsafe_allow_html=True)
+        for fase in servicos.listar_fases(proj, disc):
+            chave_fase = f"{chave_disc}/{fase}"
+            if no_aberto(f"📄 Fase: {fase}", chave_fase, nivel + 2):
+                with st.container():
+                    render_fase(proj, disc, fase, username, user_permissions, chave_fase)
+
+@metrics.medido("arvore.fase")
+def render_fase(proj, disc, fase, username, user_permissions, chave):
+    total = servicos.contar_arquivos(proj, disc, fase)
+    if not total:
+        st.info("Nenhum arquivo nesta fase.")
+        return
+    total_paginas = (total + TAMANHO_PAGINA_ARVORE - 1) // TAMANHO_PAGINA_ARVORE
+    col1, col2 = st.columns(2)
+    with col1:
+        ordem = st.selectbox("Ordenar por", list(ORDENACOES_ARVORE), key=hash_key("ordem_" + chave))
+    with col2:
+        pagina = st.number_input(f"Página (de {total_paginas})", min_value=1, max_value=total_paginas,
+                                 value=1, step=1, key=hash_key("pag_" + chave))
+
+    arquivos = servicos.listar_arquivos(proj, disc, fase, ORDENACOES_ARVORE[ordem],
+                                       TAMANHO_PAGINA_ARVORE, (pagina - 1) * TAMANHO_PAGINA_ARVORE)
+    st.caption(f"{total} arquivo(s)")
+    if "download" in user_permissions:
+        url_zip = servidor_arquivos.url_zip(os.path.join(BASE_DIR, proj, disc, fase))
+        st.markdown(f'<a href="{url_zip}">📦 Baixar fase {fase} (.zip)</a>', unsafe_allow_html=True)
+    mostrar_miniaturas = st.checkbox("🖼️ Mostrar miniaturas", key=hash_key("mini_" + chave))
+    # Total e último comentário de todos os arquivos da página numa só consulta
+    resumo_comentarios = servicos.resumo_comentarios([a[0] for a in arquivos])
+    for document_id, full_path, file, _, _, _, _, sha256 in arquivos:
+        links = []
+        if file.lower().endswith(".pdf"):
+            links.append(f'<a href="{servidor_arquivos.url(full_path)}" target="_blank">👁️ Visualizar PDF</a>')
+        if "download" in user_permissions:
+            links.append(f'<a href="{servidor_arquivos.url(full_path, download=True)}">📥 Baixar</a>')
+        st.markdown(f"- `{file}` " + " · ".join(links), unsafe_allow_html=True)
+        if mostrar_miniaturas and sha256:
+            miniatura = servicos.miniatura(full_path, sha256)
+            if miniatura:
+                st.image(miniatura, width=160)
+
+        # Seção de Comentários (a conversa só é carregada quando aberta)
+        total_coment, ultimo_autor, ultima_data, ultimo_texto = resumo_comentarios.get(document_id, (0, None, None, None))
+        if total_coment:
+            st.caption(f"💬 {total_coment} comentário(s) · último de **{ultimo_autor}** "
+                       f"({ultima_data[:16]}): {ultimo_texto[:80]}")
+        # Conversa já carregada: (comentários, cursor da próxima página), por id do documento
+        conversa_key = hash_key(f"pag_coment_{document_id}")
+        if not st.checkbox("💬 Comentários", key=hash_key("ver_coment_" + chave + full_path)):
+            # Fechada: ao reabrir, a conversa é lida de novo a partir do mais recente
+            st.session_state.pop(conversa_key, None)
+        else:
+            # Chaves pelo id do documento: continuam valendo depois do arquivamento
+            comentario_key = hash_key(f"coment_{document_id}")
+            botao_key = hash_key(f"btn_com_{document_id}")
+
+            st.markdown("##### Novo Comentário")
+            novo_coment = st.text_area("Digite seu comentário", key=comentario_key)
+
+            if st.button("Enviar comentário", key=botao_key):
+                if novo_coment.strip():
+                    servicos.salvar_comentario(full_path, username, novo_coment.strip(), document_id)
+                    st.session_state.pop(conversa_key, None)
+                    st.success("Comentário salvo com sucesso.")
+                    st.rerun()
+                else:
+                    st.warning("Comentário vazio não será salvo.")
+
+            st.markdown("##### Comentários Anteriores")
+            if conversa_key not in st.session_state:
+                st.session_state[conversa_key] = servicos.obter_comentarios(
+                    document_id, limite=TAMANHO_PAGINA_COMENTARIOS)
+            comentarios, cursor = st.session_state[conversa_key]
+            if comentarios:
+                for _, user, time, text in comentarios:
+                    st.markdown(f"**{user}** ({time[:19]}):")
+                    st.markdown(f"> {text}")
+                    st.markdown("---")
+                if cursor and st.button("Carregar comentários mais antigos", key=hash_key(f"mais_coment_{document_id}")):
+                    # Só a página seguinte ao último comentário exibido (keyset)
+                    antigos, cursor = servicos.obter_comentarios(document_id, cursor, TAMANHO_PAGINA_COMENTARIOS)
+                    st.session_state[conversa_key] = (comentarios + antigos, cursor)
+                    st.rerun()
+            else:
+                st.info("Nenhum comentário ainda.")
+
+def render_resultado_busca(resultado, posicao, username, user_permissions):
+    file = resultado["path"]
+    st.write(f"📄 {os.path.relpath(file, BASE_DIR)}")
+    if resultado["aproximado"]:
+        st.caption("≈ Nome semelhante ao termo buscado.")
+    for pagina, trecho in resultado["paginas"][:5]:
+        st.caption(f"Página {pagina}: {trecho}")
+    links = []
+    doc = servicos.obter_documento(file)
+    if doc and doc[6]:
+        st.caption("🧊 No armazenamento frio: volta para o disco ao ser aberto.")
+    if doc and doc[5] and posicao < PREVIAS_POR_BUSCA:
+        # Prévia reduzida (página do primeiro resultado, no caso de PDFs)
+        pagina = resultado["paginas"][0][0] if resultado["paginas"] else 1
+        miniatura = servicos.miniatura(file, doc[5], pagina)
+        if miniatura:
+            st.image(miniatura, caption=os.path.basename(file), width=200)
+    if file.lower().endswith(".pdf"):
+        links.append(f'<a href="{servidor_arquivos.url(file)}" target="_blank">👁️ Visualizar PDF</a>')
+        rotulo_download = "📥 Baixar PDF"
+    elif file.lower().endswith(('.jpg', '.jpeg', '.png')):
+        links.append(f'<a href="{servidor_arquivos.url(file)}" target="_blank">🖼️ Abrir Imagem</a>')
+        rotulo_download = "📥 Baixar Imagem"
+    else:
+        rotulo_download = "📥 Baixar Arquivo"
+    if "download" in user_permissions:
+        links.append(f'<a href="{servidor_arquivos.url(file, download=True)}">{rotulo_download}</a>')
+    if links:
+        st.markdown(" · ".join(links), unsafe_allow_html=True)
+    servicos.registrar_acao(username, "visualizar", file)
 
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
@@ -116,8 +199,9 @@ if not st.session_state.authenticated and not st.session_state.registration_mode
     login_user = st.text_input("Usuário")
     login_pass = st.text_input("Senha", type="password")
     if st.button("Entrar"):
-        result = c.execute("SELECT * FROM users WHERE username=? AND password=?", (login_user, login_pass)).fetchone()
-        if result:
+        with metrics.medir("login"):
+            autenticado = servicos.autenticar(login_user, login_pass)
+        if autenticado:
             st.session_state.authenticated = True
             st.session_state.username = login_user
             st.rerun()
@@ -147,12 +231,9 @@ elif st.session_state.registration_mode and not st.session_state.authenticated:
         new_user = st.text_input("Novo Usuário")
         new_pass = st.text_input("Nova Senha", type="password")
         if st.button("Criar usuário"):
-            if c.execute("SELECT * FROM users WHERE username=?", (new_user,)).fetchone():
+            if not servicos.criar_usuario(new_user, new_pass):
                 st.error("Usuário já existe.")
             else:
-                c.execute("INSERT INTO users (username, password, projects, permissions) VALUES (?, ?, ?, ?)",
-                          (new_user, new_pass, '', 'upload,view'))
-                conn.commit()
                 st.success("Usuário registrado com permissões padrão [upload, view].")
                 st.session_state.registration_mode = False
                 st.session_state.registration_unlocked = False
@@ -182,22 +263,18 @@ elif st.session_state.admin_mode and st.session_state.admin_authenticated:
     st.markdown("### ➕ Cadastrar Cliente")
     novo_cliente = st.text_input("Novo Cliente")
     if st.button("Adicionar Cliente") and novo_cliente:
-        if not c.execute("SELECT * FROM clients WHERE name=?", (novo_cliente,)).fetchone():
-            c.execute("INSERT INTO clients (name) VALUES (?)", (novo_cliente,))
-            conn.commit()
+        if servicos.adicionar_cliente(novo_cliente):
             st.success(f"Cliente '{novo_cliente}' adicionado.")
         else:
             st.warning("Cliente já existe.")
 
     st.markdown("### ➕ Cadastrar Projeto")
     novo_proj = st.text_input("Novo Projeto")
-    clientes = [row[0] for row in c.execute("SELECT name FROM clients").fetchall()]
+    clientes = servicos.listar_clientes()
     cliente_selecionado = st.selectbox("Cliente do Projeto", clientes) if clientes else None
 
     if st.button("Adicionar Projeto") and novo_proj and cliente_selecionado:
-        if not c.execute("SELECT * FROM projects WHERE name=?", (novo_proj,)).fetchone():
-            c.execute("INSERT INTO projects (name, client) VALUES (?, ?)", (novo_proj, cliente_selecionado))
-            conn.commit()
+        if servicos.adicionar_projeto(novo_proj, cliente_selecionado):
             st.session_state.projetos_registrados.append(novo_proj)
             st.success(f"Projeto '{novo_proj}' vinculado ao cliente '{cliente_selecionado}' adicionado.")
         else:
@@ -219,40 +296,115 @@ elif st.session_state.admin_mode and st.session_state.admin_authenticated:
         else:
             st.warning("Fase já existe.")
 
+    st.markdown("### 🗂️ Índice e Catálogo de Documentos")
+    if st.button("Reindexar documentos"):
+        alterados, removidos = servicos.reindexar()
+        st.success(f"{alterados} arquivo(s) enviados para indexação, {removidos} removido(s) do índice.")
+    if st.button("Verificar alterações no disco"):
+        with st.spinner("Relistando pastas alteradas..."):
+            mudancas = servicos.sincronizar_disco(completo=True)
+        st.success(f"{len(mudancas.adicionados)} novo(s), {len(mudancas.alterados)} alterado(s), "
+                   f"{len(mudancas.removidos)} removido(s) em {mudancas.pastas_total} pasta(s).")
+    st.caption("Alterações feitas direto no compartilhamento: "
+               + ("detectadas por eventos do sistema de arquivos." if servicos.observador.usando_eventos
+                  else f"verificadas a cada {servicos.observador.intervalo:.0f}s."))
+    if st.button("Reconciliar catálogo com o disco"):
+        with st.spinner("Comparando catálogo com o disco..."):
+            total, removidos = servicos.reconciliar()
+        st.success(f"Catálogo: {total} documento(s), {removidos} removido(s).")
+    st.markdown("### 🧊 Armazenamento Frio")
+    col1, col2 = st.columns(2)
+    with col1:
+        dias_frio = st.number_input("Revisões arquivadas há mais de N dias", min_value=0,
+                                    value=camada_servicos.DIAS_FRIO_PADRAO, step=30)
+    with col2:
+        manter_frio = st.number_input("Manter no disco as N revisões arquivadas mais recentes", min_value=0,
+                                      value=camada_servicos.MANTER_FRIO_PADRAO, step=1)
+    if st.button("Mover revisões antigas para o armazenamento frio"):
+        with st.spinner("Comprimindo e movendo revisões..."):
+            movidos, originais, comprimidos, erros = servicos.congelar_revisoes(int(dias_frio), int(manter_frio))
+        st.success(f"{movidos} revisão(ões) movida(s): {originais / 1024 / 1024:.1f} MB liberados no disco, "
+                   f"{comprimidos / 1024 / 1024:.1f} MB no armazenamento frio.")
+        for caminho, erro in erros[:20]:
+            st.warning(f"`{caminho}`: {erro}")
+    total_frio, tamanho_frio = servicos.resumo_frio()
+    st.caption(f"{total_frio} revisão(ões) no armazenamento frio ({tamanho_frio / 1024 / 1024:.1f} MB originais) "
+               f"em `{servicos.frio_destino}`.")
+    if st.button("Liberar conteúdo não referenciado"):
+        removidos, liberados = servicos.coletar_blobs()
+        st.success(f"{removidos} blob(s) removido(s), {liberados / 1024 / 1024:.1f} MB liberados.")
+    pendentes, executando, com_erro = servicos.resumo_fila()
+    st.caption(f"Fila de processamento: {pendentes} pendente(s), {executando} em execução, {com_erro} com erro.")
+    for caminho, erro in servicos.erros_indexacao():
+        st.warning(f"Erro ao ler PDF `{caminho}`: {erro}")
+
+    st.markdown("### 📜 Arquivamento do Histórico")
+    manter_meses = st.number_input("Manter no banco os últimos N meses", min_value=1, value=6, step=1)
+    if st.button("Arquivar logs antigos"):
+        arquivados = servicos.arquivar_logs(int(manter_meses))
+        st.success(f"{sum(arquivados.values())} registro(s) arquivado(s) em {len(arquivados)} mês(es).")
+    for mes, caminho, linhas, _ in servicos.arquivos_logs()[:12]:
+        st.caption(f"{mes}: {linhas} registro(s) em `{caminho}`")
+
     filtro = st.text_input("🔍 Filtrar usuários por nome")
-    usuarios = c.execute("SELECT username, projects, permissions FROM users").fetchall()
-    usuarios = [u for u in usuarios if filtro.lower() in u[0].lower()] if filtro else usuarios
+    opcoes_projetos = list(servicos.listar_projetos())
 
-    for user, projetos_atuais, permissoes_atuais in usuarios:
+    for user, permissoes_atuais, projetos_atuais in servicos.listar_usuarios(filtro):
         st.markdown(f"#### 👤 {user}")
         col1, col2 = st.columns([1, 2])
         with col1:
             if st.button(f"Excluir {user}", key=hash_key(f"del_{user}")):
-                c.execute("DELETE FROM users WHERE username=?", (user,))
-                conn.commit()
+                servicos.excluir_usuario(user)
                 st.success(f"Usuário {user} removido.")
                 st.rerun()
         with col2:
             projetos = st.multiselect(f"Projetos ({user})",
-                                      options=[p[0] for p in c.execute("SELECT name FROM projects").fetchall()],
-                                      default=projetos_atuais.split(',') if projetos_atuais else [],
+                                      options=opcoes_projetos,
+                                      default=projetos_atuais,
                                       key=hash_key(f"proj_{user}"))
             permissoes = st.multiselect(f"Permissões ({user})",
-                                        options=["upload", "download", "view"],
-                                        default=permissoes_atuais.split(',') if permissoes_atuais else [],
+                                        options=camada_servicos.PERMISSOES,
+                                        default=permissoes_atuais,
                                         key=hash_key(f"perm_{user}"))
             nova_senha = st.text_input(f"Nova senha ({user})", key=hash_key(f"senha_{user}"))
             if st.button(f"Atualizar permissões/projetos {user}", key=hash_key(f"update_perm_{user}")):
-                if nova_senha:
-                    c.execute("UPDATE users SET password=?, projects=?, permissions=? WHERE username=?",
-                              (nova_senha, ','.join(projetos), ','.join(permissoes), user))
-                else:
-                    c.execute("UPDATE users SET projects=?, permissions=? WHERE username=?",
-                              (','.join(projetos), ','.join(permissoes), user))
-                conn.commit()
+                servicos.atualizar_usuario(user, permissoes, projetos, nova_senha)
                 st.success(f"Permissões/projetos atualizados para {user}.")
                 st.rerun()
 
+    if not servicos.servidor_arquivos.url_configurada:
+        st.warning("GESTAO_FILES_URL não definida: os links de visualização e download apontam para "
+                   f"{servidor_arquivos.url_publica} (porta {servicos.servidor_arquivos.port}, HTTP). "
+                   "Defina o endereço público do servidor de arquivos se o app estiver atrás de proxy "
+                   "ou HTTPS, ou se essa porta não for acessível aos usuários.")
+
+    st.markdown("### ⏱️ Desempenho")
+    st.caption(f"Tempos deste processo (p50/p95 das últimas {metrics.JANELA} amostras por seção). "
+               f"Formato Prometheus em {servidor_arquivos.url_publica}/metrics "
+               "(acesso local ou com o token de GESTAO_METRICS_TOKEN)")
+    resumo_metricas = metrics.resumo()
+    if resumo_metricas:
+        st.table([{"Seção": nome, "Chamadas": contagem, "p50 (ms)": round(p50 * 1000, 1),
+                   "p95 (ms)": round(p95 * 1000, 1), "Máx. (ms)": round(maximo * 1000, 1),
+                   "Total (s)": round(soma, 2)}
+                  for nome, contagem, p50, p95, maximo, soma in resumo_metricas])
+    else:
+        st.info("Nenhuma medição ainda.")
+    if st.checkbox("Últimas execuções da página"):
+        for quando, rotulo, duracao, spans in metrics.execucoes():
+            detalhes = ", ".join(f"{nome} {d * 1000:.0f} ms" for nome, d in spans if nome != "sql")
+            consultas = [d for nome, d in spans if nome == "sql"]
+            st.write(f"{quando} | {rotulo}: {duracao * 1000:.0f} ms "
+                     f"({len(consultas)} consulta(s) SQL, {sum(consultas) * 1000:.0f} ms) {detalhes}")
+    lentas = metrics.consultas_lentas()
+    if lentas:
+        st.markdown(f"##### Consultas SQL acima de {metrics.LIMITE_SQL_LENTO * 1000:.0f} ms")
+        for quando, duracao, sql in lentas[:20]:
+            st.caption(f"{quando} · {duracao * 1000:.0f} ms · `{sql[:300]}`")
+    if st.button("Zerar métricas"):
+        metrics.limpar()
+        st.rerun()
+
     if st.button("Sair do Painel Admin"):
         st.session_state.admin_authenticated = False
         st.session_state.admin_mode = False
@@ -261,9 +413,10 @@ elif st.session_state.admin_mode and st.session_state.admin_authenticated:
 # USUÁRIO AUTENTICADO
 elif st.session_state.authenticated:
     username = st.session_state.username
-    user_data = c.execute("SELECT projects, permissions FROM users WHERE username=?", (username,)).fetchone()
-    user_projects = user_data[0].split(',') if user_data and user_data[0] else []
-    user_permissions = user_data[1].split(',') if user_data and user_data[1] else []
+    with metrics.medir("autorizacao"):
+        contexto = servicos.contexto(username)
+    user_projects = list(contexto.projects)
+    user_permissions = list(contexto.permissions)
 
     st.sidebar.markdown(f"🔐 Logado como: **{username}**")
     if st.sidebar.button("Logout"):
@@ -281,274 +434,152 @@ elif st.session_state.authenticated:
                 project = st.selectbox("Projeto", user_projects)
                 discipline = st.selectbox("Disciplina", st.session_state.disciplinas)
                 phase = st.selectbox("Fase", st.session_state.fases)
-                uploaded_file = st.file_uploader("Escolha o arquivo")
+                uploaded_files = st.file_uploader("Escolha os arquivos", accept_multiple_files=True)
                 confirmar_mesma_revisao = st.checkbox("Confirmo que estou mantendo a mesma revisão e subindo nova versão")
 
-                if uploaded_file:
+                for uploaded_file in uploaded_files or []:
                     nome_base, revisao, versao = extrair_info_arquivo(uploaded_file.name)
                     if nome_base and revisao and versao:
                         st.info(f"🧠 Detecção automática: `{uploaded_file.name}` → Revisão: **{revisao}**, Versão: **{versao}**")
+                        rev_max = servicos.ultima_revisao(project, discipline, phase, nome_base)
+                        if rev_max >= 0:
+                            st.caption(f"Revisão mais recente de `{nome_base}` nesta fase: r{rev_max}")
                     else:
-                        st.error("❌ Nome do arquivo deve conter rXvY (ex: r1v2).")
+                        st.error(f"❌ `{uploaded_file.name}`: nome do arquivo deve conter rXvY (ex: r1v2).")
 
                 submitted = st.form_submit_button("Enviar")
-                if submitted and uploaded_file:
-                    filename = uploaded_file.name
-                    path = get_project_path(project, discipline, phase)
-                    file_path = os.path.join(path, filename)
-
-                    nome_base, revisao, versao = extrair_info_arquivo(filename)
-                    if not nome_base:
-                        st.error("Nome do arquivo deve conter rXvY.")
+                if submitted and uploaded_files:
+                    fontes = {f.name: f for f in uploaded_files}
+                    # Validação do lote inteiro contra o catálogo antes de gravar qualquer arquivo
+                    with metrics.medir("upload.validacao"):
+                        plano = servicos.planejar_envio(project, discipline, phase, [f.name for f in uploaded_files],
+                                                        confirmar_mesma_revisao)
+                    if plano.erros:
+                        for nome, motivo in plano.erros:
+                            st.error(f"❌ `{nome}`: {motivo}")
+                        if plano.requer_confirmacao:
+                            st.warning("⚠️ Mesma revisão detectada com nova versão. Confirme a caixa para prosseguir.")
+                        st.error("Upload não permitido: nenhum arquivo do lote foi gravado.")
                         st.stop()
-                    else:
-                        arquivos_existentes = os.listdir(path)
-                        nomes_existentes = [f for f in arquivos_existentes if f.startswith(nome_base)]
-
-                        revisoes_anteriores = []
-                        for f in nomes_existentes:
-                            base_ant, rev_ant, ver_ant = extrair_info_arquivo(f)
-                            if base_ant == nome_base:
-                                revisoes_anteriores.append((f, rev_ant, ver_ant))
-
-                        # Verificar também revisões na pasta Revisoes/{nome_base}
-                        pasta_revisoes = os.path.join(path, "Revisoes", nome_base)
-                        if os.path.isdir(pasta_revisoes):
-                            for f in os.listdir(pasta_revisoes):
-                                base_ant, rev_ant, ver_ant = extrair_info_arquivo(f)
-                                if base_ant == nome_base:
-                                    revisoes_anteriores.append((f, rev_ant, ver_ant))
-
-                        revisoes_existentes = [int(r[1][1:]) for r in revisoes_anteriores if r[1] and r[1].startswith('r')]
-                        rev_max = max(revisoes_existentes) if revisoes_existentes else -1
-                        rev_atual = int(revisao[1:])
-
-                        if rev_atual < rev_max:
-                            st.error(f"❌ Revisão {revisao} menor que revisão máxima existente (r{rev_max}). Upload não permitido.")
-                            st.stop()
-
-                        if filename in arquivos_existentes:
-                            st.error("Arquivo com este nome completo já existe.")
-                            st.stop()
-                        else:
-                            existe_revisao_anterior = any(r[1] != revisao for r in revisoes_anteriores)
-                            mesma_revisao_outras_versoes = any(r[1] == revisao and r[2] != versao for r in revisoes_anteriores)
-
-                            if existe_revisao_anterior:
-                                pasta_revisao = os.path.join(path, "Revisoes", nome_base)
-                                os.makedirs(pasta_revisao, exist_ok=True)
-                                for f, _, _ in revisoes_anteriores:
-                                    origem = os.path.join(path, f)
-                                    destino = os.path.join(pasta_revisao, f)
-                                    if os.path.exists(origem):
-                                        shutil.move(origem, destino)
-                                st.info(f"🗂️ Arquivos da revisão anterior movidos para `{pasta_revisao}`")
-
-                            elif mesma_revisao_outras_versoes and not confirmar_mesma_revisao:
-                                st.warning("⚠️ Mesma revisão detectada com nova versão. Confirme a caixa para prosseguir.")
-                                st.stop()
-
-                            with open(file_path, "wb") as f:
-                                f.write(uploaded_file.read())
-
-                            st.success(f"✅ Arquivo `{filename}` salvo com sucesso.")
-                            log_action(username, "upload", file_path)
-                            
+
+                    try:
+                        with metrics.medir("upload.gravacao"):
+                            gravados = servicos.enviar(username, project, discipline, phase, plano, fontes)
+                    except OSError as e:
+                        st.error(f"Falha ao gravar o lote ({e}); nenhuma alteração foi mantida.")
+                        st.stop()
+
+                    if plano.arquivar:
+                        st.info(f"🗂️ {len(plano.arquivar)} arquivo(s) da revisão anterior movidos para `{camada_servicos.PASTA_REVISOES}/`")
+                    for file_path, reaproveitado in gravados:
+                        if reaproveitado:
+                            st.info(f"♻️ `{os.path.basename(file_path)}`: conteúdo idêntico já armazenado; reutiliza os mesmos bytes.")
+                    st.success(f"✅ {len(gravados)} arquivo(s) salvo(s) com sucesso.")
+
     # NAVEGAÇÃO NA SIDEBAR: "Meus Projetos" e "Meus Clientes"
     st.sidebar.markdown("### 🔎 Navegação Rápida")
 
+    if "navegacao" not in st.session_state:
+        st.session_state.navegacao = None
     if st.sidebar.button("📁 Meus Projetos"):
+        st.session_state.navegacao = None if st.session_state.navegacao == "projetos" else "projetos"
+    if st.sidebar.button("🏢 Meus Clientes"):
+        st.session_state.navegacao = None if st.session_state.navegacao == "clientes" else "clientes"
+
+    if st.session_state.navegacao == "projetos":
+        st.markdown("### 📁 Meus Projetos")
         for proj in sorted(user_projects):
-            proj_path = os.path.join(BASE_DIR, proj)
-            if not os.path.isdir(proj_path):
+            render_arvore_projeto(proj, username, user_permissions)
+
+    elif st.session_state.navegacao == "clientes":
+        st.markdown("### 🏢 Meus Clientes")
+        for cliente, projetos_cliente in servicos.projetos_por_cliente(username).items():
+            if not no_aberto(f"🏢 Cliente: {cliente}", "cli/" + cliente):
                 continue
+            for proj in projetos_cliente:
+                render_arvore_projeto(proj, username, user_permissions, "cli/" + cliente, nivel=1)
 
-            with st.expander(f"📁 Projeto: {proj}", expanded=False):
-                for disc in sorted(os.listdir(proj_path)):
-                    disc_path = os.path.join(proj_path, disc)
-                    if not os.path.isdir(disc_path):
-                        continue
-
-                    with st.expander(f"📂 Disciplina: {disc}", expanded=False):
-                        for fase in sorted(os.listdir(disc_path)):
-                            fase_path = os.path.join(disc_path, fase)
-                            if not os.path.isdir(fase_path):
-                                continue
-
-                            with st.expander(f"📄 Fase: {fase}", expanded=False):
-                                for file in sorted(os.listdir(fase_path)):
-                                    full_path = os.path.join(fase_path, file)
-                                    if os.path.isdir(full_path):
-                                        continue
-
-                                    st.markdown(f"- `{file}`")
-                                    with open(full_path, "rb") as f:
-                                        if file.lower().endswith(".pdf"):
-                                            b64 = base64.b64encode(f.read()).decode("utf-8")
-                                            href = f'<a href="data:application/pdf;base64,{b64}" target="_blank">👁️ Visualizar PDF</a>'
-                                            st.markdown(href, unsafe_allow_html=True)
-                                        f.seek(0)
-                                        if "download" in user_permissions:
-                                            st.download_button("📥 Baixar", f, file_name=file, key=hash_key(f"dl_{full_path}"))
-
-                                    # Seção de Comentários
-                                    with st.expander("💬 Comentários", expanded=False):
-                                        comentario_key = hash_key("coment_" + full_path)
-                                        botao_key = hash_key("btn_com_" + full_path)
-                                    
-                                        st.markdown("##### Novo Comentário")
-                                        novo_coment = st.text_area("Digite seu comentário", key=comentario_key)
-                                    
-                                        if st.button("Enviar comentário", key=botao_key):
-                                            if novo_coment.strip():
-                                                salvar_comentario(full_path, username, novo_coment.strip())
-                                                st.success("Comentário salvo com sucesso.")
-                                                st.experimental_rerun()
-                                            else:
-                                                st.warning("Comentário vazio não será salvo.")
-                                    
-                                        st.markdown("##### Comentários Anteriores")
-                                        comentarios = obter_comentarios(full_path)
-                                        if comentarios:
-                                            for user, time, text in comentarios:
-                                                st.markdown(f"**{user}** ({time[:19]}):")
-                                                st.markdown(f"> {text}")
-                                                st.markdown("---")
-                                        else:
-                                            st.info("Nenhum comentário ainda.")
-        
-    if st.sidebar.button("🏢 Meus Clientes"):
-        meus_clientes = set()
-        for proj in user_projects:
-            res = c.execute("SELECT client FROM projects WHERE name=?", (proj,)).fetchone()
-            if res:
-                meus_clientes.add(res[0])
-
-        for cliente in sorted(meus_clientes):
-            with st.expander(f"🏢 Cliente: {cliente}", expanded=False):
-                projetos_cliente = [p[0] for p in c.execute("SELECT name FROM projects WHERE client=?", (cliente,)).fetchall()]
-                projetos_cliente = [p for p in projetos_cliente if p in user_projects]
-
-                for proj in sorted(projetos_cliente):
-                    proj_path = os.path.join(BASE_DIR, proj)
-                    if not os.path.isdir(proj_path):
-                        continue
-
-                    with st.expander(f"📁 Projeto: {proj}", expanded=False):
-                        for disc in sorted(os.listdir(proj_path)):
-                            disc_path = os.path.join(proj_path, disc)
-                            if not os.path.isdir(disc_path):
-                                continue
-
-                            with st.expander(f"📂 Disciplina: {disc}", expanded=False):
-                                for fase in sorted(os.listdir(disc_path)):
-                                    fase_path = os.path.join(disc_path, fase)
-                                    if not os.path.isdir(fase_path):
-                                        continue
-
-                                    with st.expander(f"📄 Fase: {fase}", expanded=False):
-                                        for file in sorted(os.listdir(fase_path)):
-                                            full_path = os.path.join(fase_path, file)
-                                            if os.path.isdir(full_path):
-                                                continue
-
-                                    st.markdown(f"- `{file}`")
-                                    with open(full_path, "rb") as f:
-                                        if file.lower().endswith(".pdf"):
-                                            b64 = base64.b64encode(f.read()).decode("utf-8")
-                                            href = f'<a href="data:application/pdf;base64,{b64}" target="_blank">👁️ Visualizar PDF</a>'
-                                            st.markdown(href, unsafe_allow_html=True)
-                                        f.seek(0)
-                                        if "download" in user_permissions:
-                                            st.download_button("📥 Baixar", f, file_name=file, key=hash_key(f"dl_{full_path}"))
-
-                                            # Seção de Comentários
-                                            with st.expander("💬 Comentários", expanded=False):
-                                                comentario_key = hash_key("coment_" + full_path)
-                                                botao_key = hash_key("btn_com_" + full_path)
-                                            
-                                                st.markdown("##### Novo Comentário")
-                                                novo_coment = st.text_area("Digite seu comentário", key=comentario_key)
-                                            
-                                                if st.button("Enviar comentário", key=botao_key):
-                                                    if novo_coment.strip():
-                                                        salvar_comentario(full_path, username, novo_coment.strip())
-                                                        st.success("Comentário salvo com sucesso.")
-                                                        st.experimental_rerun()
-                                                    else:
-                                                        st.warning("Comentário vazio não será salvo.")
-                                            
-                                                st.markdown("##### Comentários Anteriores")
-                                                comentarios = obter_comentarios(full_path)
-                                                if comentarios:
-                                                    for user, time, text in comentarios:
-                                                        st.markdown(f"**{user}** ({time[:19]}):")
-                                                        st.markdown(f"> {text}")
-                                                        st.markdown("---")
-                                                else:
-                                                    st.info("Nenhum comentário ainda.")
-        
     # PESQUISA POR PALAVRA-CHAVE (NOME + CONTEÚDO PDF)
     if "download" in user_permissions or "view" in user_permissions:
         st.markdown("### 🔍 Pesquisa de Documentos")
-        keyword = st.text_input("Buscar por palavra-chave")
+        keyword = st.text_input("Buscar por palavra-chave",
+                                help='Filtros: proj:P1, disc:MEC, fase:FEL3, rev:>=r2, ver:2. '
+                                     'Use aspas para frases; nomes com erros de digitação também são encontrados.')
+        incluir_frios = st.checkbox("Incluir revisões antigas do armazenamento frio (busca só pelo nome)")
         if keyword:
-            matched = []
-            for root, dirs, files in os.walk(BASE_DIR):
-                for file in files:
-                    full_path = os.path.join(root, file)
-                    if not os.path.isfile(full_path):
-                        continue
-
-                    rel_path_parts = os.path.relpath(full_path, BASE_DIR).split(os.sep)
-                    if rel_path_parts[0] not in user_projects:
-                        continue
-
-                    match_found = False
-                    if keyword.lower() in file.lower():
-                        match_found = True
-                    elif file.lower().endswith(".pdf"):
-                        try:
-                            doc = fitz.open(full_path)
-                            text = ""
-                            for page in doc:
-                                text += page.get_text()
-                            doc.close()
-                            if keyword.lower() in text.lower():
-                                match_found = True
-                        except Exception as e:
-                            st.warning(f"Erro ao ler PDF `{file}`: {str(e)}")
-
-                    if match_found:
-                        matched.append(full_path)
-
-            if matched:
-                for file in matched:
-                    st.write(f"📄 {os.path.relpath(file, BASE_DIR)}")
-                    with open(file, "rb") as f:
-                        b64 = base64.b64encode(f.read()).decode("utf-8")
-                        if file.lower().endswith(".pdf"):
-                            href = f'<a href="data:application/pdf;base64,{b64}" target="_blank">👁️ Visualizar PDF</a>'
-                            if st.button("👁️ Visualizar PDF", key=hash_key("btnk_" + file)):
-                                st.markdown(href, unsafe_allow_html=True)
-                            f.seek(0)
-                            if "download" in user_permissions:
-                                st.download_button("📥 Baixar PDF", f, file_name=os.path.basename(file), mime="application/pdf", key=hash_key("dlk_" + file))
-                        elif file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                            st.image(f.read(), caption=os.path.basename(file))
-                            f.seek(0)
-                            if "download" in user_permissions:
-                                st.download_button("📥 Baixar Imagem", f, file_name=os.path.basename(file), key=hash_key("imgk_" + file))
-                        else:
-                            if "download" in user_permissions:
-                                st.download_button("📥 Baixar Arquivo", f, file_name=os.path.basename(file), key=hash_key("othk_" + file))
-                    log_action(username, "visualizar", file)
-            else:
+            status_busca = st.empty()
+            status_busca.caption("🔎 Buscando...")
+            # Cada resultado é desenhado assim que encontrado; se a consulta mudar,
+            # o Streamlit interrompe esta execução no próximo elemento enviado
+            busca = servicos.buscar(keyword, user_projects, limite=BUSCA_LIMITE, orcamento=BUSCA_ORCAMENTO_S,
+                                    incluir_frios=incluir_frios)
+            exibidos = 0
+            # Só buscas que terminam entram na métrica; as interrompidas pelo rerun não
+            inicio_busca = time.perf_counter()
+            for resultado in busca:
+                # Fora do disco só vale se estiver no armazenamento frio (recuperado ao abrir)
+                if not os.path.isfile(resultado["path"]) and not (incluir_frios and servicos.no_frio(resultado["path"])):
+                    continue
+                render_resultado_busca(resultado, exibidos, username, user_permissions)
+                exibidos += 1
+                status_busca.caption(f"🔎 {exibidos} resultado(s) até agora...")
+            metrics.registrar("busca", time.perf_counter() - inicio_busca)
+            if busca.pendentes:
+                st.caption(f"⏳ {busca.pendentes} PDF(s) ainda não indexado(s): o conteúdo deles entra na busca "
+                           "assim que a fila de processamento os extrair.")
+
+            if not exibidos:
+                status_busca.empty()
                 st.warning("Nenhum arquivo encontrado.")
+            elif busca.motivo_parada == "limite":
+                status_busca.caption(f"Mostrando os primeiros {exibidos} resultados. Refine a busca para ver outros.")
+            elif busca.motivo_parada == "tempo":
+                status_busca.caption(f"{exibidos} resultado(s); busca interrompida após {BUSCA_ORCAMENTO_S:g} s.")
+            else:
+                status_busca.caption(f"{exibidos} resultado(s).")
 
     # HISTÓRICO DE AÇÕES (disponível para autenticados)
     st.markdown("### 📜 Histórico de Ações")
     if st.checkbox("Mostrar log"):
-        logs = c.execute("SELECT * FROM logs ORDER BY timestamp DESC LIMIT 50").fetchall()
-        for row in logs:
-            st.write(f"{row[0]} | Usuário: {row[1]} | Ação: {row[2]} | Arquivo: {row[3]}")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            filtro_usuario = st.selectbox("Usuário", [""] + servicos.valores_logs("user"), key="log_usuario")
+        with col2:
+            filtro_acao = st.selectbox("Ação", [""] + servicos.valores_logs("action"), key="log_acao")
+        with col3:
+            filtro_projeto = st.selectbox("Projeto", [""] + servicos.valores_logs("project"), key="log_projeto")
+        periodo = st.date_input("Período", value=[], key="log_periodo")
+        filtros = {"user": filtro_usuario, "action": filtro_acao, "project": filtro_projeto,
+                   "inicio": periodo[0] if len(periodo) > 0 else None,
+                   "fim": periodo[1] if len(periodo) > 1 else None}
+
+        # Paginação por keyset: pilha de cursores, reiniciada quando os filtros mudam
+        if st.session_state.get("log_filtros") != filtros:
+            st.session_state.log_filtros = filtros
+            st.session_state.log_cursores = [None]
+        with metrics.medir("logs"):
+            logs, proximo = servicos.consultar_logs(filtros, st.session_state.log_cursores[-1])
+        for _, timestamp, user, action, file, _ in logs:
+            st.write(f"{timestamp} | Usuário: {user} | Ação: {action} | Arquivo: {file}")
+        if not logs:
+            st.info("Nenhuma ação encontrada.")
+
+        col_ant, col_prox = st.columns(2)
+        with col_ant:
+            if len(st.session_state.log_cursores) > 1 and st.button("⬅️ Mais recentes"):
+                st.session_state.log_cursores.pop()
+                st.rerun()
+        with col_prox:
+            if proximo and st.button("Mais antigas ➡️"):
+                st.session_state.log_cursores.append(proximo)
+                st.rerun()
+
+        if st.checkbox("📊 Totais por mês e ação"):
+            with metrics.medir("logs.totais"):
+                totais = servicos.contadores_logs(filtros)
+            for mes, acao, total in totais:
+                st.write(f"{mes} | {acao}: {total}")
+
+# Execuções interrompidas por st.stop()/st.rerun() não chegam aqui
+metrics.finalizar_execucao(st.session_state.get("username") or
+                           ("admin" if st.session_state.admin_authenticated else "anônimo"))
@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+import statistics
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gestao import db
+
+# Simula N sessões concorrentes do Streamlit, cada "rerun" fazendo o que o
+# app faz: lê o usuário, lê comentários de um arquivo, grava um comentário
+# e registra ações no log. Compara a conexão global compartilhada (legado)
+# com o pool por thread + WAL + gravador de logs em lote.
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT, projects TEXT, permissions TEXT)",
+    "CREATE TABLE IF NOT EXISTS logs (timestamp TEXT, user TEXT, action TEXT, file TEXT, project TEXT)",
+    "CREATE TABLE IF NOT EXISTS comments (id INTEGER PRIMARY KEY AUTOINCREMENT, file_path TEXT, username TEXT, timestamp TEXT, comment TEXT)",
+]
+
+
+def preparar(db_path, sessoes):
+    conn = sqlite3.connect(db_path)
+    for sql in SCHEMA:
+        conn.execute(sql)
+    conn.executemany("INSERT INTO users VALUES (?, 'x', 'P1,P2', 'upload,download,view')",
+                     [(f"u{i}",) for i in range(sessoes)])
+    conn.commit()
+    conn.close()
+
+
+def rerun(conn, usuario, i, registrar_log):
+    arquivo = f"uploads/P1/MEC/FEL1/doc{i % 50} r0v1.pdf"
+    conn.execute("SELECT projects, permissions FROM users WHERE username=?", (usuario,)).fetchone()
+    conn.execute("SELECT username, timestamp, comment FROM comments WHERE file_path=? ORDER BY timestamp DESC",
+                 (arquivo,)).fetchall()
+    conn.execute("INSERT INTO comments (file_path, username, timestamp, comment) VALUES (?, ?, ?, ?)",
+                 (arquivo, usuario, datetime.now().isoformat(), "ok"))
+    conn.commit()
+    for acao in ("comentário", "visualizar", "visualizar"):
+        registrar_log(usuario, acao, arquivo)
+
+
+def executar(modo, db_path, sessoes, reruns):
+    latencias = []
+    erros = []
+    trava_latencias = threading.Lock()
+
+    if modo == "legado":
+        compartilhada = sqlite3.connect(db_path, check_same_thread=False)
+
+        def obter_conexao():
+            return compartilhada
+
+        def registrar_log(user, action, file):
+            compartilhada.execute("INSERT INTO logs (timestamp, user, action, file) VALUES (?, ?, ?, ?)",
+                                  (datetime.now().isoformat(), user, action, file))
+            compartilhada.commit()
+    else:
+        db.configurar(db_path)
+        obter_conexao = db.get_connection
+        gravador = db.gravador_logs()
+
+        def registrar_log(user, action, file):
+            gravador.registrar(user, action, file)
+
+    def sessao(n):
+        usuario = f"u{n}"
+        locais, falhas = [], 0
+        for i in range(reruns):
+            inicio = time.perf_counter()
+            try:
+                rerun(obter_conexao(), usuario, i, registrar_log)
+            except Exception:
+                # A conexão compartilhada do legado falha sob concorrência
+                falhas += 1
+            locais.append(time.perf_counter() - inicio)
+        with trava_latencias:
+            latencias.extend(locais)
+            erros.append(falhas)
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=sessao, args=(n,)) for n in range(sessoes)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if modo != "legado":
+        db.gravador_logs().flush(timeout=60)
+    total = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "modo": modo,
+        "reruns/s": len(latencias) / total,
+        "p50_ms": statistics.median(latencias) * 1000,
+        "p95_ms": latencias[int(len(latencias) * 0.95) - 1] * 1000,
+        "total_s": total,
+        "erros": sum(erros),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de carga da camada SQLite")
+    parser.add_argument("--sessoes", type=int, default=16)
+    parser.add_argument("--reruns", type=int, default=200)
+    parser.add_argument("--modo", choices=["legado", "pool", "ambos"], default="ambos")
+    args = parser.parse_args(argv)
+
+    modos = ["legado", "pool"] if args.modo == "ambos" else [args.modo]
+    for modo in modos:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "bench.db")
+            preparar(db_path, args.sessoes)
+            r = executar(modo, db_path, args.sessoes, args.reruns)
+            print(f"{r['modo']:>7}: {r['reruns/s']:8.1f} reruns/s  p50={r['p50_ms']:.2f} ms  "
+                  f"p95={r['p95_ms']:.2f} ms  total={r['total_s']:.2f} s  erros={r['erros']}")
+
+
+if __name__ == "__main__":
+    main()
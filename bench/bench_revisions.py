@@ -0,0 +1,100 @@
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gestao import db, catalog, migrations
+from gestao.revisions import IndiceRevisoes, extrair_info_arquivo
+
+# Micro-benchmark da verificação de revisão no upload: listdir + regex sem
+# compilar (como o upload fazia) contra consulta ao catálogo e contra o
+# índice de revisões em memória, numa pasta de fase com N arquivos.
+
+
+def extrair_legado(nome_arquivo):
+    padrao = r"(.+?)r(\d+)v(\d+).*?\.\w+$"
+    match = re.match(padrao, nome_arquivo)
+    if match:
+        return match.group(1).rstrip(" _-"), f"r{match.group(2)}", f"v{match.group(3)}"
+    return None, None, None
+
+
+def rev_max_legado(path, nome_base):
+    revisoes = []
+    for f in os.listdir(path):
+        if f.startswith(nome_base):
+            base_ant, rev_ant, _ = extrair_legado(f)
+            if base_ant == nome_base:
+                revisoes.append(rev_ant)
+    pasta_revisoes = os.path.join(path, "Revisoes", nome_base)
+    if os.path.isdir(pasta_revisoes):
+        for f in os.listdir(pasta_revisoes):
+            base_ant, rev_ant, _ = extrair_legado(f)
+            if base_ant == nome_base:
+                revisoes.append(rev_ant)
+    numeros = [int(r[1:]) for r in revisoes]
+    return max(numeros) if numeros else -1
+
+
+def gerar_fase(base_dir, arquivos, familias):
+    fase = os.path.join(base_dir, "P1", "MEC", "FEL3")
+    os.makedirs(fase, exist_ok=True)
+    por_familia = max(arquivos // familias, 1)
+    for i in range(familias):
+        nome_base = f"DOC-{i:05d}"
+        # Revisões antigas arquivadas, a última na pasta da fase
+        revisoes = max(por_familia // 2, 1)
+        for r in range(revisoes):
+            for v in range(1, 3):
+                destino = fase if r == revisoes - 1 else os.path.join(fase, "Revisoes", nome_base)
+                os.makedirs(destino, exist_ok=True)
+                open(os.path.join(destino, f"{nome_base} r{r}v{v}.pdf"), "wb").close()
+    return fase
+
+
+def cronometrar(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for i in range(repeticoes):
+        funcao(i)
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da verificação de revisões")
+    parser.add_argument("--arquivos", type=int, default=10000)
+    parser.add_argument("--familias", type=int, default=1000)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_dir = os.path.join(tmp, "uploads")
+        fase = gerar_fase(base_dir, args.arquivos, args.familias)
+        conn = db.conectar(os.path.join(tmp, "bench.db"))
+        migrations.migrar(conn)
+        total, _ = catalog.reconciliar(conn, base_dir)
+        familias = [f"DOC-{i:05d}" for i in range(args.familias)]
+        indice = IndiceRevisoes(ttl=3600)
+        for nome_base in familias:
+            indice.familia(conn, "P1", "MEC", "FEL3", nome_base)
+        extrair_info_arquivo.cache_clear()
+
+        legado = cronometrar(lambda i: rev_max_legado(fase, familias[i % len(familias)]), args.repeticoes)
+        consulta = cronometrar(lambda i: indice.familia(conn, "P1", "MEC", "FEL3", familias[i % len(familias)],
+                                                        atualizar=True).ultima_revisao(), args.repeticoes)
+        memoria = cronometrar(lambda i: indice.familia(conn, "P1", "MEC", "FEL3",
+                                                       familias[i % len(familias)]).ultima_revisao(),
+                              args.repeticoes * 100)
+
+        print(f"{total} arquivos em {args.familias} famílias")
+        print(f"listdir + regex (legado): {legado:10.1f} µs por verificação")
+        print(f"consulta ao catálogo:     {consulta:10.1f} µs por verificação")
+        print(f"índice em memória:        {memoria:10.1f} µs por verificação")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
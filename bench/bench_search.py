@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gestao import db, search, migrations
+
+# Benchmark da busca: catálogo sintético com N documentos (sem arquivos em
+# disco) e texto de páginas no FTS, medindo consultas por nome, conteúdo,
+# nome aproximado e somente filtros.
+
+DISCIPLINAS = ["GES", "PRO", "MEC", "MET", "CIV", "ELE", "AEI"]
+FASES = ["FEL1", "FEL2", "FEL3", "Executivo"]
+PALAVRAS = ["bomba", "trocador", "tubulacao", "valvula", "planta", "corte", "fundacao", "painel",
+            "motor", "tanque", "estrutura", "isometrico", "fluxograma", "memorial", "lista", "cabo"]
+
+
+def popular(conn, documentos, projetos, paginas):
+    rnd = random.Random(42)
+    agora = datetime.now().isoformat()
+    linhas, textos, indexados = [], [], []
+    for i in range(documentos):
+        projeto = f"P{i % projetos}"
+        disc, fase = rnd.choice(DISCIPLINAS), rnd.choice(FASES)
+        nome_base = f"{rnd.choice(PALAVRAS)}-{rnd.choice(PALAVRAS)}-{i:06d}"
+        rev, ver = rnd.randint(0, 5), rnd.randint(1, 3)
+        name = f"{nome_base} r{rev}v{ver}.pdf"
+        path = os.path.join("uploads", projeto, disc, fase, name)
+        linhas.append((path, projeto, disc, fase, name, nome_base, f"r{rev}", f"v{ver}", 1000, 0.0, "", 0, agora))
+        indexados.append((path, name, projeto, 0.0, 1000, paginas, None))
+        for p in range(1, paginas + 1):
+            textos.append((" ".join(rnd.choices(PALAVRAS, k=40)), path, p))
+    conn.executemany('''INSERT INTO documents (path, project, discipline, phase, name, nome_base, revisao, versao,
+                        size, mtime, sha256, archived, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                     linhas)
+    conn.executemany("INSERT INTO indexed_files VALUES (?, ?, ?, ?, ?, ?, ?)", indexados)
+    conn.executemany("INSERT INTO pages_fts (text, path, page) VALUES (?, ?, ?)", textos)
+    conn.commit()
+
+
+def cronometrar(conn, consulta, projetos, repeticoes, limite):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultados = list(search.BuscaIncremental(conn, consulta, projetos, limite=limite))
+    return (time.perf_counter() - inicio) / repeticoes * 1000, len(resultados)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da busca")
+    parser.add_argument("--documentos", type=int, default=100000)
+    parser.add_argument("--projetos", type=int, default=20)
+    parser.add_argument("--paginas", type=int, default=1)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--limite", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    consultas = ["bomba", "valvula trocador", "000123", "trocdor", "tanqe painel",
+                 "disc:MEC fase:FEL3 rev:>=r4", "planta disc:CIV rev:>=r2", "fluxograma memorial"]
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = db.conectar(os.path.join(tmp, "bench.db"))
+        migrations.migrar(conn)
+        inicio = time.perf_counter()
+        popular(conn, args.documentos, args.projetos, args.paginas)
+        print(f"{args.documentos} documentos gerados em {time.perf_counter() - inicio:.1f} s")
+        projetos = [f"P{i}" for i in range(args.projetos)]
+        for consulta in consultas:
+            ms, n = cronometrar(conn, consulta, projetos, args.repeticoes, args.limite)
+            print(f"{consulta:32s} {ms:8.1f} ms  ({n} resultados)")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
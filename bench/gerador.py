@@ -0,0 +1,133 @@
+import os
+import sys
+import random
+import argparse
+from datetime import datetime, timedelta
+
+import fitz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gestao import db, catalog, search, migrations
+from gestao.catalog import PASTA_REVISOES
+
+# Gerador de repositório sintético e reproduzível (mesma semente, mesmo
+# repositório): árvore uploads/{projeto}/{disciplina}/{fase} com PDFs reais
+# de várias páginas em famílias rXvY (revisões antigas em Revisoes/) e um
+# document_manager.db com usuários, projetos, catálogo, índice de texto,
+# comentários e histórico de ações.
+
+DISCIPLINAS = ["GES", "PRO", "MEC", "MET", "CIV", "ELE", "AEI"]
+FASES = ["FEL1", "FEL2", "FEL3", "Executivo"]
+PALAVRAS = ["bomba", "trocador", "tubulação", "válvula", "planta", "corte", "fundação", "painel", "motor",
+            "tanque", "estrutura", "isométrico", "fluxograma", "memorial", "lista", "cabo", "suporte",
+            "compressor", "caldeira", "filtro", "reator", "instrumento", "malha", "detalhe"]
+TIPOS = ["DE", "FD", "MD", "LM", "ET", "RL"]
+ACOES = ["upload", "visualizar", "comentário", "download"]
+
+
+def escrever_pdf(caminho, rnd, paginas, titulo):
+    doc = fitz.open()
+    for numero in range(1, paginas + 1):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"{titulo} - folha {numero}", fontsize=14)
+        linhas = [" ".join(rnd.choices(PALAVRAS, k=10)) for _ in range(12)]
+        page.insert_text((72, 110), "\n".join(linhas), fontsize=10)
+    doc.set_metadata({"title": titulo, "author": "gerador"})
+    doc.save(caminho)
+    doc.close()
+
+
+def gerar_arvore(base_dir, rnd, projetos, disciplinas, fases, documentos, revisoes, paginas):
+    # documentos = famílias por fase; cada família tem `revisoes` revisões
+    arquivos = 0
+    for p in range(projetos):
+        projeto = f"PRJ{p:03d}"
+        for disciplina in DISCIPLINAS[:disciplinas]:
+            for fase in FASES[:fases]:
+                pasta = os.path.join(base_dir, projeto, disciplina, fase)
+                os.makedirs(pasta, exist_ok=True)
+                for d in range(documentos):
+                    nome_base = f"{projeto}-{disciplina}-{rnd.choice(TIPOS)}-{d:04d} {rnd.choice(PALAVRAS)}"
+                    ultima = rnd.randint(0, revisoes - 1)
+                    for r in range(ultima + 1):
+                        versoes = rnd.randint(1, 2)
+                        for v in range(1, versoes + 1):
+                            destino = pasta if r == ultima else os.path.join(pasta, PASTA_REVISOES, nome_base)
+                            os.makedirs(destino, exist_ok=True)
+                            nome = f"{nome_base} r{r}v{v}.pdf"
+                            escrever_pdf(os.path.join(destino, nome), rnd, paginas, nome_base)
+                            arquivos += 1
+    return arquivos
+
+
+def popular_banco(conn, base_dir, rnd, usuarios, comentarios, logs):
+    nomes_projetos = sorted(os.listdir(base_dir))
+    conn.executemany("INSERT OR IGNORE INTO clients (name) VALUES (?)", [(f"Cliente {i}",) for i in range(3)])
+    conn.executemany("INSERT OR IGNORE INTO projects (name, client) VALUES (?, ?)",
+                     [(p, f"Cliente {i % 3}") for i, p in enumerate(nomes_projetos)])
+    nomes_usuarios = [f"usuario{i:03d}" for i in range(usuarios)]
+    for usuario in nomes_usuarios:
+        meus = rnd.sample(nomes_projetos, k=max(1, min(len(nomes_projetos), rnd.randint(1, 3))))
+        conn.execute("INSERT OR IGNORE INTO users (username, password, projects, permissions) VALUES (?, ?, ?, ?)",
+                     (usuario, "senha", ",".join(meus), "upload,download,view"))
+        conn.executemany("INSERT OR IGNORE INTO user_projects (username, project) VALUES (?, ?)",
+                         [(usuario, p) for p in meus])
+    conn.commit()
+
+    catalog.reconciliar(conn, base_dir)
+    documentos = conn.execute("SELECT id, path, project FROM documents").fetchall()
+    inicio = datetime.now() - timedelta(days=365)
+    conn.executemany('''INSERT INTO comments (file_path, username, timestamp, comment, document_id)
+                        VALUES (?, ?, ?, ?, ?)''',
+                     [(path, rnd.choice(nomes_usuarios),
+                       (inicio + timedelta(minutes=rnd.randint(0, 525600))).isoformat(),
+                       " ".join(rnd.choices(PALAVRAS, k=8)), doc_id)
+                      for doc_id, path, _ in (rnd.choice(documentos) for _ in range(comentarios))])
+    conn.executemany("INSERT INTO logs (timestamp, user, action, file, project) VALUES (?, ?, ?, ?, ?)",
+                     [((inicio + timedelta(seconds=rnd.randint(0, 31536000))).isoformat(), rnd.choice(nomes_usuarios),
+                       rnd.choice(ACOES), path, projeto)
+                      for _, path, projeto in (rnd.choice(documentos) for _ in range(logs))])
+    conn.commit()
+    return len(documentos)
+
+
+def gerar_repositorio(destino, projetos=3, disciplinas=3, fases=2, documentos=20, revisoes=3, paginas=3,
+                      usuarios=20, comentarios=2000, logs=20000, indexar=True, semente=42):
+    rnd = random.Random(semente)
+    base_dir = os.path.join(destino, "uploads")
+    if os.path.exists(base_dir):
+        raise SystemExit(f"{base_dir} já existe; use um destino vazio.")
+    arquivos = gerar_arvore(base_dir, rnd, projetos, disciplinas, fases, documentos, revisoes, paginas)
+    conn = db.conectar(os.path.join(destino, "document_manager.db"))
+    migrations.migrar(conn)
+    catalogados = popular_banco(conn, base_dir, rnd, usuarios, comentarios, logs)
+    if indexar:
+        search.sincronizar_indice(conn, base_dir)
+    conn.close()
+    return arquivos, catalogados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera um repositório sintético para benchmarks")
+    parser.add_argument("destino")
+    parser.add_argument("--projetos", type=int, default=3)
+    parser.add_argument("--disciplinas", type=int, default=3, help=f"até {len(DISCIPLINAS)}")
+    parser.add_argument("--fases", type=int, default=2, help=f"até {len(FASES)}")
+    parser.add_argument("--documentos", type=int, default=20, help="famílias de documentos por fase")
+    parser.add_argument("--revisoes", type=int, default=3, help="revisões máximas por família")
+    parser.add_argument("--paginas", type=int, default=3)
+    parser.add_argument("--usuarios", type=int, default=20)
+    parser.add_argument("--comentarios", type=int, default=2000)
+    parser.add_argument("--logs", type=int, default=20000)
+    parser.add_argument("--sem-indice", action="store_true", help="não extrai o texto dos PDFs")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args(argv)
+    arquivos, catalogados = gerar_repositorio(
+        args.destino, args.projetos, args.disciplinas, args.fases, args.documentos, args.revisoes, args.paginas,
+        args.usuarios, args.comentarios, args.logs, not args.sem_indice, args.semente)
+    print(f"{arquivos} PDF(s) gerado(s), {catalogados} documento(s) catalogado(s) em {args.destino}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gestao import db, catalog, search, audit, lote, metrics, scanner, comentarios
+from gestao.auth import CacheAutorizacao
+from gestao.revisions import IndiceRevisoes
+from bench.gerador import gerar_repositorio, PALAVRAS
+
+# Suíte de benchmarks sem Streamlit: gera (ou reutiliza) um repositório
+# sintético e cronometra as operações centrais do app como cada rerun as
+# faz. Saída em tabela e, com --json, num arquivo comparável entre commits
+# (--comparar mostra a variação do p50 contra uma execução anterior).
+
+
+def _familias(conn):
+    return conn.execute('''SELECT DISTINCT project, discipline, phase, nome_base FROM documents
+                           WHERE nome_base IS NOT NULL ORDER BY 1, 2, 3, 4''').fetchall()
+
+
+def operacoes(conn, base_dir, rnd):
+    familias = _familias(conn)
+    fases = sorted({f[:3] for f in familias})
+    documentos = [r[0] for r in conn.execute("SELECT id FROM documents")]
+    usuarios = [r[0] for r in conn.execute("SELECT username FROM users")]
+    projetos = [r[0] for r in conn.execute("SELECT name FROM projects")]
+    indice = IndiceRevisoes(ttl=3600)
+
+    def verificacao_revisao():
+        # Leitura autoritativa do catálogo, como no envio
+        project, discipline, phase, nome_base = rnd.choice(familias)
+        familia = indice.familia(conn, project, discipline, phase, nome_base, atualizar=True)
+        familia.verificar_upload(f"{nome_base} r{familia.ultima_revisao() + 1}v1.pdf")
+
+    def validacao_lote():
+        project, discipline, phase = rnd.choice(fases)
+        nomes = [f"{f[3]} r9v1.pdf" for f in familias if f[:3] == (project, discipline, phase)][:10]
+        lote.planejar_lote(conn, indice, project, discipline, phase, nomes, base_dir)
+
+    def listagem_arvore():
+        project = rnd.choice(projetos)
+        for discipline in catalog.listar_disciplinas(conn, project):
+            for phase in catalog.listar_fases(conn, project, discipline):
+                catalog.contar_arquivos(conn, project, discipline, phase)
+        project, discipline, phase = rnd.choice(fases)
+        catalog.listar_arquivos(conn, project, discipline, phase, "revisao", 20, 0)
+
+    def busca_palavra():
+        list(search.BuscaIncremental(conn, rnd.choice(PALAVRAS), projetos, limite=100))
+
+    def busca_filtrada():
+        _, discipline, phase = rnd.choice(fases)
+        list(search.BuscaIncremental(conn, f"{rnd.choice(PALAVRAS)} disc:{discipline} fase:{phase} rev:>=r1",
+                                     projetos, limite=100))
+
+    def conversa():
+        comentarios.consultar(conn, rnd.choice(documentos))
+
+    def resumo_comentarios():
+        # Uma página da árvore: total e último comentário de cada arquivo
+        project, discipline, phase = rnd.choice(fases)
+        ids = [a[0] for a in catalog.listar_arquivos(conn, project, discipline, phase, "nome", 20, 0)]
+        comentarios.resumo(conn, ids)
+
+    def historico():
+        filtros = {"user": rnd.choice(usuarios)}
+        linhas, proximo = audit.consultar(conn, filtros)
+        if proximo:
+            audit.consultar(conn, filtros, proximo)
+        audit.consultar(conn, {})
+
+    def varredura_disco():
+        # Estado estável (nada mudou): o custo fixo de cada ciclo do Observador
+        scanner.aplicar(conn, base_dir, scanner.varrer(conn, base_dir))
+
+    def autorizacao():
+        CacheAutorizacao(ttl=0).contexto(conn, rnd.choice(usuarios))
+
+    return [("revisao.verificacao", verificacao_revisao), ("upload.validacao_lote", validacao_lote),
+            ("arvore.listagem", listagem_arvore), ("busca.palavra", busca_palavra),
+            ("busca.filtrada", busca_filtrada), ("comentarios", conversa),
+            ("comentarios.resumo", resumo_comentarios),
+            ("logs.pagina", historico), ("autorizacao", autorizacao), ("scanner.incremental", varredura_disco)]
+
+
+def executar(repositorio, repeticoes, aquecimento, semente):
+    base_dir = os.path.join(repositorio, "uploads")
+    conn = db.conectar(os.path.join(repositorio, "document_manager.db"))
+    rnd = random.Random(semente)
+    registro = metrics.Registro(janela=repeticoes)
+    for nome, funcao in operacoes(conn, base_dir, rnd):
+        for _ in range(aquecimento):
+            funcao()
+        for _ in range(repeticoes):
+            with registro.medir(nome):
+                funcao()
+    conn.close()
+    return {nome: {"n": n, "ops_s": n / soma if soma else 0.0, "p50_ms": p50 * 1000, "p95_ms": p95 * 1000,
+                   "max_ms": maximo * 1000}
+            for nome, n, p50, p95, maximo, soma in registro.resumo()}
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks das operações centrais do app")
+    parser.add_argument("--repositorio", help="repositório já gerado por bench/gerador.py")
+    parser.add_argument("--projetos", type=int, default=3)
+    parser.add_argument("--documentos", type=int, default=20, help="famílias de documentos por fase")
+    parser.add_argument("--paginas", type=int, default=3)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    parser.add_argument("--aquecimento", type=int, default=10)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    parser.add_argument("--comparar", help="resultados anteriores (--json) para comparação")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repositorio = args.repositorio
+        if not repositorio:
+            repositorio = tmp
+            arquivos, _ = gerar_repositorio(tmp, projetos=args.projetos, documentos=args.documentos,
+                                            paginas=args.paginas, semente=args.semente)
+            print(f"repositório sintético: {arquivos} PDF(s)")
+        resultados = executar(repositorio, args.repeticoes, args.aquecimento, args.semente)
+
+    anteriores = {}
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anteriores = json.load(f)["resultados"]
+    print(f"{'operação':24s} {'ops/s':>10s} {'p50 ms':>9s} {'p95 ms':>9s} {'máx ms':>9s}")
+    for nome, r in sorted(resultados.items()):
+        linha = f"{nome:24s} {r['ops_s']:10.1f} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['max_ms']:9.2f}"
+        if nome in anteriores and anteriores[nome]["p50_ms"]:
+            variacao = (r["p50_ms"] / anteriores[nome]["p50_ms"] - 1) * 100
+            linha += f"  ({variacao:+.0f}% p50)"
+        print(linha)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"commit": _commit(), "parametros": vars(args), "resultados": resultados}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
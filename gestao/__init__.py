@@ -0,0 +1 @@
+# Serviços do Gerenciador de Documentos (índices, armazenamento e consultas)
@@ -0,0 +1,146 @@
+import os
+import sys
+import gzip
+import json
+import argparse
+from datetime import datetime, date, timedelta
+
+from gestao import db
+
+# Histórico de ações: consulta paginada por keyset (timestamp, rowid) com
+# filtros indexados, contadores agregados mantidos por trigger e arquivamento
+# mensal das linhas antigas em arquivos JSONL comprimidos.
+
+ARQUIVO_LOGS_DIR = "arquivo_logs"
+TAMANHO_PAGINA = 50
+
+
+def _filtros_sql(filtros):
+    condicoes, parametros = [], []
+    for campo in ("user", "action", "project"):
+        if filtros.get(campo):
+            condicoes.append(f"{campo} = ?")
+            parametros.append(filtros[campo])
+    if filtros.get("inicio"):
+        condicoes.append("timestamp >= ?")
+        parametros.append(str(filtros["inicio"]))
+    if filtros.get("fim"):
+        # Fim inclusivo: tudo antes do dia seguinte
+        dia_seguinte = date.fromisoformat(str(filtros["fim"])[:10]) + timedelta(days=1)
+        condicoes.append("timestamp < ?")
+        parametros.append(dia_seguinte.isoformat())
+    return condicoes, parametros
+
+
+def consultar(conn, filtros=None, cursor=None, limite=TAMANHO_PAGINA):
+    # Retorna (linhas, cursor da próxima página ou None)
+    condicoes, parametros = _filtros_sql(filtros or {})
+    if cursor:
+        condicoes.append("(timestamp, rowid) < (?, ?)")
+        parametros.extend(cursor)
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    linhas = conn.execute(f'''SELECT rowid, timestamp, user, action, file, project FROM logs {where}
+                              ORDER BY timestamp DESC, rowid DESC LIMIT ?''',
+                          (*parametros, limite + 1)).fetchall()
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo = (linhas[-1][1], linhas[-1][0])
+    return linhas, proximo
+
+
+def contadores(conn, filtros=None, agrupar_por=("month", "action")):
+    filtros = dict(filtros or {})
+    condicoes, parametros = [], []
+    for campo in ("user", "action", "project"):
+        if filtros.get(campo):
+            condicoes.append(f"{campo} = ?")
+            parametros.append(filtros[campo])
+    if filtros.get("inicio"):
+        condicoes.append("month >= ?")
+        parametros.append(str(filtros["inicio"])[:7])
+    if filtros.get("fim"):
+        condicoes.append("month <= ?")
+        parametros.append(str(filtros["fim"])[:7])
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    colunas = ", ".join(agrupar_por)
+    return conn.execute(f'''SELECT {colunas}, SUM(count) FROM log_counters {where}
+                            GROUP BY {colunas} ORDER BY {colunas}''', parametros).fetchall()
+
+
+def valores_distintos(conn, campo):
+    # Alimenta os filtros da tela a partir dos contadores (tabela pequena)
+    return [r[0] for r in conn.execute(f"SELECT DISTINCT {campo} FROM log_counters WHERE {campo} <> '' ORDER BY {campo}")]
+
+
+def _proximo_mes(mes):
+    ano, m = int(mes[:4]), int(mes[5:7])
+    return f"{ano + m // 12:04d}-{m % 12 + 1:02d}"
+
+
+def arquivar_mes(conn, mes, destino_dir=ARQUIVO_LOGS_DIR):
+    # Exporta as linhas do mês (AAAA-MM) para JSONL.gz e as remove da tabela
+    os.makedirs(destino_dir, exist_ok=True)
+    destino = os.path.join(destino_dir, f"logs-{mes}.jsonl.gz")
+    intervalo = (mes, _proximo_mes(mes))
+    cursor = conn.execute('''SELECT timestamp, user, action, file, project FROM logs
+                             WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp''', intervalo)
+    temporario = destino + ".parcial"
+    total = 0
+    # Acrescenta ao arquivo do mês se ele já existir (arquivamento em etapas)
+    modo = "ab" if os.path.exists(destino) else "wb"
+    if modo == "ab":
+        os.replace(destino, temporario)
+    with gzip.open(temporario, modo) as f:
+        for timestamp, user, action, file, project in cursor:
+            linha = {"timestamp": timestamp, "user": user, "action": action, "file": file, "project": project}
+            f.write((json.dumps(linha, ensure_ascii=False) + "\n").encode("utf-8"))
+            total += 1
+    os.replace(temporario, destino)
+    with conn:
+        conn.execute("DELETE FROM logs WHERE timestamp >= ? AND timestamp < ?", intervalo)
+        conn.execute('''INSERT INTO log_archives (month, path, rows, archived_at) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(month) DO UPDATE SET rows = rows + excluded.rows,
+                        archived_at = excluded.archived_at''',
+                     (mes, destino, total, datetime.now().isoformat()))
+    return total
+
+
+def arquivar_antigos(conn, manter_meses=6, destino_dir=ARQUIVO_LOGS_DIR, hoje=None):
+    hoje = hoje or date.today()
+    indice = hoje.year * 12 + hoje.month - 1 - manter_meses
+    limite = f"{indice // 12:04d}-{indice % 12 + 1:02d}"
+    meses = [r[0] for r in conn.execute('''SELECT DISTINCT month FROM log_counters WHERE month <= ?
+                                           ORDER BY month''', (limite,))]
+    return {mes: arquivar_mes(conn, mes, destino_dir) for mes in meses
+            if conn.execute("SELECT 1 FROM logs WHERE timestamp >= ? AND timestamp < ? LIMIT 1",
+                            (mes, _proximo_mes(mes))).fetchone()}
+
+
+def arquivos(conn):
+    return conn.execute("SELECT month, path, rows, archived_at FROM log_archives ORDER BY month DESC").fetchall()
+
+
+def ler_arquivo(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for linha in f:
+            yield json.loads(linha)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Arquivamento do histórico de ações")
+    parser.add_argument("comando", choices=["arquivar"])
+    parser.add_argument("--db", default="document_manager.db")
+    parser.add_argument("--manter-meses", type=int, default=6)
+    parser.add_argument("--destino", default=ARQUIVO_LOGS_DIR)
+    args = parser.parse_args(argv)
+    from gestao import migrations
+    conn = db.conectar(args.db)
+    migrations.migrar(conn)
+    for mes, total in arquivar_antigos(conn, args.manter_meses, args.destino).items():
+        print(f"{mes}: {total} registro(s) arquivado(s)")
+    conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
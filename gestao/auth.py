@@ -0,0 +1,56 @@
+import time
+import threading
+from collections import namedtuple
+
+# Contexto de autorização (projetos e permissões do usuário) em memória,
+# compartilhado entre as sessões do processo. Expira pelo TTL e é
+# invalidado explicitamente quando o admin altera usuários ou projetos.
+
+ContextoUsuario = namedtuple("ContextoUsuario", "username projects permissions")
+
+
+class CacheAutorizacao:
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self._contextos = {}
+        self._projetos = None
+        self._trava = threading.Lock()
+
+    def contexto(self, conn, username):
+        agora = time.monotonic()
+        with self._trava:
+            item = self._contextos.get(username)
+        if item and item[1] > agora:
+            return item[0]
+        linha = conn.execute("SELECT permissions FROM users WHERE username=?", (username,)).fetchone()
+        projetos = tuple(r[0] for r in conn.execute(
+            "SELECT project FROM user_projects WHERE username=? ORDER BY project", (username,)))
+        permissoes = tuple(linha[0].split(',')) if linha and linha[0] else ()
+        contexto = ContextoUsuario(username, projetos, permissoes)
+        with self._trava:
+            self._contextos[username] = (contexto, agora + self.ttl)
+        return contexto
+
+    def projetos(self, conn):
+        agora = time.monotonic()
+        with self._trava:
+            item = self._projetos
+        if item and item[1] > agora:
+            return item[0]
+        nomes = tuple(r[0] for r in conn.execute("SELECT name FROM projects ORDER BY name"))
+        with self._trava:
+            self._projetos = (nomes, agora + self.ttl)
+        return nomes
+
+    def invalidar(self, username=None):
+        with self._trava:
+            if username is None:
+                self._contextos.clear()
+            else:
+                self._contextos.pop(username, None)
+
+    def invalidar_projetos(self):
+        with self._trava:
+            self._projetos = None
+            # Remover um projeto afeta o contexto de todos os membros
+            self._contextos.clear()
@@ -0,0 +1,204 @@
+import os
+import sys
+import hashlib
+import argparse
+from datetime import datetime
+
+from gestao import db
+from gestao.revisions import extrair_info_arquivo
+
+# Catálogo de documentos: espelho em SQLite da árvore
+# uploads/{projeto}/{disciplina}/{fase}[/Revisoes/{nome_base}]/{arquivo}
+# mantido pelo upload e pelo arquivamento de revisões. Navegação e
+# verificação de revisões consultam esta tabela em vez do disco.
+
+PASTA_REVISOES = "Revisoes"
+BLOCO_HASH = 1024 * 1024
+
+
+def init_catalog_schema(conn, commit=True):
+    conn.execute('''CREATE TABLE IF NOT EXISTS documents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        path TEXT UNIQUE,
+        project TEXT,
+        discipline TEXT,
+        phase TEXT,
+        name TEXT,
+        nome_base TEXT,
+        revisao TEXT,
+        versao TEXT,
+        size INTEGER,
+        mtime REAL,
+        sha256 TEXT,
+        archived INTEGER DEFAULT 0,
+        updated_at TEXT
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_local ON documents(project, discipline, phase, archived, name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_familia ON documents(project, discipline, phase, nome_base)")
+    if commit:
+        conn.commit()
+
+
+def sha256_arquivo(full_path):
+    h = hashlib.sha256()
+    with open(full_path, "rb") as f:
+        for bloco in iter(lambda: f.read(BLOCO_HASH), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def localizar(full_path, base_dir):
+    # (projeto, disciplina, fase, arquivado) ou None se fora do layout esperado
+    partes = os.path.relpath(full_path, base_dir).split(os.sep)
+    if len(partes) == 4:
+        return partes[0], partes[1], partes[2], 0
+    if len(partes) == 6 and partes[3] == PASTA_REVISOES:
+        return partes[0], partes[1], partes[2], 1
+    return None
+
+
+def registrar_documento(conn, full_path, base_dir, sha256=None, commit=True):
+    local = localizar(full_path, base_dir)
+    if not local:
+        return None
+    project, discipline, phase, archived = local
+    stat = os.stat(full_path)
+    atual = conn.execute("SELECT id, size, mtime, sha256 FROM documents WHERE path=?", (full_path,)).fetchone()
+    if sha256 is None:
+        if atual and atual[1] == stat.st_size and atual[2] == stat.st_mtime and atual[3]:
+            sha256 = atual[3]
+        else:
+            sha256 = sha256_arquivo(full_path)
+    name = os.path.basename(full_path)
+    nome_base, revisao, versao = extrair_info_arquivo(name)
+    agora = datetime.now().isoformat()
+    valores = (project, discipline, phase, name, nome_base, revisao, versao,
+               stat.st_size, stat.st_mtime, sha256, archived, agora)
+    # archived_at: quando entrou em Revisoes/ (preservado enquanto continuar lá)
+    if atual:
+        conn.execute('''UPDATE documents SET project=?, discipline=?, phase=?, name=?, nome_base=?, revisao=?,
+                        versao=?, size=?, mtime=?, sha256=?, archived=?, updated_at=?,
+                        archived_at=CASE WHEN ?=1 THEN COALESCE(archived_at, ?) END WHERE id=?''',
+                     valores + (archived, agora, atual[0]))
+        doc_id = atual[0]
+    else:
+        doc_id = conn.execute('''INSERT INTO documents (project, discipline, phase, name, nome_base, revisao,
+                                 versao, size, mtime, sha256, archived, updated_at, archived_at, path)
+                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                              valores + (agora if archived else None, full_path)).lastrowid
+    if commit:
+        conn.commit()
+    return doc_id
+
+
+def arquivar_documento(conn, origem, destino, commit=True):
+    # Mantém o mesmo id: o documento só muda de pasta
+    agora = datetime.now().isoformat()
+    conn.execute("UPDATE documents SET path=?, archived=1, updated_at=?, archived_at=? WHERE path=?",
+                 (destino, agora, agora, origem))
+    if commit:
+        conn.commit()
+
+
+def mover_documento(conn, origem, destino, commit=True):
+    # Mesmo id (e comentários) no novo caminho; os demais campos vêm de registrar_documento
+    conn.execute("UPDATE documents SET path=?, updated_at=? WHERE path=?",
+                 (destino, datetime.now().isoformat(), origem))
+    if commit:
+        conn.commit()
+
+
+def remover_documento(conn, full_path, commit=True):
+    conn.execute("DELETE FROM documents WHERE path=?", (full_path,))
+    if commit:
+        conn.commit()
+
+
+def obter_documento(conn, full_path):
+    return conn.execute("SELECT id, name, revisao, versao, archived, sha256, cold FROM documents WHERE path=?",
+                        (full_path,)).fetchone()
+
+
+def conteudo_em_uso(conn, sha256):
+    # Algum documento em disco (fora do armazenamento frio) com este conteúdo
+    return conn.execute("SELECT 1 FROM documents WHERE sha256=? AND cold=0 LIMIT 1",
+                        (sha256,)).fetchone() is not None
+
+
+def catalogo_vazio(conn):
+    return conn.execute("SELECT 1 FROM documents LIMIT 1").fetchone() is None
+
+
+# A árvore mostra só o que a fase lista (mesmo filtro de contar_arquivos): uma
+# fase apenas com revisões arquivadas (ou no armazenamento frio, que são
+# sempre arquivadas) não aparece.
+def listar_disciplinas(conn, project):
+    return [r[0] for r in conn.execute('''SELECT DISTINCT discipline FROM documents
+                                          WHERE project=? AND archived=0 ORDER BY discipline''', (project,))]
+
+
+def listar_fases(conn, project, discipline):
+    return [r[0] for r in conn.execute('''SELECT DISTINCT phase FROM documents
+                                          WHERE project=? AND discipline=? AND archived=0 ORDER BY phase''',
+                                       (project, discipline))]
+
+
+ORDENACOES = {
+    "nome": "name",
+    "revisao": "CAST(substr(revisao, 2) AS INTEGER) DESC, CAST(substr(versao, 2) AS INTEGER) DESC, name",
+    "mtime": "mtime DESC, name",
+}
+
+
+def contar_arquivos(conn, project, discipline, phase):
+    return conn.execute('''SELECT COUNT(*) FROM documents
+                           WHERE project=? AND discipline=? AND phase=? AND archived=0''',
+                        (project, discipline, phase)).fetchone()[0]
+
+
+def listar_arquivos(conn, project, discipline, phase, ordem="nome", limite=-1, offset=0):
+    return conn.execute(f'''SELECT id, path, name, revisao, versao, size, mtime, sha256 FROM documents
+                            WHERE project=? AND discipline=? AND phase=? AND archived=0
+                            ORDER BY {ORDENACOES[ordem]} LIMIT ? OFFSET ?''',
+                        (project, discipline, phase, limite, offset)).fetchall()
+
+
+def revisoes_da_familia(conn, project, discipline, phase, nome_base):
+    return conn.execute('''SELECT path, name, revisao, versao, archived FROM documents
+                           WHERE project=? AND discipline=? AND phase=? AND nome_base=?''',
+                        (project, discipline, phase, nome_base)).fetchall()
+
+
+def reconciliar(conn, base_dir):
+    # Reconstrói o catálogo a partir do disco (arquivos novos, alterados e removidos)
+    vistos = set()
+    for root, dirs, files in os.walk(base_dir):
+        for file in files:
+            full_path = os.path.join(root, file)
+            if registrar_documento(conn, full_path, base_dir, commit=False):
+                vistos.add(full_path)
+        conn.commit()
+    # Documentos no armazenamento frio não estão em disco de propósito
+    removidos = [p for (p,) in conn.execute("SELECT path FROM documents WHERE cold=0").fetchall() if p not in vistos]
+    for p in removidos:
+        remover_documento(conn, p, commit=False)
+    conn.commit()
+    return len(vistos), len(removidos)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manutenção do catálogo de documentos")
+    parser.add_argument("comando", choices=["reconcile"])
+    parser.add_argument("--db", default="document_manager.db")
+    parser.add_argument("--base", default="uploads")
+    args = parser.parse_args(argv)
+    from gestao import migrations
+    conn = db.conectar(args.db)
+    migrations.migrar(conn)
+    total, removidos = reconciliar(conn, args.base)
+    print(f"{total} documento(s) catalogado(s), {removidos} removido(s).")
+    conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
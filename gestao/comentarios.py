@@ -0,0 +1,49 @@
+from datetime import datetime
+
+# Comentários por documento (documents.id, que se mantém quando a revisão é
+# arquivada em Revisoes/). A árvore pede o resumo (total e último
+# comentário) de todos os arquivos visíveis numa única consulta; a conversa
+# completa só é lida quando aberta, paginada por keyset (timestamp, id).
+
+TAMANHO_PAGINA = 20
+
+
+def adicionar(conn, document_id, file_path, username, comment, commit=True):
+    # file_path fica como registro histórico; a chave é o document_id
+    cur = conn.execute('''INSERT INTO comments (file_path, username, timestamp, comment, document_id)
+                          VALUES (?, ?, ?, ?, ?)''',
+                       (file_path, username, datetime.now().isoformat(), comment, document_id))
+    if commit:
+        conn.commit()
+    return cur.lastrowid
+
+
+def consultar(conn, document_id, cursor=None, limite=TAMANHO_PAGINA):
+    # Retorna ([(id, username, timestamp, comment)], cursor da próxima página ou None)
+    condicao, parametros = "", []
+    if cursor:
+        condicao = "AND (timestamp, id) < (?, ?)"
+        parametros.extend(cursor)
+    linhas = conn.execute(f'''SELECT id, username, timestamp, comment FROM comments
+                              WHERE document_id=? {condicao}
+                              ORDER BY timestamp DESC, id DESC LIMIT ?''',
+                          (document_id, *parametros, limite + 1)).fetchall()
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo = (linhas[-1][2], linhas[-1][0])
+    return linhas, proximo
+
+
+def resumo(conn, document_ids):
+    # {document_id: (total, autor do último, data do último, último comentário)}
+    document_ids = list(document_ids)
+    if not document_ids:
+        return {}
+    marcadores = ", ".join("?" * len(document_ids))
+    # Com MAX() no agregado, o SQLite devolve as colunas soltas (username,
+    # comment) da mesma linha do máximo: total e último numa só passada
+    return {document_id: (total, username, timestamp, comment)
+            for document_id, total, username, timestamp, comment in conn.execute(
+                f'''SELECT document_id, COUNT(*), username, MAX(timestamp), comment
+                    FROM comments WHERE document_id IN ({marcadores}) GROUP BY document_id''', document_ids)}
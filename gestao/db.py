@@ -0,0 +1,174 @@
+import time
+import queue
+import atexit
+import sqlite3
+import weakref
+import threading
+from datetime import datetime
+
+from gestao import metrics
+
+# Camada de acesso ao SQLite: uma conexão por thread (emprestada de um pool
+# e devolvida quando a thread termina), modo WAL, busy timeout e cache de
+# prepared statements, além de um gravador de logs com commit em grupo.
+# Toda consulta é cronometrada (metrics) e as lentas são registradas.
+
+TIMEOUT_PADRAO = 30
+STATEMENTS_EM_CACHE = 256
+
+
+class CursorMedido(sqlite3.Cursor):
+    # Mede o execute (preparo + primeiro passo); o fetch fica de fora
+    def execute(self, sql, parametros=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            metrics.consulta_sql(sql, time.perf_counter() - inicio)
+
+    def executemany(self, sql, sequencia):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, sequencia)
+        finally:
+            metrics.consulta_sql(sql, time.perf_counter() - inicio)
+
+
+class ConexaoMedida(sqlite3.Connection):
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    # Os atalhos da conexão criam o cursor internamente, sem passar por cursor()
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, sequencia):
+        return self.cursor().executemany(sql, sequencia)
+
+
+def conectar(db_path, timeout=TIMEOUT_PADRAO, check_same_thread=True):
+    conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=check_same_thread,
+                           cached_statements=STATEMENTS_EM_CACHE, factory=ConexaoMedida)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(timeout * 1000)}")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+class _Emprestimo:
+    __slots__ = ("conn", "__weakref__")
+
+
+class GerenciadorConexoes:
+    def __init__(self, db_path, tamanho_pool=8, timeout=TIMEOUT_PADRAO):
+        self.db_path = db_path
+        self.tamanho_pool = tamanho_pool
+        self.timeout = timeout
+        self._livres = queue.LifoQueue()
+        self._local = threading.local()
+
+    def conexao(self):
+        emprestimo = getattr(self._local, "emprestimo", None)
+        if emprestimo is None:
+            try:
+                conn = self._livres.get_nowait()
+            except queue.Empty:
+                # Usada por uma thread de cada vez; só muda de thread ao voltar ao pool
+                conn = conectar(self.db_path, self.timeout, check_same_thread=False)
+            emprestimo = _Emprestimo()
+            emprestimo.conn = conn
+            # Quando a thread termina o threading.local é descartado e a conexão volta ao pool
+            weakref.finalize(emprestimo, self._devolver, conn)
+            self._local.emprestimo = emprestimo
+        return emprestimo.conn
+
+    def _devolver(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        if self._livres.qsize() < self.tamanho_pool:
+            self._livres.put(conn)
+        else:
+            conn.close()
+
+    def fechar(self):
+        while True:
+            try:
+                self._livres.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class GravadorLogs:
+    # Agrupa os INSERTs em logs e grava em lote (um commit por lote)
+    def __init__(self, db_path, intervalo=0.5, lote_maximo=500):
+        self.db_path = db_path
+        self.intervalo = intervalo
+        self.lote_maximo = lote_maximo
+        self._fila = queue.Queue()
+        self._gravado = threading.Condition()
+        self._enviados = 0
+        self._gravados = 0
+        self._thread = threading.Thread(target=self._loop, name="gestao-logs", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def registrar(self, user, action, file, project=None, timestamp=None):
+        with self._gravado:
+            self._enviados += 1
+        self._fila.put((timestamp or datetime.now().isoformat(), user, action, file, project))
+
+    def flush(self, timeout=5):
+        # Bloqueia até que tudo o que foi registrado até agora esteja no banco
+        with self._gravado:
+            alvo = self._enviados
+            self._gravado.wait_for(lambda: self._gravados >= alvo, timeout)
+
+    def _loop(self):
+        conn = conectar(self.db_path)
+        while True:
+            lote = [self._fila.get()]
+            try:
+                while len(lote) < self.lote_maximo:
+                    lote.append(self._fila.get(timeout=self.intervalo))
+            except queue.Empty:
+                pass
+            try:
+                with conn:
+                    conn.executemany("INSERT INTO logs (timestamp, user, action, file, project) VALUES (?, ?, ?, ?, ?)",
+                                     lote)
+            except sqlite3.Error:
+                # Não derruba a thread: o lote é reenfileirado na próxima volta
+                for item in lote:
+                    self._fila.put(item)
+                time.sleep(self.intervalo)
+                continue
+            with self._gravado:
+                self._gravados += len(lote)
+                self._gravado.notify_all()
+
+
+_gerenciador = None
+_gravador_logs = None
+_trava = threading.Lock()
+
+
+def configurar(db_path, tamanho_pool=8):
+    global _gerenciador, _gravador_logs
+    with _trava:
+        if _gerenciador is None or _gerenciador.db_path != db_path:
+            _gerenciador = GerenciadorConexoes(db_path, tamanho_pool)
+            _gravador_logs = GravadorLogs(db_path)
+    return _gerenciador
+
+
+def get_connection():
+    return _gerenciador.conexao()
+
+
+def gravador_logs():
+    return _gravador_logs
@@ -0,0 +1,323 @@
+import os
+import hmac
+import ipaddress
+import time
+import secrets
+import hashlib
+import zipfile
+import mimetypes
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit, parse_qs, urlencode
+
+from gestao import metrics
+from gestao.catalog import PASTA_REVISOES
+
+# Servidor HTTP auxiliar que entrega os documentos em blocos, com suporte a
+# Range e ETag, no lugar de embutir o arquivo inteiro em base64 na página.
+# Os links são assinados (HMAC + validade) pela sessão autenticada do app.
+# /zip/<pasta> empacota uma fase ou disciplina inteira em streaming e
+# /metrics expõe os tempos do processo no formato texto do Prometheus, só
+# para a própria máquina ou com o token de GESTAO_METRICS_TOKEN (Bearer).
+#
+# GESTAO_FILES_URL é o endereço público do servidor como o navegador o vê
+# (ex.: https://arquivos.empresa/ atrás de um proxy HTTPS, obrigatório se o
+# app for servido por HTTPS). Sem ela, os links usam o host pelo qual o
+# navegador acessou o app, na porta deste servidor, em HTTP.
+
+BLOCO = 64 * 1024
+VALIDADE_PADRAO = 3600
+# Formatos já comprimidos vão sem deflate: economiza CPU sem perder tamanho
+SEM_COMPRESSAO = (".pdf", ".jpg", ".jpeg", ".png", ".zip", ".dwg", ".docx", ".xlsx")
+
+
+def _etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _intervalo(cabecalho, tamanho):
+    # Aceita um único intervalo: bytes=a-b, bytes=a- ou bytes=-n
+    if not cabecalho.startswith("bytes=") or "," in cabecalho:
+        return None
+    inicio, _, fim = cabecalho[6:].strip().partition("-")
+    try:
+        if not inicio:
+            n = int(fim)
+            if n <= 0:
+                return None
+            return max(tamanho - n, 0), tamanho - 1
+        inicio = int(inicio)
+        fim = int(fim) if fim else tamanho - 1
+    except ValueError:
+        return None
+    if inicio >= tamanho or fim < inicio:
+        return None
+    return inicio, min(fim, tamanho - 1)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._servir(enviar_corpo=False)
+
+    def do_GET(self):
+        self._servir(enviar_corpo=True)
+
+    def _erro(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _servir(self, enviar_corpo):
+        servidor = self.server.servidor_arquivos
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/metrics":
+            return self._servir_metricas(enviar_corpo)
+        if url.path.startswith("/zip/"):
+            return self._servir_zip(unquote(url.path[len("/zip/"):]), query, enviar_corpo)
+        if not url.path.startswith("/files/"):
+            return self._erro(HTTPStatus.NOT_FOUND)
+        rel = unquote(url.path[len("/files/"):])
+        download = query.get("download") == "1"
+        if not servidor.validar(rel, query.get("exp", ""), download, query.get("sig", "")):
+            return self._erro(HTTPStatus.FORBIDDEN)
+
+        full_path = servidor.resolver(rel)
+        if not full_path and servidor.recuperar_frio(rel):
+            full_path = servidor.resolver(rel)
+        if not full_path:
+            return self._erro(HTTPStatus.NOT_FOUND)
+        stat = os.stat(full_path)
+        etag = _etag(stat)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        tamanho = stat.st_size
+        inicio, fim = 0, tamanho - 1
+        status = HTTPStatus.OK
+        cabecalho_range = self.headers.get("Range")
+        if cabecalho_range and tamanho and self.headers.get("If-Range", etag) == etag:
+            intervalo = _intervalo(cabecalho_range, tamanho)
+            if intervalo is None:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{tamanho}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            inicio, fim = intervalo
+            status = HTTPStatus.PARTIAL_CONTENT
+
+        nome = os.path.basename(full_path)
+        disposicao = "attachment" if download else "inline"
+        self.send_response(status)
+        self.send_header("Content-Type", mimetypes.guess_type(nome)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(fim - inicio + 1 if tamanho else 0))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.date_time_string(int(stat.st_mtime)))
+        self.send_header("Cache-Control", "private, max-age=3600")
+        self.send_header("Content-Disposition", f"{disposicao}; filename*=UTF-8''{quote(nome)}")
+        if status == HTTPStatus.PARTIAL_CONTENT:
+            self.send_header("Content-Range", f"bytes {inicio}-{fim}/{tamanho}")
+        self.end_headers()
+        if not enviar_corpo or not tamanho:
+            return
+
+        restante = fim - inicio + 1
+        with open(full_path, "rb") as f:
+            f.seek(inicio)
+            while restante > 0:
+                bloco = f.read(min(BLOCO, restante))
+                if not bloco:
+                    break
+                try:
+                    self.wfile.write(bloco)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                restante -= len(bloco)
+
+    def _servir_metricas(self, enviar_corpo):
+        if not self.server.servidor_arquivos.metricas_permitidas(self.client_address[0],
+                                                                 self.headers.get("Authorization", "")):
+            return self._erro(HTTPStatus.FORBIDDEN)
+        corpo = metrics.prometheus().encode()
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if enviar_corpo:
+            self.wfile.write(corpo)
+
+    def _servir_zip(self, rel, query, enviar_corpo):
+        servidor = self.server.servidor_arquivos
+        if not servidor.validar("zip:" + rel, query.get("exp", ""), True, query.get("sig", "")):
+            return self._erro(HTTPStatus.FORBIDDEN)
+        pasta = servidor.resolver(rel, pasta=True)
+        if not pasta:
+            return self._erro(HTTPStatus.NOT_FOUND)
+
+        nome = rel.strip("/").replace("/", "-") + ".zip"
+        # Tamanho final desconhecido: sem Content-Length, a conexão delimita a resposta
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(nome)}")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        if not enviar_corpo:
+            return
+        try:
+            escrever_zip(self.wfile, pasta)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+
+def arquivos_do_pacote(pasta):
+    # Arquivos atuais da pasta (revisões arquivadas ficam de fora), em ordem
+    for root, dirs, files in os.walk(pasta):
+        dirs[:] = sorted(d for d in dirs if d != PASTA_REVISOES)
+        for file in sorted(files):
+            full_path = os.path.join(root, file)
+            yield full_path, os.path.relpath(full_path, pasta).replace(os.sep, "/")
+
+
+def escrever_zip(saida, pasta):
+    # zipfile grava em fluxo não posicionável usando data descriptors; cada
+    # arquivo é copiado em blocos, então a memória fica constante
+    with zipfile.ZipFile(saida, "w", allowZip64=True) as zf:
+        for full_path, nome in arquivos_do_pacote(pasta):
+            try:
+                stat = os.stat(full_path)
+                origem = open(full_path, "rb")
+            except OSError:
+                continue
+            with origem:
+                info = zipfile.ZipInfo.from_file(full_path, nome)
+                info.compress_type = zipfile.ZIP_STORED if nome.lower().endswith(SEM_COMPRESSAO) \
+                    else zipfile.ZIP_DEFLATED
+                with zf.open(info, "w", force_zip64=stat.st_size > 0x7FFFFFFF) as destino:
+                    for bloco in iter(lambda: origem.read(BLOCO), b""):
+                        destino.write(bloco)
+
+
+class ServidorArquivos:
+    def __init__(self, base_dir, host=None, port=None, url_publica=None, segredo=None, recuperar=None):
+        self.base_dir = os.path.realpath(base_dir)
+        # recuperar(rel) -> bool: traz do armazenamento frio um arquivo fora do disco
+        self.recuperar = recuperar
+        self.host = host or os.environ.get("GESTAO_FILES_HOST", "0.0.0.0")
+        self.port = int(port or os.environ.get("GESTAO_FILES_PORT", 8502))
+        self._url_configurada = url_publica or os.environ.get("GESTAO_FILES_URL")
+        self.url_publica = (self._url_configurada or f"http://localhost:{self.port}").rstrip("/")
+        self.url_configurada = bool(self._url_configurada)
+        segredo = segredo or os.environ.get("GESTAO_FILES_SECRET") or secrets.token_hex(32)
+        self._segredo = segredo.encode()
+        self._token_metricas = os.environ.get("GESTAO_METRICS_TOKEN", "").encode()
+        self._httpd = None
+
+    def start(self):
+        if self._httpd:
+            return self
+        try:
+            self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        except OSError:
+            if self._url_configurada:
+                raise
+            # Porta ocupada (outra instância do app): usa uma porta livre qualquer
+            self._httpd = ThreadingHTTPServer((self.host, 0), _Handler)
+            self.port = self._httpd.server_address[1]
+            self.url_publica = f"http://localhost:{self.port}"
+        self._httpd.daemon_threads = True
+        self._httpd.servidor_arquivos = self
+        threading.Thread(target=self._httpd.serve_forever, name="gestao-arquivos", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def _assinar(self, rel, exp, download):
+        mensagem = f"{rel}|{exp}|{int(download)}".encode()
+        return hmac.new(self._segredo, mensagem, hashlib.sha256).hexdigest()
+
+    def validar(self, rel, exp, download, assinatura):
+        if not exp.isdigit() or int(exp) < time.time():
+            return False
+        return hmac.compare_digest(self._assinar(rel, exp, download), assinatura)
+
+    def metricas_permitidas(self, cliente, autorizacao):
+        if self._token_metricas:
+            esquema, _, token = autorizacao.partition(" ")
+            if esquema.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), self._token_metricas):
+                return True
+        return ipaddress.ip_address(cliente.removeprefix("::ffff:")).is_loopback
+
+    def resolver(self, rel, pasta=False):
+        full_path = os.path.realpath(os.path.join(self.base_dir, rel))
+        if os.path.commonpath([full_path, self.base_dir]) != self.base_dir:
+            return None
+        if not (os.path.isdir(full_path) if pasta else os.path.isfile(full_path)):
+            return None
+        return full_path
+
+    def recuperar_frio(self, rel):
+        if not self.recuperar or os.pardir in rel.split("/"):
+            return False
+        try:
+            return self.recuperar(rel)
+        except (OSError, ValueError):
+            return False
+
+    def url_para(self, host):
+        # Base dos links para um navegador que acessou o app por `host` (cabeçalho Host)
+        if self._url_configurada or not host:
+            return self.url_publica
+        nome = urlsplit("//" + host).hostname
+        if not nome:
+            return self.url_publica
+        return f"http://[{nome}]:{self.port}" if ":" in nome else f"http://{nome}:{self.port}"
+
+    def para_host(self, host):
+        return Links(self, self.url_para(host))
+
+    def url(self, full_path, download=False, validade=VALIDADE_PADRAO, base=None):
+        rel = os.path.relpath(os.path.realpath(full_path), self.base_dir).replace(os.sep, "/")
+        # Arredonda a validade para que o link seja estável entre reruns (cache do navegador)
+        exp = str((int(time.time()) // validade + 2) * validade)
+        query = {"exp": exp, "sig": self._assinar(rel, exp, download)}
+        if download:
+            query["download"] = "1"
+        return f"{base or self.url_publica}/files/{quote(rel)}?{urlencode(query)}"
+
+    def url_zip(self, pasta, validade=VALIDADE_PADRAO, base=None):
+        # Pacote .zip de uma pasta (fase ou disciplina) sob base_dir
+        rel = os.path.relpath(os.path.realpath(pasta), self.base_dir).replace(os.sep, "/")
+        exp = str((int(time.time()) // validade + 2) * validade)
+        query = {"exp": exp, "sig": self._assinar("zip:" + rel, exp, True)}
+        return f"{base or self.url_publica}/zip/{quote(rel)}?{urlencode(query)}"
+
+
+class Links:
+    # Links assinados com a base de um navegador (ServidorArquivos.para_host)
+    def __init__(self, servidor, url_publica):
+        self.servidor = servidor
+        self.url_publica = url_publica
+
+    def url(self, full_path, download=False, validade=VALIDADE_PADRAO):
+        return self.servidor.url(full_path, download, validade, base=self.url_publica)
+
+    def url_zip(self, pasta, validade=VALIDADE_PADRAO):
+        return self.servidor.url_zip(pasta, validade, base=self.url_publica)
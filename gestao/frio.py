@@ -0,0 +1,216 @@
+import os
+import gzip
+import time
+import hashlib
+import tempfile
+from datetime import datetime
+from collections import namedtuple
+
+from gestao import catalog, search, jobs, storage
+from gestao.revisions import numero
+
+# Armazenamento frio das revisões arquivadas. Pela política (idade mínima e
+# quantas revisões arquivadas mais recentes de cada família ficam no disco),
+# as demais vão comprimidas (gzip) para um diretório local ou um bucket S3
+# (MinIO etc.), endereçadas pelo SHA-256 do catálogo. O documento continua
+# no catálogo (mesmo id e comentários) com cold=1, fora da árvore, da busca
+# padrão, do índice de texto e da varredura; a primeira leitura pelo
+# servidor de arquivos o traz de volta para uploads/.
+
+DESTINO_PADRAO = os.environ.get("GESTAO_FRIO", "frio")
+DIAS_PADRAO = int(os.environ.get("GESTAO_FRIO_DIAS", 180))
+MANTER_PADRAO = int(os.environ.get("GESTAO_FRIO_MANTER", 1))
+NIVEL_GZIP = 6
+BLOCO = 1024 * 1024
+
+Candidato = namedtuple("Candidato", "id path sha256 size")
+
+
+def _comprimir(origem, destino, sha256):
+    # Comprime em blocos conferindo o SHA-256: nada vai para o frio corrompido
+    h = hashlib.sha256()
+    with open(origem, "rb") as f, gzip.GzipFile(fileobj=destino, mode="wb", compresslevel=NIVEL_GZIP) as g:
+        for bloco in iter(lambda: f.read(BLOCO), b""):
+            h.update(bloco)
+            g.write(bloco)
+    if h.hexdigest() != sha256:
+        raise ValueError(f"{origem}: conteúdo difere do catálogo")
+
+
+class ArmazemLocal:
+    # Falhas de um envio que não impedem os próximos (ver congelar)
+    erros = (OSError, ValueError)
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+
+    def __str__(self):
+        return self.diretorio
+
+    def _caminho(self, sha256):
+        return os.path.join(self.diretorio, sha256[:2], sha256 + ".gz")
+
+    def existe(self, sha256):
+        return os.path.exists(self._caminho(sha256))
+
+    def guardar(self, sha256, origem):
+        # Retorna o tamanho comprimido; conteúdo já guardado não é reenviado
+        destino = self._caminho(sha256)
+        if not os.path.exists(destino):
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            fd, temporario = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".parcial")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    _comprimir(origem, f, sha256)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temporario, destino)
+            except BaseException:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+                raise
+        return os.path.getsize(destino)
+
+    def abrir(self, sha256):
+        return gzip.open(self._caminho(sha256), "rb")
+
+
+class ArmazemS3:
+    # Qualquer serviço compatível com S3; credenciais pelas variáveis padrão da AWS
+    def __init__(self, bucket, prefixo="", endpoint=None):
+        try:
+            import boto3
+            from boto3.exceptions import Boto3Error
+            from botocore.exceptions import BotoCoreError, ClientError
+        except ImportError:
+            raise RuntimeError("armazenamento frio em S3 requer o pacote boto3")
+        self._erro_cliente = ClientError
+        # Resposta de erro do serviço, falha de conexão/credenciais ou de upload em partes
+        self.erros = (OSError, ValueError, ClientError, BotoCoreError, Boto3Error)
+        self.bucket = bucket
+        self.prefixo = prefixo
+        self.cliente = boto3.client("s3", endpoint_url=endpoint)
+
+    def __str__(self):
+        return f"s3://{self.bucket}/{self.prefixo}"
+
+    def _chave(self, sha256):
+        return f"{self.prefixo}{sha256[:2]}/{sha256}.gz"
+
+    def existe(self, sha256):
+        try:
+            self.cliente.head_object(Bucket=self.bucket, Key=self._chave(sha256))
+        except self._erro_cliente:
+            return False
+        return True
+
+    def guardar(self, sha256, origem):
+        if self.existe(sha256):
+            return self.cliente.head_object(Bucket=self.bucket, Key=self._chave(sha256))["ContentLength"]
+        # Comprime num temporário local: o upload em partes precisa de um arquivo posicionável
+        with tempfile.TemporaryFile() as f:
+            _comprimir(origem, f, sha256)
+            tamanho = f.tell()
+            f.seek(0)
+            self.cliente.upload_fileobj(f, self.bucket, self._chave(sha256))
+        return tamanho
+
+    def abrir(self, sha256):
+        corpo = self.cliente.get_object(Bucket=self.bucket, Key=self._chave(sha256))["Body"]
+        return gzip.GzipFile(fileobj=corpo, mode="rb")
+
+
+def armazem(destino=DESTINO_PADRAO):
+    # "s3://bucket/prefixo" (endpoint em GESTAO_FRIO_ENDPOINT) ou um diretório local
+    if destino.startswith("s3://"):
+        bucket, _, prefixo = destino[len("s3://"):].partition("/")
+        if prefixo and not prefixo.endswith("/"):
+            prefixo += "/"
+        return ArmazemS3(bucket, prefixo, os.environ.get("GESTAO_FRIO_ENDPOINT"))
+    return ArmazemLocal(destino)
+
+
+def candidatos(conn, dias=DIAS_PADRAO, manter=MANTER_PADRAO, agora=None):
+    # Revisões arquivadas há mais de `dias` dias (archived_at, não o mtime do
+    # arquivo, que um hard link deduplicado herda de outro documento), exceto
+    # as `manter` mais recentes de cada família (as mais consultadas numa comparação)
+    limite = datetime.fromtimestamp((agora or time.time()) - dias * 86400).isoformat()
+    por_familia = {}
+    for linha in conn.execute('''SELECT id, path, sha256, size, archived_at, project, discipline, phase, nome_base,
+                                        revisao, versao
+                                 FROM documents WHERE archived=1 AND cold=0 AND sha256 IS NOT NULL'''):
+        por_familia.setdefault(linha[5:9], []).append(linha)
+    escolhidos = []
+    for linhas in por_familia.values():
+        linhas.sort(key=lambda l: (numero(l[9]), numero(l[10])), reverse=True)
+        escolhidos.extend(Candidato(*l[:4]) for l in linhas[manter:] if l[4] and l[4] < limite)
+    return escolhidos
+
+
+def congelar(conn, armazem_frio, candidatos, blobs_dir):
+    # Retorna (movidos, bytes originais, bytes comprimidos, erros [(path, erro)])
+    movidos, originais, comprimidos, erros = 0, 0, 0, []
+    for candidato in candidatos:
+        try:
+            comprimidos += armazem_frio.guardar(candidato.sha256, candidato.path)
+        except armazem_frio.erros as e:
+            # Registrada e segue: um envio que falha não interrompe o lote
+            erros.append((candidato.path, str(e) or type(e).__name__))
+            continue
+        # Catálogo primeiro: se o processo cair antes da remoção, limpar_congelados termina o serviço
+        conn.execute("UPDATE documents SET cold=1 WHERE id=?", (candidato.id,))
+        search.remover_do_indice(conn, candidato.path, commit=False)
+        conn.execute("DELETE FROM jobs WHERE path=? AND status=?", (candidato.path, jobs.PENDENTE))
+        conn.commit()
+        _remover_do_disco(conn, candidato.path, candidato.sha256, blobs_dir)
+        movidos += 1
+        originais += candidato.size or 0
+    return movidos, originais, comprimidos, erros
+
+
+def _remover_do_disco(conn, path, sha256, blobs_dir):
+    if os.path.exists(path):
+        os.remove(path)
+    pasta = os.path.dirname(path)
+    if os.path.isdir(pasta) and not os.listdir(pasta):
+        # Revisoes/{nome_base} vazia
+        os.rmdir(pasta)
+    # O blob só é liberado se nenhum outro documento tiver o mesmo conteúdo
+    # (pelo catálogo: um documento publicado por cópia não soma link ao blob)
+    blob = storage.caminho_blob(blobs_dir, sha256)
+    if os.path.exists(blob) and os.stat(blob).st_nlink == 1 and not catalog.conteudo_em_uso(conn, sha256):
+        os.remove(blob)
+
+
+def limpar_congelados(conn, blobs_dir):
+    # Congelados cujo arquivo ficou no disco (interrupção entre commit e remoção)
+    restos = [(path, sha256) for path, sha256 in
+              conn.execute("SELECT path, sha256 FROM documents WHERE cold=1") if os.path.exists(path)]
+    for path, sha256 in restos:
+        _remover_do_disco(conn, path, sha256, blobs_dir)
+    return len(restos)
+
+
+def recuperar(conn, armazem_frio, path, base_dir, blobs_dir):
+    # Traz a revisão de volta para uploads/ (mesmo caminho e id); False se não estiver no frio
+    linha = conn.execute("SELECT sha256 FROM documents WHERE path=? AND cold=1", (path,)).fetchone()
+    if not linha:
+        return False
+    with armazem_frio.abrir(linha[0]) as fonte:
+        sha256, _, _, blob = storage.guardar_blob(fonte, blobs_dir)
+    if sha256 != linha[0]:
+        raise ValueError(f"{path}: conteúdo do armazenamento frio difere do catálogo")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    storage.publicar(blob, path)
+    catalog.registrar_documento(conn, path, base_dir, sha256=sha256, commit=False)
+    # Conta como arquivada agora: a política só a congela de novo após `dias`
+    conn.execute("UPDATE documents SET cold=0, archived_at=? WHERE path=?", (datetime.now().isoformat(), path))
+    jobs.enfileirar(conn, path, commit=False)
+    conn.commit()
+    return True
+
+
+def resumo(conn):
+    # (documentos no frio, bytes originais)
+    total, tamanho = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM documents WHERE cold=1").fetchone()
+    return total, tamanho
@@ -0,0 +1,250 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import multiprocessing
+from datetime import datetime
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from gestao import db, catalog, search, storage, jobs
+from gestao.catalog import PASTA_REVISOES
+from gestao.revisions import extrair_info_arquivo, numero
+
+# Importação em lote de acervos existentes, sem Streamlit. As pastas da
+# origem são mapeadas para projeto/disciplina/fase, cada família rXvY segue
+# a regra do upload (só a revisão mais alta fica na fase; as demais, e as
+# atuais superadas, vão para Revisoes/{nome_base}) e a cópia para o
+# repositório de blobs, o SHA-256 e a extração de texto rodam num pool de
+# processos. O progresso fica em ingest_files, gravado na mesma transação
+# do catálogo: uma importação interrompida retoma de onde parou.
+
+Item = namedtuple("Item", "origem project discipline phase name nome_base rev size mtime")
+
+LAYOUT_PADRAO = "projeto/disciplina/fase"
+NIVEIS_LAYOUT = ("projeto", "disciplina", "fase", "*")
+LOTE_COMMIT = 200
+
+
+def mapear(rel_dir, niveis, projeto_fixo=None):
+    # (projeto, disciplina, fase) da pasta relativa à origem, ou None
+    partes = [p for p in rel_dir.split(os.sep) if p and p != "."]
+    if PASTA_REVISOES in partes:
+        # Revisões antigas do acervo: a pasta da família não conta no layout
+        partes = partes[:partes.index(PASTA_REVISOES)]
+    if len(partes) != len(niveis):
+        return None
+    valores = {"projeto": projeto_fixo}
+    for nivel, parte in zip(niveis, partes):
+        if nivel != "*":
+            valores[nivel] = parte
+    local = (valores.get("projeto"), valores.get("disciplina"), valores.get("fase"))
+    return local if all(local) else None
+
+
+def varrer(origem, layout=LAYOUT_PADRAO, projeto_fixo=None, importados=None):
+    # Retorna (itens, ignorados [(caminho, motivo)], já importados)
+    niveis = layout.strip("/").split("/")
+    if any(n not in NIVEIS_LAYOUT for n in niveis):
+        raise ValueError(f"Layout inválido: {layout} (níveis: {', '.join(NIVEIS_LAYOUT)})")
+    importados = importados or {}
+    itens, ignorados, ja_importados = [], [], 0
+    for root, dirs, files in os.walk(origem):
+        dirs.sort()
+        local = mapear(os.path.relpath(root, origem), niveis, projeto_fixo)
+        for file in sorted(files):
+            caminho = os.path.abspath(os.path.join(root, file))
+            if not local:
+                ignorados.append((caminho, "pasta fora do layout"))
+                continue
+            nome_base, revisao, _ = extrair_info_arquivo(file)
+            if not nome_base:
+                ignorados.append((caminho, "nome sem rXvY"))
+                continue
+            stat = os.stat(caminho)
+            if importados.get(caminho) == (stat.st_size, stat.st_mtime):
+                ja_importados += 1
+                continue
+            itens.append(Item(caminho, *local, file, nome_base, numero(revisao), stat.st_size, stat.st_mtime))
+    return itens, ignorados, ja_importados
+
+
+def planejar(conn, itens, base_dir):
+    # Retorna (destinos [(item, destino)], arquivar [(origem, destino)], ignorados)
+    por_familia = {}
+    for item in itens:
+        por_familia.setdefault((item.project, item.discipline, item.phase, item.nome_base), []).append(item)
+
+    destinos, arquivar, ignorados = [], [], []
+    for (project, discipline, phase, nome_base), novos in sorted(por_familia.items()):
+        existentes = catalog.revisoes_da_familia(conn, project, discipline, phase, nome_base)
+        nomes = {name for _, name, _, _, _ in existentes}
+        rev_max = max([numero(revisao) for _, _, revisao, _, _ in existentes] + [i.rev for i in novos])
+        pasta = os.path.join(base_dir, project, discipline, phase)
+        pasta_revisao = os.path.join(pasta, PASTA_REVISOES, nome_base)
+        for item in novos:
+            if item.name in nomes:
+                ignorados.append((item.origem, "já existe no destino"))
+                continue
+            nomes.add(item.name)
+            destinos.append((item, os.path.join(pasta if item.rev == rev_max else pasta_revisao, item.name)))
+        for path, name, revisao, _, archived in existentes:
+            if not archived and numero(revisao) < rev_max:
+                arquivar.append((path, os.path.join(pasta_revisao, name)))
+    return destinos, arquivar, ignorados
+
+
+# Executado nos processos do pool: cópia + hash para o repositório de blobs e texto
+def preparar(origem, blobs_dir, extrair):
+    with open(origem, "rb") as f:
+        sha256, tamanho, reaproveitado, blob = storage.guardar_blob(f, blobs_dir)
+    paginas, erro = [], None
+    if extrair and origem.lower().endswith(search.EXTENSOES_TEXTO):
+        try:
+            paginas = search.extrair_texto_pdf(blob)
+        except Exception as e:
+            erro = str(e)
+    return {"sha256": sha256, "tamanho": tamanho, "reaproveitado": reaproveitado, "blob": blob,
+            "paginas": paginas, "erro": erro}
+
+
+def _arquivar_existentes(conn, arquivar):
+    for origem, destino in arquivar:
+        if not os.path.exists(origem):
+            continue
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        shutil.move(origem, destino)
+        catalog.arquivar_documento(conn, origem, destino, commit=False)
+        search.mover_no_indice(conn, origem, destino, commit=False)
+        jobs.mover_documento(conn, origem, destino, commit=False)
+        conn.commit()
+
+
+def _publicar(servicos, conn, item, destino, resultado, extrair, usuario):
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    storage.publicar(resultado["blob"], destino)
+    catalog.registrar_documento(conn, destino, servicos.base_dir, sha256=resultado["sha256"], commit=False)
+    if extrair:
+        search.gravar_paginas(conn, destino, servicos.base_dir, resultado["paginas"], resultado["erro"])
+    else:
+        # Texto e miniatura ficam para a fila de processamento do app
+        jobs.enfileirar(conn, destino, commit=False)
+    conn.execute('''INSERT OR REPLACE INTO ingest_files (origem, size, mtime, destino, sha256, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)''',
+                 (item.origem, item.size, item.mtime, destino, resultado["sha256"], datetime.now().isoformat()))
+    servicos.registrar_acao(usuario, "importar", destino)
+
+
+def importar(servicos, destinos, usuario="importacao", workers=None, extrair=True, progresso=None):
+    # Retorna (importados, bytes, reaproveitados, erros [(origem, erro)])
+    conn = servicos.conexao()
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    total_bytes = sum(item.size for item, _ in destinos) or 1
+    importados, copiados, reaproveitados, desde_commit = 0, 0, 0, 0
+    erros = []
+    inicio = time.monotonic()
+    fila = iter(destinos)
+    em_andamento = {}
+    # spawn: mesmo motivo da fila do app (o processo pode ter threads)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        def submeter():
+            # Janela limitada: o texto extraído não se acumula em memória
+            for item, destino in fila:
+                em_andamento[pool.submit(preparar, item.origem, servicos.blobs_dir, extrair)] = (item, destino)
+                if len(em_andamento) >= workers * 4:
+                    break
+
+        try:
+            submeter()
+            while em_andamento:
+                prontos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    item, destino = em_andamento.pop(futuro)
+                    try:
+                        resultado = futuro.result()
+                        _publicar(servicos, conn, item, destino, resultado, extrair, usuario)
+                    except Exception as e:
+                        erros.append((item.origem, str(e)))
+                        continue
+                    importados += 1
+                    desde_commit += 1
+                    copiados += item.size
+                    reaproveitados += resultado["reaproveitado"]
+                if desde_commit >= LOTE_COMMIT:
+                    conn.commit()
+                    desde_commit = 0
+                    if progresso:
+                        decorrido = time.monotonic() - inicio
+                        taxa = copiados / decorrido if decorrido else 0
+                        restante = (total_bytes - copiados) / taxa if taxa else 0
+                        progresso(importados, len(destinos), copiados, taxa, restante)
+                submeter()
+        finally:
+            # Interrompido ou não, o que já foi publicado fica registrado
+            conn.commit()
+    return importados, copiados, reaproveitados, erros
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa um acervo de arquivos rXvY para o repositório")
+    parser.add_argument("origem")
+    parser.add_argument("--projeto", help="projeto de destino (o layout passa a ser disciplina/fase)")
+    parser.add_argument("--layout", help=f"níveis das pastas da origem (padrão: {LAYOUT_PADRAO}; * ignora um nível)")
+    parser.add_argument("--cliente", help="cadastra sob este cliente os projetos que ainda não existem")
+    parser.add_argument("--usuario", default="importacao", help="usuário registrado no histórico")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--sem-texto", action="store_true", help="deixa a extração para a fila do app")
+    parser.add_argument("--simular", action="store_true", help="só mostra o plano, sem copiar nada")
+    parser.add_argument("--db", default="document_manager.db")
+    parser.add_argument("--base", default="uploads")
+    parser.add_argument("--blobs", default="blobs")
+    args = parser.parse_args(argv)
+
+    from gestao.servicos import Servicos
+    servicos = Servicos(args.db, args.base, args.blobs)
+    conn = servicos.conexao()
+    layout = args.layout or ("disciplina/fase" if args.projeto else LAYOUT_PADRAO)
+    importados_antes = {o: (s, m) for o, s, m in conn.execute("SELECT origem, size, mtime FROM ingest_files")}
+    itens, ignorados, ja_importados = varrer(args.origem, layout, args.projeto, importados_antes)
+
+    cadastrados = set(servicos.listar_projetos())
+    faltando = sorted({item.project for item in itens} - cadastrados)
+    if faltando and args.cliente:
+        servicos.adicionar_cliente(args.cliente)
+        for projeto in faltando:
+            servicos.adicionar_projeto(projeto, args.cliente)
+    elif faltando:
+        ignorados.extend((item.origem, "projeto não cadastrado (use --cliente)")
+                         for item in itens if item.project in faltando)
+        itens = [item for item in itens if item.project not in faltando]
+
+    destinos, arquivar, ignorados_plano = planejar(conn, itens, servicos.base_dir)
+    ignorados.extend(ignorados_plano)
+    atuais = sum(1 for _, destino in destinos if os.sep + PASTA_REVISOES + os.sep not in destino)
+    print(f"{len(destinos)} arquivo(s) a importar ({atuais} na fase, {len(destinos) - atuais} em {PASTA_REVISOES}/), "
+          f"{sum(i.size for i, _ in destinos) / 1e9:.2f} GB; {len(arquivar)} atual(is) a arquivar; "
+          f"{ja_importados} já importado(s); {len(ignorados)} ignorado(s).")
+    for caminho, motivo in ignorados[:20]:
+        print(f"  ignorado: {caminho}: {motivo}")
+    if args.simular or not destinos:
+        return 0
+
+    _arquivar_existentes(conn, arquivar)
+
+    def progresso(feitos, total, copiados, taxa, restante):
+        print(f"  {feitos}/{total} arquivo(s), {copiados / 1e9:.2f} GB, {taxa / 1e6:.0f} MB/s, "
+              f"faltam ~{restante / 60:.0f} min", flush=True)
+
+    importados, copiados, reaproveitados, erros = importar(servicos, destinos, args.usuario, args.workers,
+                                                           not args.sem_texto, progresso)
+    print(f"{importados} arquivo(s) importado(s), {copiados / 1e9:.2f} GB, "
+          f"{reaproveitados} com conteúdo já armazenado, {len(erros)} erro(s).")
+    for origem, erro in erros[:20]:
+        print(f"  erro: {origem}: {erro}", file=sys.stderr)
+    db.gravador_logs().flush()
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import time
+import types
+import logging
+import threading
+from multiprocessing.context import SpawnContext, SpawnProcess
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from gestao import db, search, catalog, thumbs, metrics
+
+# Fila persistente (SQLite) de processamento de documentos. Os jobs são
+# executados num pool de processos para que a extração via PyMuPDF nunca
+# rode na thread do Streamlit; jobs interrompidos voltam para a fila.
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDO = "concluido"
+ERRO = "erro"
+
+MAX_TENTATIVAS = 3
+
+log = logging.getLogger("gestao.jobs")
+
+# Sob "streamlit run", sys.modules["__main__"] é o próprio script do app, e o
+# spawn o reimportaria em cada processo do pool (como __mp_main__): outro
+# Servicos com fila, servidor de arquivos e observador. Durante o start() de
+# cada processo, o __main__ visto pelo spawn é um módulo vazio, sem __file__.
+_MAIN_VAZIO = types.ModuleType("__main__")
+_trava_main = threading.Lock()
+
+
+class _ProcessoSemScript(SpawnProcess):
+    def start(self):
+        with _trava_main:
+            principal = sys.modules["__main__"]
+            sys.modules["__main__"] = _MAIN_VAZIO
+            try:
+                super().start()
+            finally:
+                # O Streamlit pode ter trocado o __main__ nesse meio tempo: só desfaz a nossa troca
+                if sys.modules.get("__main__") is _MAIN_VAZIO:
+                    sys.modules["__main__"] = principal
+
+
+class _ContextoSemScript(SpawnContext):
+    Process = _ProcessoSemScript
+
+
+CONTEXTO_POOL = _ContextoSemScript()
+
+
+def init_jobs_schema(conn, commit=True):
+    conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT,
+        path TEXT,
+        status TEXT,
+        attempts INTEGER DEFAULT 0,
+        error TEXT,
+        created_at TEXT,
+        updated_at TEXT
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS document_meta (
+        path TEXT PRIMARY KEY,
+        page_count INTEGER,
+        title TEXT,
+        author TEXT,
+        metadata TEXT,
+        thumbnail TEXT
+    )''')
+    if commit:
+        conn.commit()
+
+
+def enfileirar(conn, path, kind="extrair", commit=True):
+    # Job em execução também conta: se o arquivo mudar no meio, _aplicar o devolve à fila
+    ja_na_fila = conn.execute("SELECT id FROM jobs WHERE path=? AND kind=? AND status IN (?, ?)",
+                              (path, kind, PENDENTE, EXECUTANDO)).fetchone()
+    if ja_na_fila:
+        return ja_na_fila[0]
+    agora = datetime.now().isoformat()
+    cur = conn.execute('''INSERT INTO jobs (kind, path, status, attempts, created_at, updated_at)
+                          VALUES (?, ?, ?, 0, ?, ?)''', (kind, path, PENDENTE, agora, agora))
+    if commit:
+        conn.commit()
+    return cur.lastrowid
+
+
+def mover_documento(conn, origem, destino, commit=True):
+    # Mantém jobs em andamento e metadados apontando para o novo caminho
+    conn.execute("UPDATE jobs SET path=? WHERE path=? AND status IN (?, ?)",
+                 (destino, origem, PENDENTE, EXECUTANDO))
+    conn.execute("UPDATE document_meta SET path=? WHERE path=?", (destino, origem))
+    if commit:
+        conn.commit()
+
+
+def resumo_fila(conn):
+    return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+# Executado nos processos do pool: não pode depender de estado do Streamlit
+def processar_documento(full_path, sha256=None):
+    inicio = time.perf_counter()
+    resultado = _processar(full_path, sha256)
+    # O processo do pool não compartilha as métricas: a duração volta no resultado
+    resultado["duracao"] = time.perf_counter() - inicio
+    return resultado
+
+
+def _processar(full_path, sha256):
+    stat = os.stat(full_path)
+    resultado = {"paginas": [], "page_count": 0, "metadata": {}, "miniatura": None, "sha256": sha256,
+                 "erro": None, "mtime": stat.st_mtime, "size": stat.st_size}
+    if full_path.lower().endswith(thumbs.EXTENSOES_MINIATURA):
+        if not resultado["sha256"]:
+            resultado["sha256"] = catalog.sha256_arquivo(full_path)
+        try:
+            resultado["miniatura"] = thumbs.renderizar(full_path)
+        except Exception as e:
+            resultado["erro"] = str(e)
+    if not full_path.lower().endswith(search.EXTENSOES_TEXTO):
+        return resultado
+
+    import fitz
+    try:
+        doc = fitz.open(full_path)
+    except Exception as e:
+        resultado["erro"] = str(e)
+        return resultado
+    try:
+        resultado["page_count"] = doc.page_count
+        resultado["metadata"] = {k: v for k, v in (doc.metadata or {}).items() if v}
+        resultado["paginas"] = [(numero, page.get_text()) for numero, page in enumerate(doc, start=1)]
+    except Exception as e:
+        resultado["erro"] = str(e)
+    finally:
+        doc.close()
+    return resultado
+
+
+class FilaProcessamento:
+    def __init__(self, db_path, base_dir, miniaturas=None, max_workers=None, intervalo=2.0):
+        self.db_path = db_path
+        self.base_dir = base_dir
+        self.miniaturas = miniaturas or thumbs.CacheMiniaturas()
+        self.max_workers = max_workers or int(os.environ.get("GESTAO_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+        self.intervalo = intervalo
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+        self._pool = None
+        self._trava = threading.Lock()
+        self._miniaturas_pedidas = set()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._pool = self._novo_pool()
+        self._thread = threading.Thread(target=self._loop, name="gestao-jobs", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._parar.set()
+        self._acordar.set()
+        if self._thread:
+            self._thread.join()
+        if self._pool:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _novo_pool(self):
+        # spawn: o servidor do Streamlit é multithread, fork não é seguro
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=CONTEXTO_POOL)
+
+    def notificar(self):
+        self._acordar.set()
+
+    def miniatura(self, full_path, sha256, pagina=1, largura=thumbs.LARGURA_PADRAO):
+        # Caminho da miniatura se já estiver no cache; senão ela é renderizada
+        # no pool (fora da thread do Streamlit) e aparece num próximo rerun
+        caminho = self.miniaturas.obter(sha256, pagina, largura)
+        if caminho or not self._pool or not full_path.lower().endswith(thumbs.EXTENSOES_MINIATURA):
+            return caminho
+        chave = thumbs.chave_miniatura(sha256, pagina, largura)
+        with self._trava:
+            if chave in self._miniaturas_pedidas:
+                return None
+            self._miniaturas_pedidas.add(chave)
+        try:
+            futuro = self._pool.submit(thumbs.renderizar, full_path, pagina, largura)
+        except (BrokenProcessPool, RuntimeError):
+            # Pool sendo recriado pela thread da fila: tenta no próximo rerun
+            with self._trava:
+                self._miniaturas_pedidas.discard(chave)
+            return None
+        futuro.add_done_callback(lambda f: self._guardar_miniatura(f, chave, sha256, pagina, largura))
+        return None
+
+    def _guardar_miniatura(self, futuro, chave, sha256, pagina, largura):
+        try:
+            dados, ext = futuro.result()
+            self.miniaturas.guardar(sha256, pagina, largura, dados, ext)
+        except Exception:
+            # Arquivo que o PyMuPDF não abre: não é pedido de novo neste processo
+            return
+        with self._trava:
+            self._miniaturas_pedidas.discard(chave)
+
+    def _loop(self):
+        from gestao import migrations
+        conn = db.conectar(self.db_path)
+        migrations.migrar(conn)
+        # Jobs que estavam executando quando o processo caiu voltam para a fila
+        conn.execute("UPDATE jobs SET status=? WHERE status=?", (PENDENTE, EXECUTANDO))
+        conn.commit()
+        em_andamento = {}
+        try:
+            while not self._parar.is_set():
+                try:
+                    self._ciclo(conn, em_andamento)
+                except Exception:
+                    # Banco travado além do busy_timeout, disco cheio etc.: a
+                    # fila não pode morrer com a thread; tenta no próximo ciclo
+                    log.exception("falha na fila de processamento")
+                    conn.rollback()
+                    self._parar.wait(self.intervalo)
+        finally:
+            conn.close()
+
+    def _ciclo(self, conn, em_andamento):
+        self._coletar(conn, em_andamento)
+        livres = self.max_workers - len(em_andamento)
+        if livres > 0:
+            for job_id, path, sha256 in self._reservar(conn, livres):
+                try:
+                    em_andamento[job_id] = self._pool.submit(processar_documento, path, sha256)
+                except BrokenProcessPool as e:
+                    # Um worker morreu (ex.: PDF que derruba o PyMuPDF): recria o pool
+                    self._falhar(conn, job_id, str(e))
+                    self._pool.shutdown(wait=False, cancel_futures=True)
+                    self._pool = self._novo_pool()
+        self._acordar.wait(0.2 if em_andamento else self.intervalo)
+        self._acordar.clear()
+
+    def _reservar(self, conn, quantidade):
+        # O SHA-256 do catálogo evita reler o arquivo para chavear a miniatura
+        linhas = conn.execute('''SELECT j.id, j.path, d.sha256 FROM jobs j LEFT JOIN documents d ON d.path = j.path
+                                 WHERE j.status=? ORDER BY j.id LIMIT ?''', (PENDENTE, quantidade)).fetchall()
+        agora = datetime.now().isoformat()
+        for job_id, _, _ in linhas:
+            conn.execute("UPDATE jobs SET status=?, attempts=attempts+1, updated_at=? WHERE id=?",
+                         (EXECUTANDO, agora, job_id))
+        conn.commit()
+        return linhas
+
+    def _coletar(self, conn, em_andamento):
+        for job_id, futuro in list(em_andamento.items()):
+            if not futuro.done():
+                continue
+            del em_andamento[job_id]
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                self._falhar(conn, job_id, str(e))
+                continue
+            metrics.registrar("fila.extracao", resultado["duracao"])
+            try:
+                with metrics.medir("fila.aplicar"):
+                    self._aplicar(conn, job_id, resultado)
+            except Exception as e:
+                # Sem isso o job ficaria "executando" até o próximo reinício
+                conn.rollback()
+                log.exception("falha ao gravar o resultado de %s", job_id)
+                self._falhar(conn, job_id, str(e))
+
+    def _falhar(self, conn, job_id, erro):
+        tentativas = conn.execute("SELECT attempts FROM jobs WHERE id=?", (job_id,)).fetchone()
+        status = ERRO if not tentativas or tentativas[0] >= MAX_TENTATIVAS else PENDENTE
+        conn.execute("UPDATE jobs SET status=?, error=?, updated_at=? WHERE id=?",
+                     (status, erro, datetime.now().isoformat(), job_id))
+        conn.commit()
+
+    def _aplicar(self, conn, job_id, resultado):
+        # O caminho pode ter mudado (arquivamento de revisão) durante a execução
+        linha = conn.execute("SELECT path FROM jobs WHERE id=?", (job_id,)).fetchone()
+        path = linha[0] if linha else None
+        if not path or not os.path.exists(path):
+            self._falhar(conn, job_id, "arquivo não encontrado")
+            return
+        stat = os.stat(path)
+        if (stat.st_mtime, stat.st_size) != (resultado["mtime"], resultado["size"]):
+            # Arquivo alterado durante a extração: processa de novo
+            conn.execute("UPDATE jobs SET status=?, updated_at=? WHERE id=?",
+                         (PENDENTE, datetime.now().isoformat(), job_id))
+            conn.commit()
+            return
+        search.gravar_paginas(conn, path, self.base_dir, resultado["paginas"], resultado["erro"], stat)
+        meta = resultado["metadata"]
+        miniatura = None
+        if resultado["miniatura"]:
+            dados, ext = resultado["miniatura"]
+            miniatura = self.miniaturas.guardar(resultado["sha256"], 1, thumbs.LARGURA_PADRAO, dados, ext)
+        conn.execute('''INSERT OR REPLACE INTO document_meta (path, page_count, title, author, metadata, thumbnail)
+                        VALUES (?, ?, ?, ?, ?, ?)''',
+                     (path, resultado["page_count"], meta.get("title"), meta.get("author"),
+                      json.dumps(meta, ensure_ascii=False), miniatura))
+        conn.execute("UPDATE jobs SET status=?, error=?, updated_at=? WHERE id=?",
+                     (CONCLUIDO, resultado["erro"], datetime.now().isoformat(), job_id))
+        conn.commit()
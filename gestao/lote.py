@@ -0,0 +1,116 @@
+import os
+import shutil
+from collections import namedtuple
+
+from gestao import catalog, search, jobs, storage
+from gestao.revisions import extrair_info_arquivo, numero
+
+# Upload em lote para uma fase: todos os nomes são validados de uma vez
+# contra o estado das famílias no catálogo e só então os arquivos são
+# gravados. O conteúdo vai primeiro para o repositório de blobs; a troca
+# visível (arquivamento + publicação + catálogo) é desfeita se algo falhar.
+
+# arquivos: [(nome, nome_base, destino)]; arquivar: [(origem, destino)];
+# erros: [(nome, motivo)]
+Plano = namedtuple("Plano", "arquivos arquivar erros requer_confirmacao")
+
+
+def planejar_lote(conn, indice, project, discipline, phase, nomes, base_dir, confirmado=False):
+    pasta = os.path.join(base_dir, project, discipline, phase)
+    erros = []
+    por_familia = {}
+    vistos = set()
+    for nome in nomes:
+        if nome in vistos:
+            erros.append((nome, "Arquivo repetido no lote."))
+            continue
+        vistos.add(nome)
+        nome_base, revisao, _ = extrair_info_arquivo(nome)
+        if not nome_base or os.path.basename(nome) != nome:
+            erros.append((nome, "Nome do arquivo deve conter rXvY."))
+            continue
+        por_familia.setdefault(nome_base, []).append(nome)
+
+    arquivos, arquivar = [], []
+    requer_confirmacao = False
+    for nome_base, nomes_familia in sorted(por_familia.items()):
+        revisoes = {numero(extrair_info_arquivo(n)[1]) for n in nomes_familia}
+        if len(revisoes) > 1:
+            # Uma revisão do lote arquivaria a outra na mesma operação
+            erros.extend((n, f"O lote tem mais de uma revisão de `{nome_base}`; envie apenas a mais recente.")
+                         for n in nomes_familia)
+            continue
+        familia = indice.familia(conn, project, discipline, phase, nome_base, atualizar=True)
+        arquivar_familia = set()
+        for nome in sorted(nomes_familia):
+            decisao = familia.verificar_upload(nome, confirmado)
+            destino = os.path.join(pasta, nome)
+            if decisao.requer_confirmacao:
+                requer_confirmacao = True
+                erros.append((nome, decisao.motivo))
+            elif not decisao.permitido:
+                erros.append((nome, decisao.motivo))
+            elif os.path.exists(destino):
+                erros.append((nome, "Arquivo com este nome completo já existe."))
+            else:
+                arquivar_familia.update(decisao.arquivar)
+                arquivos.append((nome, nome_base, destino))
+        pasta_revisao = os.path.join(pasta, catalog.PASTA_REVISOES, nome_base)
+        arquivar.extend((origem, os.path.join(pasta_revisao, os.path.basename(origem)))
+                        for origem in sorted(arquivar_familia))
+    return Plano(arquivos, arquivar, erros, requer_confirmacao)
+
+
+def _criar_pasta(pasta, criadas):
+    # Guarda as pastas que não existiam (Revisoes/<nome_base>) para o rollback
+    faltando = []
+    while pasta and not os.path.isdir(pasta):
+        faltando.append(pasta)
+        pasta = os.path.dirname(pasta)
+    if faltando:
+        os.makedirs(faltando[0], exist_ok=True)
+        criadas.extend(reversed(faltando))
+
+
+def aplicar_lote(conn, plano, fontes, base_dir, blobs_dir):
+    # fontes: {nome: arquivo aberto}. Retorna [(destino, reaproveitado)]
+    if plano.erros:
+        raise ValueError("O lote tem arquivos inválidos.")
+    blobs = {}
+    for nome, _, _ in plano.arquivos:
+        fontes[nome].seek(0)
+        blobs[nome] = storage.guardar_blob(fontes[nome], blobs_dir)
+
+    movidos, publicados, criadas = [], [], []
+    try:
+        for origem, destino in plano.arquivar:
+            if not os.path.exists(origem):
+                continue
+            _criar_pasta(os.path.dirname(destino), criadas)
+            shutil.move(origem, destino)
+            movidos.append((origem, destino))
+            catalog.arquivar_documento(conn, origem, destino, commit=False)
+            search.mover_no_indice(conn, origem, destino, commit=False)
+            jobs.mover_documento(conn, origem, destino, commit=False)
+        for nome, _, destino in plano.arquivos:
+            sha256, _, _, blob = blobs[nome]
+            storage.publicar(blob, destino)
+            publicados.append(destino)
+            catalog.registrar_documento(conn, destino, base_dir, sha256=sha256, commit=False)
+            jobs.enfileirar(conn, destino, commit=False)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        for destino in publicados:
+            if os.path.exists(destino):
+                os.remove(destino)
+        for origem, destino in reversed(movidos):
+            shutil.move(destino, origem)
+        for pasta in reversed(criadas):
+            try:
+                os.rmdir(pasta)
+            except OSError:
+                pass
+        raise
+    # Blobs gravados por um lote desfeito ficam órfãos e saem na coleta
+    return [(destino, blobs[nome][2]) for nome, _, destino in plano.arquivos]
@@ -0,0 +1,156 @@
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+# Instrumentação leve do app: spans nomeados (seções da página, fila de
+# processamento, consultas SQLite) agregados em memória por processo, com
+# p50/p95 sobre uma janela das últimas amostras, exportação no formato
+# texto do Prometheus e registro das consultas lentas.
+
+JANELA = 1000
+LIMITE_SQL_LENTO = float(os.environ.get("GESTAO_SQL_LENTO_MS", 100)) / 1000
+CONSULTAS_LENTAS_GUARDADAS = 50
+EXECUCOES_GUARDADAS = 20
+
+log_sql_lento = logging.getLogger("gestao.sql_lento")
+# Sem arquivo configurado, as consultas lentas ficam só no painel (nada no stderr)
+log_sql_lento.addHandler(logging.NullHandler())
+if os.environ.get("GESTAO_SQL_LENTO_LOG"):
+    log_sql_lento.addHandler(logging.FileHandler(os.environ["GESTAO_SQL_LENTO_LOG"], encoding="utf-8"))
+
+
+class Serie:
+    __slots__ = ("amostras", "contagem", "soma", "maximo")
+
+    def __init__(self, janela):
+        self.amostras = deque(maxlen=janela)
+        self.contagem = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def adicionar(self, duracao):
+        self.amostras.append(duracao)
+        self.contagem += 1
+        self.soma += duracao
+        if duracao > self.maximo:
+            self.maximo = duracao
+
+    def percentil(self, q):
+        ordenadas = sorted(self.amostras)
+        if not ordenadas:
+            return 0.0
+        return ordenadas[max(math.ceil(q * len(ordenadas)) - 1, 0)]
+
+
+class Registro:
+    def __init__(self, janela=JANELA):
+        self.janela = janela
+        self._series = {}
+        self._consultas_lentas = deque(maxlen=CONSULTAS_LENTAS_GUARDADAS)
+        self._execucoes = deque(maxlen=EXECUCOES_GUARDADAS)
+        self._trava = threading.Lock()
+        # Spans da execução (rerun) corrente; cada rerun roda numa thread
+        self._local = threading.local()
+
+    def registrar(self, nome, duracao):
+        with self._trava:
+            serie = self._series.get(nome)
+            if serie is None:
+                serie = self._series[nome] = Serie(self.janela)
+            serie.adicionar(duracao)
+        spans = getattr(self._local, "spans", None)
+        if spans is not None:
+            spans.append((nome, duracao))
+
+    @contextmanager
+    def medir(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, time.perf_counter() - inicio)
+
+    def medido(self, nome):
+        def decorador(funcao):
+            @wraps(funcao)
+            def medida(*args, **kwargs):
+                with self.medir(nome):
+                    return funcao(*args, **kwargs)
+            return medida
+        return decorador
+
+    def consulta_sql(self, sql, duracao):
+        self.registrar("sql", duracao)
+        if duracao >= LIMITE_SQL_LENTO:
+            # Só o texto do comando: os parâmetros podem conter senhas
+            texto = " ".join(sql.split())
+            with self._trava:
+                self._consultas_lentas.append((datetime.now().isoformat(timespec="seconds"), duracao, texto))
+            log_sql_lento.warning("consulta lenta (%.0f ms): %s", duracao * 1000, texto)
+
+    def iniciar_execucao(self):
+        self._local.spans = []
+        self._local.inicio = time.perf_counter()
+
+    def finalizar_execucao(self, rotulo):
+        spans = getattr(self._local, "spans", None)
+        if spans is None:
+            return
+        duracao = time.perf_counter() - self._local.inicio
+        self._local.spans = None
+        self.registrar("execucao", duracao)
+        with self._trava:
+            self._execucoes.append((datetime.now().isoformat(timespec="seconds"), rotulo, duracao, spans))
+
+    def resumo(self):
+        # [(nome, contagem, p50, p95, máximo, soma)] da seção mais custosa para a menos
+        with self._trava:
+            linhas = [(nome, s.contagem, s.percentil(0.5), s.percentil(0.95), s.maximo, s.soma)
+                      for nome, s in self._series.items()]
+        return sorted(linhas, key=lambda linha: linha[5], reverse=True)
+
+    def consultas_lentas(self):
+        with self._trava:
+            return list(reversed(self._consultas_lentas))
+
+    def execucoes(self):
+        with self._trava:
+            return list(reversed(self._execucoes))
+
+    def limpar(self):
+        with self._trava:
+            self._series.clear()
+            self._consultas_lentas.clear()
+            self._execucoes.clear()
+
+    def prometheus(self):
+        linhas = ["# HELP gestao_secao_segundos Duração das seções instrumentadas do app",
+                  "# TYPE gestao_secao_segundos summary"]
+        for nome, contagem, p50, p95, _, soma in sorted(self.resumo()):
+            rotulo = nome.replace("\\", "\\\\").replace('"', '\\"')
+            linhas.append(f'gestao_secao_segundos{{secao="{rotulo}",quantile="0.5"}} {p50:.6f}')
+            linhas.append(f'gestao_secao_segundos{{secao="{rotulo}",quantile="0.95"}} {p95:.6f}')
+            linhas.append(f'gestao_secao_segundos_sum{{secao="{rotulo}"}} {soma:.6f}')
+            linhas.append(f'gestao_secao_segundos_count{{secao="{rotulo}"}} {contagem}')
+        return "\n".join(linhas) + "\n"
+
+
+_registro = Registro()
+
+registrar = _registro.registrar
+medir = _registro.medir
+medido = _registro.medido
+consulta_sql = _registro.consulta_sql
+iniciar_execucao = _registro.iniciar_execucao
+finalizar_execucao = _registro.finalizar_execucao
+resumo = _registro.resumo
+consultas_lentas = _registro.consultas_lentas
+execucoes = _registro.execucoes
+limpar = _registro.limpar
+prometheus = _registro.prometheus
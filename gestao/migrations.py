@@ -0,0 +1,247 @@
+import sys
+import argparse
+
+from gestao import db, search, jobs, catalog
+
+# Migrações versionadas do banco (PRAGMA user_version). Cada migração roda
+# uma única vez, em ordem, dentro de uma transação; migrações já publicadas
+# não devem ser alteradas — crie uma nova.
+
+
+def _m001_schema_inicial(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password TEXT,
+        projects TEXT,
+        permissions TEXT
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS logs (
+        timestamp TEXT,
+        user TEXT,
+        action TEXT,
+        file TEXT
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS clients (
+        name TEXT PRIMARY KEY
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS projects (
+        name TEXT PRIMARY KEY,
+        client TEXT
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS comments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        file_path TEXT,
+        username TEXT,
+        timestamp TEXT,
+        comment TEXT
+    )''')
+
+
+def _m002_indice_fila_catalogo(conn):
+    # Sem commit: a migração inteira fica na transação aberta por migrar()
+    search.init_search_schema(conn, commit=False)
+    jobs.init_jobs_schema(conn, commit=False)
+    catalog.init_catalog_schema(conn, commit=False)
+
+
+def _m003_indices(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_comments_file ON comments(file_path, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_projects_client ON projects(client)")
+
+
+def _m004_user_projects(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_projects (
+        username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+        project TEXT NOT NULL REFERENCES projects(name) ON DELETE CASCADE,
+        PRIMARY KEY (username, project)
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_projects_project ON user_projects(project)")
+    # Converte a lista separada por vírgulas de users.projects
+    existentes = {r[0] for r in conn.execute("SELECT name FROM projects")}
+    for username, projetos in conn.execute("SELECT username, projects FROM users").fetchall():
+        for projeto in (projetos or "").split(","):
+            if projeto in existentes:
+                conn.execute("INSERT OR IGNORE INTO user_projects (username, project) VALUES (?, ?)",
+                             (username, projeto))
+
+
+def _m005_comments_document_id(conn):
+    conn.execute('''ALTER TABLE comments ADD COLUMN document_id INTEGER
+                    REFERENCES documents(id) ON DELETE SET NULL''')
+    conn.execute('''UPDATE comments SET document_id = (
+                        SELECT d.id FROM documents d WHERE d.path = comments.file_path)''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_comments_document ON comments(document_id, timestamp)")
+
+
+def _m006_auditoria(conn):
+    conn.execute("ALTER TABLE logs ADD COLUMN project TEXT")
+    # Projeto = primeiro diretório abaixo de uploads/
+    conn.execute("""UPDATE logs SET project = substr(file, 9, instr(substr(file, 9), '/') - 1)
+                    WHERE file LIKE 'uploads/%/%'""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_user ON logs(user, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_action ON logs(action, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_project ON logs(project, timestamp)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS log_counters (
+        month TEXT NOT NULL,
+        user TEXT NOT NULL DEFAULT '',
+        action TEXT NOT NULL DEFAULT '',
+        project TEXT NOT NULL DEFAULT '',
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (month, user, action, project)
+    )''')
+    conn.execute('''INSERT INTO log_counters (month, user, action, project, count)
+                    SELECT substr(timestamp, 1, 7), ifnull(user, ''), ifnull(action, ''), ifnull(project, ''), COUNT(*)
+                    FROM logs GROUP BY 1, 2, 3, 4''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS trg_logs_contadores AFTER INSERT ON logs
+                    BEGIN
+                        INSERT INTO log_counters (month, user, action, project, count)
+                        VALUES (substr(NEW.timestamp, 1, 7), ifnull(NEW.user, ''), ifnull(NEW.action, ''),
+                                ifnull(NEW.project, ''), 1)
+                        ON CONFLICT(month, user, action, project) DO UPDATE SET count = count + 1;
+                    END''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS log_archives (
+        month TEXT PRIMARY KEY,
+        path TEXT,
+        rows INTEGER,
+        archived_at TEXT
+    )''')
+
+
+def _m007_nomes_trigramas(conn):
+    # Índice de trigramas dos nomes do catálogo (substring e busca aproximada),
+    # mantido por triggers sobre documents
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS names_fts USING fts5(
+        name, content='documents', content_rowid='id', tokenize='trigram'
+    )''')
+    conn.execute("INSERT INTO names_fts(names_fts) VALUES ('rebuild')")
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS trg_documents_nomes_ai AFTER INSERT ON documents
+                    BEGIN
+                        INSERT INTO names_fts (rowid, name) VALUES (NEW.id, NEW.name);
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS trg_documents_nomes_ad AFTER DELETE ON documents
+                    BEGIN
+                        INSERT INTO names_fts (names_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS trg_documents_nomes_au AFTER UPDATE OF name ON documents
+                    BEGIN
+                        INSERT INTO names_fts (names_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+                        INSERT INTO names_fts (rowid, name) VALUES (NEW.id, NEW.name);
+                    END''')
+
+
+def _m008_importacao(conn):
+    # Progresso da importação em lote (gestao.ingest): permite retomar
+    conn.execute('''CREATE TABLE IF NOT EXISTS ingest_files (
+        origem TEXT PRIMARY KEY,
+        size INTEGER,
+        mtime REAL,
+        destino TEXT,
+        sha256 TEXT,
+        updated_at TEXT
+    )''')
+
+
+def _m009_retratos_pastas(conn):
+    # Retrato de cada pasta de uploads/ para a varredura incremental (gestao.scanner)
+    conn.execute('''CREATE TABLE IF NOT EXISTS dir_snapshots (
+        path TEXT PRIMARY KEY,
+        mtime_ns INTEGER,
+        inode INTEGER,
+        arquivos TEXT,
+        subpastas TEXT,
+        updated_at TEXT
+    )''')
+
+
+def _m010_comentarios_sem_documento(conn):
+    # Comentários gravados antes do catálogo cujo arquivo foi arquivado depois:
+    # o file_path antigo não casa, então casa por projeto/disciplina/fase/nome
+    for comment_id, file_path in conn.execute(
+            "SELECT id, file_path FROM comments WHERE document_id IS NULL").fetchall():
+        partes = (file_path or "").replace("\\", "/").split("/")
+        if catalog.PASTA_REVISOES in partes[:-1]:
+            i = partes.index(catalog.PASTA_REVISOES)
+            partes = partes[i - 3:i] + partes[-1:]
+        if len(partes) < 4:
+            continue
+        project, discipline, phase, name = partes[-4:]
+        doc = conn.execute("SELECT id FROM documents WHERE project=? AND discipline=? AND phase=? AND name=?",
+                           (project, discipline, phase, name)).fetchone()
+        if doc:
+            conn.execute("UPDATE comments SET document_id=? WHERE id=?", (doc[0], comment_id))
+
+
+def _m011_armazenamento_frio(conn):
+    # Revisões arquivadas movidas para o armazenamento frio (gestao.frio)
+    conn.execute("ALTER TABLE documents ADD COLUMN cold INTEGER DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_frio ON documents(cold) WHERE cold=1")
+
+
+def _m012_data_arquivamento(conn):
+    # Idade das revisões arquivadas para o armazenamento frio: o mtime do
+    # arquivo não serve (um hard link deduplicado herda o mtime do blob antigo).
+    # Para as já arquivadas, a melhor aproximação é a última atualização.
+    conn.execute("ALTER TABLE documents ADD COLUMN archived_at TEXT")
+    conn.execute("UPDATE documents SET archived_at = updated_at WHERE archived=1")
+
+
+def _m013_indice_conteudo(conn):
+    # Blobs órfãos são decididos pelas referências do catálogo (gestao.storage)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_sha256 ON documents(sha256)")
+
+
+MIGRACOES = [
+    (1, _m001_schema_inicial),
+    (2, _m002_indice_fila_catalogo),
+    (3, _m003_indices),
+    (4, _m004_user_projects),
+    (5, _m005_comments_document_id),
+    (6, _m006_auditoria),
+    (7, _m007_nomes_trigramas),
+    (8, _m008_importacao),
+    (9, _m009_retratos_pastas),
+    (10, _m010_comentarios_sem_documento),
+    (11, _m011_armazenamento_frio),
+    (12, _m012_data_arquivamento),
+    (13, _m013_indice_conteudo),
+]
+
+
+def versao_atual(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar(conn):
+    aplicadas = []
+    if versao_atual(conn) >= MIGRACOES[-1][0]:
+        return aplicadas
+    for versao, migracao in MIGRACOES:
+        # BEGIN IMMEDIATE: outro processo migrando ao mesmo tempo espera a vez
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if versao_atual(conn) >= versao:
+                conn.rollback()
+                continue
+            migracao(conn)
+            conn.execute(f"PRAGMA user_version={versao}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        aplicadas.append(versao)
+    return aplicadas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aplica as migrações pendentes do banco")
+    parser.add_argument("--db", default="document_manager.db")
+    args = parser.parse_args(argv)
+    conn = db.conectar(args.db)
+    aplicadas = migrar(conn)
+    print(f"Versão do banco: {versao_atual(conn)} (aplicadas agora: {aplicadas or 'nenhuma'})")
+    conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
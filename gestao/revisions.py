@@ -0,0 +1,100 @@
+import re
+import time
+import threading
+from functools import lru_cache
+from collections import namedtuple
+
+# Regras de revisão/versão (nome_base rXvY). O parser é compilado e
+# memoizado; o índice mantém, por família de documento, todas as revisões
+# e versões (inclusive arquivadas) para responder em tempo constante.
+
+PADRAO_REVISAO = re.compile(r"(.+?)r(\d+)v(\d+).*?\.\w+$")
+
+Decisao = namedtuple("Decisao", "permitido motivo arquivar requer_confirmacao")
+
+
+@lru_cache(maxsize=65536)
+def extrair_info_arquivo(nome_arquivo):
+    match = PADRAO_REVISAO.match(nome_arquivo)
+    if match:
+        nome_base = match.group(1).rstrip(" _-")
+        revisao = f"r{match.group(2)}"
+        versao = f"v{match.group(3)}"
+        return nome_base, revisao, versao
+    return None, None, None
+
+
+def numero(rotulo):
+    # "r12" -> 12, "v3" -> 3
+    return int(rotulo[1:]) if rotulo and rotulo[1:].isdigit() else -1
+
+
+class Familia:
+    def __init__(self, linhas=()):
+        self.arquivos = {}
+        self.por_revisao = {}
+        self.rev_max = -1
+        for path, name, revisao, versao, archived in linhas:
+            self.adicionar(path, name, revisao, versao, archived)
+        self.carregada_em = time.monotonic()
+
+    def adicionar(self, path, name, revisao, versao, archived):
+        rev, ver = numero(revisao), numero(versao)
+        self.arquivos[name] = (path, rev, ver, bool(archived))
+        self.por_revisao.setdefault(rev, set()).add(ver)
+        if rev > self.rev_max:
+            self.rev_max = rev
+
+    def ultima_revisao(self):
+        return self.rev_max
+
+    def versoes(self, revisao):
+        return sorted(self.por_revisao.get(numero(revisao) if isinstance(revisao, str) else revisao, ()))
+
+    def atuais(self):
+        return [(name, path) for name, (path, _, _, archived) in self.arquivos.items() if not archived]
+
+    def verificar_upload(self, nome_arquivo, confirmado=False):
+        _, revisao, versao = extrair_info_arquivo(nome_arquivo)
+        if not revisao:
+            return Decisao(False, "Nome do arquivo deve conter rXvY.", [], False)
+        rev, ver = numero(revisao), numero(versao)
+        if rev < self.rev_max:
+            return Decisao(False, f"Revisão {revisao} menor que revisão máxima existente (r{self.rev_max}).", [], False)
+        existente = self.arquivos.get(nome_arquivo)
+        if existente and not existente[3]:
+            return Decisao(False, "Arquivo com este nome completo já existe.", [], False)
+
+        if any(r != rev for r in self.por_revisao):
+            # Nova revisão: todos os arquivos atuais da família vão para Revisoes/
+            return Decisao(True, None, [path for _, path in self.atuais()], False)
+        if any(v != ver for v in self.por_revisao.get(rev, ())) and not confirmado:
+            return Decisao(False, "Mesma revisão detectada com nova versão.", [], True)
+        return Decisao(True, None, [], False)
+
+
+class IndiceRevisoes:
+    # Cache por família, compartilhado entre sessões. As escritas do próprio
+    # app invalidam a família; mudanças externas expiram pelo TTL.
+    def __init__(self, ttl=30.0):
+        self.ttl = ttl
+        self._familias = {}
+        self._trava = threading.Lock()
+
+    def familia(self, conn, project, discipline, phase, nome_base, atualizar=False):
+        from gestao import catalog
+        chave = (project, discipline, phase, nome_base)
+        with self._trava:
+            familia = self._familias.get(chave)
+        if atualizar or familia is None or time.monotonic() - familia.carregada_em > self.ttl:
+            familia = Familia(catalog.revisoes_da_familia(conn, project, discipline, phase, nome_base))
+            with self._trava:
+                self._familias[chave] = familia
+        return familia
+
+    def invalidar(self, project=None, discipline=None, phase=None, nome_base=None):
+        with self._trava:
+            if project is None:
+                self._familias.clear()
+            else:
+                self._familias.pop((project, discipline, phase, nome_base), None)
@@ -0,0 +1,282 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+from collections import namedtuple
+
+from gestao import catalog, search, jobs
+from gestao.revisions import extrair_info_arquivo
+
+# Detecção incremental de mudanças em uploads/, que também é alterado fora
+# do app (arquivos colocados ou apagados direto no compartilhamento). Cada
+# pasta guarda um retrato: (mtime, inode) da própria pasta e, de cada
+# arquivo, (tamanho, mtime, inode). Pasta com mtime/inode iguais ao retrato
+# não é relistada; só o que mudou vai para o catálogo, o índice e a fila.
+#
+# O mtime de uma pasta muda quando entradas são criadas, removidas ou
+# renomeadas nela, mas não quando um arquivo é sobrescrito no lugar. Esses
+# casos chegam pelos eventos do Observador ou pela varredura completa, que
+# o Observador sem eventos faz a cada `completa_a_cada` ciclos.
+
+Mudancas = namedtuple("Mudancas", "adicionados alterados removidos pastas_lidas pastas_total retratos esquecidas")
+
+# Temporários do próprio app (storage.publicar) antes do os.replace
+SUFIXOS_IGNORADOS = (".parcial",)
+
+log = logging.getLogger("gestao.scanner")
+
+
+def _listar(pasta):
+    arquivos, subpastas = {}, []
+    with os.scandir(pasta) as entradas:
+        for entrada in entradas:
+            if entrada.is_dir(follow_symlinks=False):
+                subpastas.append(entrada.name)
+            elif entrada.is_file(follow_symlinks=False) and not entrada.name.endswith(SUFIXOS_IGNORADOS):
+                stat = entrada.stat(follow_symlinks=False)
+                arquivos[entrada.name] = [stat.st_size, stat.st_mtime_ns, entrada.inode()]
+    return arquivos, sorted(subpastas)
+
+
+def _retrato(conn, pasta):
+    linha = conn.execute("SELECT mtime_ns, inode, arquivos, subpastas FROM dir_snapshots WHERE path=?",
+                         (pasta,)).fetchone()
+    # A lista de arquivos só é decodificada quando a pasta é relistada
+    return (linha[0], linha[1], linha[2], json.loads(linha[3])) if linha else None
+
+
+def _abaixo(conn, pasta):
+    # Retratos da pasta e de todas as subpastas (faixa da chave primária, sem LIKE)
+    prefixo = pasta + os.sep
+    return conn.execute('''SELECT path, arquivos FROM dir_snapshots
+                           WHERE path=? OR (path >= ? AND path < ?)''',
+                        (pasta, prefixo, pasta + chr(ord(os.sep) + 1))).fetchall()
+
+
+def varrer(conn, base_dir, pastas=None, completo=False):
+    # pastas: relistadas mesmo com o retrato igual (vindas de eventos); as
+    # subpastas seguem a regra normal. completo=True relista tudo.
+    # Nada é gravado aqui: os retratos só são salvos por aplicar(), depois
+    # do catálogo, para que uma falha no meio repita a detecção.
+    forcadas = set(pastas or ())
+    primeira = not pastas and _retrato(conn, base_dir) is None
+    adicionados, alterados, removidos = [], [], []
+    retratos, esquecidas = [], []
+    lidas = total = 0
+    visitadas = set()
+    pilha = sorted(forcadas) if pastas else [base_dir]
+    while pilha:
+        pasta = pilha.pop()
+        if pasta in visitadas:
+            # Pasta do evento que também é subpasta de outra pasta do evento
+            continue
+        visitadas.add(pasta)
+        anterior = _retrato(conn, pasta)
+        try:
+            # stat antes da listagem: uma entrada criada entre os dois muda o mtime de novo
+            stat = os.stat(pasta)
+            if anterior and not completo and pasta not in forcadas and anterior[:2] == (stat.st_mtime_ns, stat.st_ino):
+                total += 1
+                pilha.extend(os.path.join(pasta, s) for s in anterior[3])
+                continue
+            arquivos, subpastas = _listar(pasta)
+        except (FileNotFoundError, NotADirectoryError):
+            # Pasta removida (ou trocada por arquivo): sai tudo o que estava abaixo dela
+            for caminho, nomes in _abaixo(conn, pasta):
+                removidos.extend(os.path.join(caminho, n) for n in json.loads(nomes))
+            esquecidas.append(pasta)
+            continue
+        total += 1
+        lidas += 1
+        antigos = json.loads(anterior[2]) if anterior else {}
+        for nome, info in arquivos.items():
+            caminho = os.path.join(pasta, nome)
+            if nome not in antigos:
+                adicionados.append(caminho)
+            elif antigos[nome] != info:
+                alterados.append(caminho)
+        removidos.extend(os.path.join(pasta, n) for n in antigos if n not in arquivos)
+        for sumida in set(anterior[3] if anterior else ()) - set(subpastas):
+            pilha.append(os.path.join(pasta, sumida))
+        retratos.append((pasta, stat.st_mtime_ns, stat.st_ino, json.dumps(arquivos, ensure_ascii=False),
+                         json.dumps(subpastas, ensure_ascii=False)))
+        pilha.extend(os.path.join(pasta, s) for s in subpastas)
+
+    if primeira:
+        # Sem retratos ainda: o que está no catálogo ou no índice e não foi visto saiu do disco
+        vistos = set(adicionados)
+        for (caminho,) in conn.execute("SELECT path FROM documents WHERE cold=0 UNION SELECT path FROM indexed_files"):
+            if caminho not in vistos:
+                removidos.append(caminho)
+    return Mudancas(adicionados, alterados, removidos, lidas, total, retratos, esquecidas)
+
+
+def familia(caminho, base_dir):
+    local = catalog.localizar(caminho, base_dir)
+    nome_base = extrair_info_arquivo(os.path.basename(caminho))[0]
+    return (*local[:3], nome_base) if local and nome_base else None
+
+
+def _movidos(conn, mudancas):
+    # Arquivo movido por fora do app (ex.: revisão arrastada para Revisoes/)
+    # aparece como removido + adicionado; mesmo nome, tamanho e SHA-256
+    # preservam o id do documento e, com ele, os comentários
+    sumidos = {}
+    for caminho in mudancas.removidos:
+        doc = conn.execute("SELECT name, size, sha256 FROM documents WHERE path=?", (caminho,)).fetchone()
+        if doc:
+            sumidos.setdefault((doc[0], doc[1]), []).append((caminho, doc[2]))
+    pares = []
+    for caminho in mudancas.adicionados if sumidos else ():
+        if not os.path.exists(caminho):
+            continue
+        candidatos = sumidos.get((os.path.basename(caminho), os.path.getsize(caminho)))
+        if not candidatos:
+            continue
+        sha256 = catalog.sha256_arquivo(caminho)
+        for origem, sha_origem in candidatos:
+            if sha_origem == sha256:
+                candidatos.remove((origem, sha_origem))
+                pares.append((origem, caminho))
+                break
+    return pares
+
+
+def aplicar(conn, base_dir, mudancas, lote=200):
+    # Retorna (caminhos enviados à fila, famílias afetadas)
+    enfileirados, familias = [], set()
+    for origem, destino in _movidos(conn, mudancas):
+        catalog.mover_documento(conn, origem, destino, commit=False)
+        search.mover_no_indice(conn, origem, destino, commit=False)
+        jobs.mover_documento(conn, origem, destino, commit=False)
+        mudancas.removidos.remove(origem)
+        familias.add(familia(origem, base_dir))
+    for i, caminho in enumerate(mudancas.adicionados + mudancas.alterados, start=1):
+        if not os.path.exists(caminho):
+            continue
+        # Catálogo com o mesmo tamanho/mtime: registrar não recalcula o SHA-256
+        catalog.registrar_documento(conn, caminho, base_dir, commit=False)
+        if search.arquivo_desatualizado(conn, caminho):
+            jobs.enfileirar(conn, caminho, commit=False)
+            enfileirados.append(caminho)
+        familias.add(familia(caminho, base_dir))
+        if i % lote == 0:
+            conn.commit()
+    # Saídas do disco que são revisões no armazenamento frio continuam no catálogo
+    frios = {p for (p,) in conn.execute("SELECT path FROM documents WHERE cold=1")} if mudancas.removidos else set()
+    for caminho in mudancas.removidos:
+        if caminho in frios:
+            continue
+        catalog.remover_documento(conn, caminho, commit=False)
+        search.remover_do_indice(conn, caminho, commit=False)
+        familias.add(familia(caminho, base_dir))
+    for pasta in mudancas.esquecidas:
+        conn.execute("DELETE FROM dir_snapshots WHERE path=? OR (path >= ? AND path < ?)",
+                     (pasta, pasta + os.sep, pasta + chr(ord(os.sep) + 1)))
+    agora = datetime.now().isoformat()
+    conn.executemany('''INSERT OR REPLACE INTO dir_snapshots (path, mtime_ns, inode, arquivos, subpastas, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?)''', [r + (agora,) for r in mudancas.retratos])
+    conn.commit()
+    familias.discard(None)
+    return enfileirados, familias
+
+
+class Observador:
+    # Mantém o catálogo em dia numa thread. Com o watchdog (inotify no Linux)
+    # relista só as pastas que tiveram eventos; sem ele, ou num compartilhamento
+    # de rede onde os eventos não chegam, a varredura incremental periódica
+    # cobre o mesmo caso com mais atraso, e uma completa a cada
+    # `completa_a_cada` ciclos pega os arquivos sobrescritos no lugar.
+    def __init__(self, base_dir, sincronizar, intervalo=60.0, espera=2.0, eventos=True, completa_a_cada=60):
+        self.base_dir = base_dir
+        self.sincronizar = sincronizar
+        self.intervalo = intervalo
+        self.espera = espera
+        self.eventos = eventos
+        self.completa_a_cada = completa_a_cada
+        self.usando_eventos = False
+        self._pastas = set()
+        self._trava = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._thread = threading.Thread(target=self._loop, name="gestao-scanner", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._parar.set()
+        self._acordar.set()
+        if self._thread:
+            self._thread.join()
+
+    def marcar(self, caminho):
+        # Pasta a relistar: a do arquivo do evento (dentro de base_dir)
+        pasta = os.path.normpath(os.path.dirname(caminho))
+        rel = os.path.relpath(pasta, self.base_dir)
+        if rel.startswith(os.pardir):
+            return
+        with self._trava:
+            self._pastas.add(self.base_dir if rel == os.curdir else os.path.join(self.base_dir, rel))
+        self._acordar.set()
+
+    def _iniciar_eventos(self):
+        if not self.eventos:
+            return None
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return None
+
+        observador = self
+
+        class Eventos(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type in ("opened", "closed_no_write"):
+                    return
+                observador.marcar(os.fsdecode(event.src_path))
+                if getattr(event, "dest_path", None):
+                    observador.marcar(os.fsdecode(event.dest_path))
+
+        observer = Observer()
+        observer.schedule(Eventos(), self.base_dir, recursive=True)
+        observer.start()
+        return observer
+
+    def _executar(self, pastas, completo=False):
+        try:
+            self.sincronizar(pastas, completo)
+        except Exception:
+            log.exception("falha na varredura de %s", self.base_dir)
+
+    def _loop(self):
+        observer = self._iniciar_eventos()
+        self.usando_eventos = observer is not None
+        try:
+            # Varredura inicial: o que mudou com o app parado
+            self._executar(None)
+            ciclos = 0
+            while not self._parar.is_set():
+                if not self._acordar.wait(self.intervalo):
+                    ciclos += 1
+                    completo = not self.usando_eventos and ciclos % self.completa_a_cada == 0
+                    self._executar(None, completo)
+                    continue
+                # Agrupa rajadas (uma pasta inteira copiada) numa só varredura
+                self._parar.wait(self.espera)
+                self._acordar.clear()
+                with self._trava:
+                    pastas, self._pastas = self._pastas, set()
+                if pastas and not self._parar.is_set():
+                    self._executar(sorted(pastas))
+        finally:
+            if observer:
+                observer.stop()
+                observer.join()
+
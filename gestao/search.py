@@ -0,0 +1,367 @@
+import os
+import re
+import time
+import sqlite3
+from difflib import SequenceMatcher
+from collections import namedtuple
+
+# Índice de texto completo (SQLite FTS5) para a pesquisa de documentos.
+# O texto de cada página é extraído uma única vez (no upload ou na
+# reindexação) e a busca passa a ser uma consulta indexada.
+
+EXTENSOES_TEXTO = (".pdf",)
+
+
+def init_search_schema(conn, commit=True):
+    conn.execute('''CREATE TABLE IF NOT EXISTS indexed_files (
+        path TEXT PRIMARY KEY,
+        name TEXT,
+        project TEXT,
+        mtime REAL,
+        size INTEGER,
+        pages INTEGER,
+        error TEXT
+    )''')
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+        text,
+        path UNINDEXED,
+        page UNINDEXED,
+        tokenize='unicode61 remove_diacritics 2'
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_indexed_files_project ON indexed_files(project)")
+    if commit:
+        conn.commit()
+
+
+def projeto_do_arquivo(full_path, base_dir):
+    return os.path.relpath(full_path, base_dir).split(os.sep)[0]
+
+
+def extrair_texto_pdf(full_path):
+    # Importado sob demanda: o PyMuPDF pesa no início da CLI e do app
+    import fitz
+    paginas = []
+    doc = fitz.open(full_path)
+    try:
+        for numero, page in enumerate(doc, start=1):
+            paginas.append((numero, page.get_text()))
+    finally:
+        doc.close()
+    return paginas
+
+
+def gravar_paginas(conn, full_path, base_dir, paginas, erro=None, stat=None):
+    stat = stat or os.stat(full_path)
+    conn.execute("DELETE FROM pages_fts WHERE path=?", (full_path,))
+    conn.executemany("INSERT INTO pages_fts (text, path, page) VALUES (?, ?, ?)",
+                     [(texto, full_path, numero) for numero, texto in paginas if texto.strip()])
+    conn.execute('''INSERT OR REPLACE INTO indexed_files (path, name, project, mtime, size, pages, error)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                 (full_path, os.path.basename(full_path), projeto_do_arquivo(full_path, base_dir),
+                  stat.st_mtime, stat.st_size, len(paginas), erro))
+
+
+def indexar_arquivo(conn, full_path, base_dir, commit=True):
+    # Reindexa apenas se o arquivo mudou desde a última extração
+    if not arquivo_desatualizado(conn, full_path):
+        return False, None
+
+    paginas, erro = [], None
+    if full_path.lower().endswith(EXTENSOES_TEXTO):
+        try:
+            paginas = extrair_texto_pdf(full_path)
+        except Exception as e:
+            erro = str(e)
+    gravar_paginas(conn, full_path, base_dir, paginas, erro)
+    if commit:
+        conn.commit()
+    return True, erro
+
+
+def mover_no_indice(conn, origem, destino, commit=True):
+    conn.execute("UPDATE indexed_files SET path=?, name=? WHERE path=?",
+                 (destino, os.path.basename(destino), origem))
+    conn.execute("UPDATE pages_fts SET path=? WHERE path=?", (destino, origem))
+    if commit:
+        conn.commit()
+
+
+def remover_do_indice(conn, full_path, commit=True):
+    conn.execute("DELETE FROM pages_fts WHERE path=?", (full_path,))
+    conn.execute("DELETE FROM indexed_files WHERE path=?", (full_path,))
+    if commit:
+        conn.commit()
+
+
+def arquivo_desatualizado(conn, full_path):
+    stat = os.stat(full_path)
+    atual = conn.execute("SELECT mtime, size FROM indexed_files WHERE path=?", (full_path,)).fetchone()
+    return not atual or atual[0] != stat.st_mtime or atual[1] != stat.st_size
+
+
+def comparar_com_disco(conn, base_dir):
+    # Retorna (arquivos novos/alterados, caminhos indexados que não existem mais)
+    vistos = set()
+    alterados = []
+    for root, dirs, files in os.walk(base_dir):
+        for file in files:
+            full_path = os.path.join(root, file)
+            vistos.add(full_path)
+            if arquivo_desatualizado(conn, full_path):
+                alterados.append(full_path)
+    removidos = [p for (p,) in conn.execute("SELECT path FROM indexed_files").fetchall() if p not in vistos]
+    return alterados, removidos
+
+
+def sincronizar_indice(conn, base_dir):
+    # Varredura completa e síncrona (uso fora do Streamlit)
+    alterados, removidos = comparar_com_disco(conn, base_dir)
+    erros = []
+    for full_path in alterados:
+        _, erro = indexar_arquivo(conn, full_path, base_dir, commit=False)
+        if erro:
+            erros.append((full_path, erro))
+        conn.commit()
+    for p in removidos:
+        remover_do_indice(conn, p, commit=False)
+    conn.commit()
+    return len(alterados), len(removidos), erros
+
+
+# Linguagem de consulta: termos livres ("frases" entre aspas) e filtros
+# campo:valor. proj/disc/fase comparam sem diferenciar maiúsculas; rev e
+# ver aceitam comparação numérica (rev:>=r2, ver:<3).
+CAMPOS_CONSULTA = {"proj": "project", "projeto": "project", "disc": "discipline", "fase": "phase",
+                   "rev": "revisao", "ver": "versao"}
+PADRAO_TOKEN = re.compile(r'(\w+):("[^"]*"|\S+)|"([^"]*)"|(\S+)')
+PADRAO_COMPARACAO = re.compile(r"(>=|<=|>|<|=)?[rRvV]?(\d+)$")
+# Similaridade mínima (difflib) para um termo casar com uma palavra do nome
+LIMIAR_APROXIMADO = 0.75
+CANDIDATOS_APROXIMADOS = 500
+
+Consulta = namedtuple("Consulta", "termos filtros")
+
+
+def interpretar_consulta(texto):
+    termos, filtros = [], []
+    for m in PADRAO_TOKEN.finditer(texto):
+        campo, valor, frase, palavra = m.groups()
+        coluna = CAMPOS_CONSULTA.get(campo.lower()) if campo else None
+        if coluna:
+            valor = valor.strip('"')
+            if coluna in ("revisao", "versao"):
+                comparacao = PADRAO_COMPARACAO.match(valor)
+                if comparacao:
+                    filtros.append((coluna, comparacao.group(1) or "=", int(comparacao.group(2))))
+                    continue
+            elif valor:
+                filtros.append((coluna, "=", valor))
+                continue
+        termo = frase if frase is not None else (palavra or m.group(0))
+        if termo.strip():
+            termos.append(termo.strip())
+    return Consulta(termos, filtros)
+
+
+def montar_consulta_fts(keyword):
+    # Cada termo vira um prefixo entre aspas: "termo"* (todos obrigatórios)
+    termos = keyword.split() if isinstance(keyword, str) else keyword
+    termos = [t.replace('"', '""') for t in termos]
+    return " ".join(f'"{t}"*' for t in termos if t)
+
+
+def trigramas(termo):
+    termo = termo.lower()
+    return {termo[i:i + 3] for i in range(len(termo) - 2)}
+
+
+def similaridade(termo, nome):
+    # 1.0 para substring; senão a melhor razão de difflib contra as palavras do nome
+    termo, nome = termo.lower(), nome.lower()
+    if termo in nome:
+        return 1.0
+    palavras = [p for p in re.split(r"[\W_]+", nome) if p]
+    return max((SequenceMatcher(None, termo, p).ratio() for p in palavras), default=0.0)
+
+
+class BuscaIncremental:
+    # Gera os resultados à medida que são encontrados: nomes (trigramas),
+    # conteúdo indexado (bm25) e nomes aproximados. Para ao atingir o
+    # limite, o orçamento de tempo ou quando cancelado(). enfileirar(caminhos)
+    # recebe os PDFs ainda fora do índice e retorna quantos ficam pendentes.
+    def __init__(self, conn, keyword, projects, limite=200, orcamento=None, cancelado=None,
+                 paginas_por_arquivo=5, incluir_frios=False, enfileirar=None):
+        self.conn = conn
+        # Revisões no armazenamento frio só entram quando pedidas (apenas pelo nome)
+        self.incluir_frios = incluir_frios
+        self.keyword = keyword.strip()
+        self.consulta = interpretar_consulta(self.keyword)
+        self.projects = list(projects)
+        for coluna, _, valor in self.consulta.filtros:
+            if coluna == "project":
+                self.projects = [p for p in self.projects if p.lower() == valor.lower()]
+        self.limite = limite
+        self.orcamento = orcamento
+        self.cancelado = cancelado
+        self.paginas_por_arquivo = paginas_por_arquivo
+        self.enfileirar = enfileirar
+        self.motivo_parada = None
+        self.encontrados = 0
+        self.pendentes = 0
+
+    def _deve_parar(self, inicio):
+        if self.encontrados >= self.limite:
+            self.motivo_parada = "limite"
+        elif self.orcamento is not None and time.monotonic() - inicio > self.orcamento:
+            self.motivo_parada = "tempo"
+        elif self.cancelado and self.cancelado():
+            self.motivo_parada = "cancelada"
+        return self.motivo_parada is not None
+
+    def __iter__(self):
+        if not (self.consulta.termos or self.consulta.filtros) or not self.projects:
+            return
+        inicio = time.monotonic()
+        vistos = set()
+        if self.consulta.termos:
+            if self.enfileirar:
+                self._nao_indexados()
+            fontes = (self._por_nome, self._por_conteudo, self._aproximados)
+        else:
+            fontes = (self._por_filtros,)
+        for fonte in fontes:
+            for resultado in fonte(vistos, inicio):
+                if resultado["path"] in vistos:
+                    continue
+                vistos.add(resultado["path"])
+                self.encontrados += 1
+                yield resultado
+                if self._deve_parar(inicio):
+                    return
+            if self._deve_parar(inicio):
+                return
+
+    def _filtros(self):
+        # Cláusulas sobre documents (alias d) para projetos permitidos e filtros
+        condicoes = [f"d.project IN ({','.join('?' for _ in self.projects)})"]
+        parametros = list(self.projects)
+        if not self.incluir_frios:
+            condicoes.append("d.cold = 0")
+        for coluna, operador, valor in self.consulta.filtros:
+            if coluna in ("revisao", "versao"):
+                condicoes.append(f"CAST(substr(d.{coluna}, 2) AS INTEGER) {operador} ?")
+                parametros.append(valor)
+            elif coluna != "project":
+                condicoes.append(f"d.{coluna} = ? COLLATE NOCASE")
+                parametros.append(valor)
+        return " AND ".join(condicoes), parametros
+
+    def _resultado(self, path, nome=True, paginas=(), aproximado=False):
+        return {"path": path, "nome": nome, "paginas": list(paginas), "aproximado": aproximado}
+
+    def _por_filtros(self, vistos, inicio):
+        filtros, parametros = self._filtros()
+        cursor = self.conn.execute(f'''SELECT d.path FROM documents d WHERE {filtros}
+                                      ORDER BY d.archived, d.project, d.discipline, d.phase, d.name
+                                      LIMIT ?''', (*parametros, self.limite))
+        for (path,) in cursor:
+            yield self._resultado(path, nome=False)
+
+    def _por_nome(self, vistos, inicio):
+        filtros, parametros = self._filtros()
+        # Termos com 3+ caracteres usam o índice de trigramas; os curtos, LIKE
+        longos = [t for t in self.consulta.termos if len(t) >= 3]
+        for termo in self.consulta.termos:
+            if len(termo) < 3:
+                filtros += " AND d.name LIKE ? ESCAPE '\\'"
+                parametros.append("%" + termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if longos:
+            consulta = " ".join('"' + t.replace('"', '""') + '"' for t in longos)
+            cursor = self.conn.execute(f'''SELECT d.path FROM names_fts n JOIN documents d ON d.id = n.rowid
+                                          WHERE names_fts MATCH ? AND {filtros}
+                                          ORDER BY d.archived, n.rank''', (consulta, *parametros))
+        else:
+            cursor = self.conn.execute(f'''SELECT d.path FROM documents d WHERE {filtros}
+                                          ORDER BY d.archived, d.name''', parametros)
+        for (path,) in cursor:
+            yield self._resultado(path)
+
+    def _por_conteudo(self, vistos, inicio):
+        consulta = montar_consulta_fts(self.consulta.termos)
+        if not consulta:
+            return
+        filtros, parametros = self._filtros()
+        # bm25 não pode ser agregado: as páginas vêm por relevância e a primeira
+        # ocorrência de cada arquivo define a sua posição. O trecho é gerado
+        # depois, por rowid: filtrar por path (UNINDEXED) varreria o índice todo.
+        # A leitura é feita em blocos, para respeitar o orçamento e o
+        # cancelamento antes de juntar as páginas de todos os arquivos.
+        faltam = self.limite - self.encontrados
+        bloco = max(1, faltam) * self.paginas_por_arquivo
+        deslocamento = 0
+        por_arquivo = {}
+        while len(por_arquivo) < faltam:
+            linhas = self.conn.execute(f'''SELECT m.rowid, m.path, m.page FROM pages_fts m
+                                          JOIN documents d ON d.path = m.path
+                                          WHERE pages_fts MATCH ? AND {filtros}
+                                          ORDER BY m.rank LIMIT ? OFFSET ?''',
+                                       (consulta, *parametros, bloco, deslocamento)).fetchall()
+            for rowid, path, page in linhas:
+                if path in vistos:
+                    continue
+                rowids = por_arquivo.setdefault(path, [])
+                if len(rowids) < self.paginas_por_arquivo:
+                    rowids.append(rowid)
+            if self._deve_parar(inicio) or len(linhas) < bloco:
+                break
+            deslocamento += bloco
+        if self.motivo_parada:
+            return
+        for path, rowids in por_arquivo.items():
+            if path in vistos:
+                continue
+            paginas = [self.conn.execute('''SELECT page, snippet(pages_fts, 0, '**', '**', '…', 12) FROM pages_fts
+                                            WHERE pages_fts MATCH ? AND rowid = ?''', (consulta, rowid)).fetchone()
+                       for rowid in rowids]
+            yield self._resultado(path, nome=False, paginas=sorted(p for p in paginas if p))
+
+    def _aproximados(self, vistos, inicio):
+        # Tolerância a erros de digitação: candidatos que compartilham algum
+        # trigrama com os termos, reordenados pela similaridade de cada termo
+        todos = set().union(*(trigramas(t) for t in self.consulta.termos))
+        if not todos:
+            return
+        filtros, parametros = self._filtros()
+        consulta = " OR ".join('"' + t.replace('"', '""') + '"' for t in sorted(todos))
+        candidatos = self.conn.execute(f'''SELECT d.path, d.name FROM names_fts n JOIN documents d ON d.id = n.rowid
+                                           WHERE names_fts MATCH ? AND {filtros}
+                                           ORDER BY n.rank LIMIT ?''',
+                                        (consulta, *parametros, CANDIDATOS_APROXIMADOS)).fetchall()
+        pontuados = []
+        for path, name in candidatos:
+            if path in vistos:
+                continue
+            nota = min(similaridade(t, name) for t in self.consulta.termos)
+            if nota >= LIMIAR_APROXIMADO:
+                pontuados.append((-nota, name, path))
+        for _, _, path in sorted(pontuados):
+            yield self._resultado(path, aproximado=True)
+
+    def _nao_indexados(self):
+        # Repositório recém-importado ou com fila pendente: PDFs do catálogo
+        # ainda fora do índice não são abertos aqui (um PDF grande passaria do
+        # orçamento); vão para a fila e entram nas buscas seguintes.
+        filtros, parametros = self._filtros()
+        try:
+            linhas = self.conn.execute(f'''SELECT d.path, d.name FROM documents d
+                                           LEFT JOIN indexed_files f ON f.path = d.path
+                                           WHERE f.path IS NULL AND {filtros}''', parametros).fetchall()
+        except sqlite3.OperationalError:
+            return
+        caminhos = [path for path, name in linhas if name.lower().endswith(EXTENSOES_TEXTO)]
+        if caminhos:
+            self.pendentes = self.enfileirar(caminhos)
+
+
+def buscar(conn, keyword, projects, limit=200):
+    return list(BuscaIncremental(conn, keyword, projects, limite=limit))
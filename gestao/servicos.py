@@ -0,0 +1,435 @@
+import os
+import sys
+import argparse
+
+from gestao import db, catalog, search, jobs, lote, storage, audit, migrations, metrics, scanner, comentarios, frio
+from gestao.auth import CacheAutorizacao
+from gestao.thumbs import CacheMiniaturas
+from gestao.fileserver import ServidorArquivos
+from gestao.revisions import IndiceRevisoes
+
+# Camada de serviços: reúne o estado do processo (pool de conexões, esquema,
+# caches, fila e servidor de arquivos) e as operações do domínio. O app
+# Streamlit cria uma instância por processo (st.cache_resource) e só desenha;
+# a mesma instância atende a CLI e rotinas em lote, sem importar Streamlit.
+
+DB_PATH = "document_manager.db"
+BASE_DIR = "uploads"
+# Repositório de conteúdo (deduplicação por SHA-256); mesmo volume de BASE_DIR
+BLOBS_DIR = "blobs"
+DISCIPLINAS_PADRAO = ["GES", "PRO", "MEC", "MET", "CIV", "ELE", "AEI"]
+FASES_PADRAO = ["FEL1", "FEL2", "FEL3", "Executivo"]
+PERMISSOES = ["upload", "download", "view"]
+PERMISSOES_PADRAO = "upload,view"
+PASTA_REVISOES = catalog.PASTA_REVISOES
+DIAS_FRIO_PADRAO = frio.DIAS_PADRAO
+MANTER_FRIO_PADRAO = frio.MANTER_PADRAO
+
+
+class Servicos:
+    def __init__(self, db_path=DB_PATH, base_dir=BASE_DIR, blobs_dir=BLOBS_DIR, frio_destino=frio.DESTINO_PADRAO):
+        self.db_path = db_path
+        self.base_dir = base_dir
+        self.blobs_dir = blobs_dir
+        self.frio_destino = frio_destino
+        self._armazem_frio = None
+        db.configurar(db_path)
+        os.makedirs(base_dir, exist_ok=True)
+        conn = self.conexao()
+        # Esquema versionado (tabelas, índices, FTS, fila, catálogo)
+        migrations.migrar(conn)
+        self.indice_revisoes = IndiceRevisoes()
+        self.autorizacao = CacheAutorizacao()
+        # Miniaturas de páginas/imagens em disco, limitadas por tamanho (LRU)
+        self.miniaturas = CacheMiniaturas()
+        self.fila = jobs.FilaProcessamento(db_path, base_dir, self.miniaturas)
+        # Links assinados servidos em blocos (Range/ETag) em vez de base64 na página
+        # Link para uma revisão no armazenamento frio a traz de volta antes de servir
+        self.servidor_arquivos = ServidorArquivos(
+            base_dir, recuperar=lambda rel: self.recuperar_revisao(os.path.join(base_dir, *rel.split("/"))))
+        # Mudanças feitas direto no compartilhamento chegam ao catálogo e ao índice.
+        # Na primeira execução é a varredura inicial dele, em segundo plano, que
+        # popula o catálogo com o que já existe em disco.
+        self.observador = scanner.Observador(base_dir, self.sincronizar_disco)
+
+    def iniciar(self, fila=True, servidor_arquivos=True, observador=True):
+        # Threads de fundo: só o app (ou um worker dedicado) precisa delas
+        if fila:
+            self.fila.start()
+        if servidor_arquivos:
+            self.servidor_arquivos.start()
+        if observador:
+            self.observador.start()
+        return self
+
+    def conexao(self):
+        # Conexão da thread atual (cada rerun do Streamlit roda numa thread)
+        return db.get_connection()
+
+    def pasta_fase(self, project, discipline, phase):
+        path = os.path.join(self.base_dir, project, discipline, phase)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def registrar_acao(self, user, action, file, note=None):
+        log_entry = f"{file} ({note})" if note else file
+        project = search.projeto_do_arquivo(file, self.base_dir) if file.startswith(self.base_dir + os.sep) else None
+        # Gravado em lote pela thread de logs (commit em grupo)
+        db.gravador_logs().registrar(user, action, log_entry, project)
+
+    # Usuários
+
+    def autenticar(self, username, password):
+        conn = self.conexao()
+        return conn.execute("SELECT 1 FROM users WHERE username=? AND password=?",
+                            (username, password)).fetchone() is not None
+
+    def contexto(self, username):
+        return self.autorizacao.contexto(self.conexao(), username)
+
+    def criar_usuario(self, username, password, permissions=PERMISSOES_PADRAO):
+        conn = self.conexao()
+        if conn.execute("SELECT 1 FROM users WHERE username=?", (username,)).fetchone():
+            return False
+        conn.execute("INSERT INTO users (username, password, projects, permissions) VALUES (?, ?, ?, ?)",
+                     (username, password, '', permissions))
+        conn.commit()
+        self.autorizacao.invalidar(username)
+        return True
+
+    def excluir_usuario(self, username):
+        conn = self.conexao()
+        conn.execute("DELETE FROM users WHERE username=?", (username,))
+        conn.commit()
+        self.autorizacao.invalidar(username)
+
+    def atualizar_usuario(self, username, permissoes, projetos, nova_senha=None):
+        conn = self.conexao()
+        if nova_senha:
+            conn.execute("UPDATE users SET password=?, permissions=? WHERE username=?",
+                         (nova_senha, ','.join(permissoes), username))
+        else:
+            conn.execute("UPDATE users SET permissions=? WHERE username=?", (','.join(permissoes), username))
+        conn.execute("DELETE FROM user_projects WHERE username=?", (username,))
+        conn.executemany("INSERT INTO user_projects (username, project) VALUES (?, ?)",
+                         [(username, proj) for proj in projetos])
+        conn.commit()
+        self.autorizacao.invalidar(username)
+
+    def listar_usuarios(self, filtro=""):
+        # [(username, permissões, projetos)]
+        conn = self.conexao()
+        projetos_por_usuario = {}
+        for user, proj in conn.execute("SELECT username, project FROM user_projects ORDER BY project"):
+            projetos_por_usuario.setdefault(user, []).append(proj)
+        return [(user, permissoes.split(',') if permissoes else [], projetos_por_usuario.get(user, []))
+                for user, permissoes in conn.execute("SELECT username, permissions FROM users").fetchall()
+                if not filtro or filtro.lower() in user.lower()]
+
+    # Clientes e projetos
+
+    def listar_clientes(self):
+        return [r[0] for r in self.conexao().execute("SELECT name FROM clients")]
+
+    def adicionar_cliente(self, name):
+        conn = self.conexao()
+        if conn.execute("SELECT 1 FROM clients WHERE name=?", (name,)).fetchone():
+            return False
+        conn.execute("INSERT INTO clients (name) VALUES (?)", (name,))
+        conn.commit()
+        return True
+
+    def listar_projetos(self):
+        return self.autorizacao.projetos(self.conexao())
+
+    def adicionar_projeto(self, name, client):
+        conn = self.conexao()
+        if conn.execute("SELECT 1 FROM projects WHERE name=?", (name,)).fetchone():
+            return False
+        conn.execute("INSERT INTO projects (name, client) VALUES (?, ?)", (name, client))
+        conn.commit()
+        self.autorizacao.invalidar_projetos()
+        return True
+
+    def projetos_por_cliente(self, username):
+        projetos = {}
+        for cliente, proj in self.conexao().execute('''SELECT p.client, p.name
+                                                       FROM user_projects up JOIN projects p ON p.name = up.project
+                                                       WHERE up.username=? ORDER BY p.client, p.name''',
+                                                    (username,)):
+            projetos.setdefault(cliente, []).append(proj)
+        return projetos
+
+    # Catálogo (árvore de projetos)
+
+    def listar_disciplinas(self, project):
+        return catalog.listar_disciplinas(self.conexao(), project)
+
+    def listar_fases(self, project, discipline):
+        return catalog.listar_fases(self.conexao(), project, discipline)
+
+    def contar_arquivos(self, project, discipline, phase):
+        return catalog.contar_arquivos(self.conexao(), project, discipline, phase)
+
+    def listar_arquivos(self, project, discipline, phase, ordem="nome", limite=-1, offset=0):
+        return catalog.listar_arquivos(self.conexao(), project, discipline, phase, ordem, limite, offset)
+
+    def obter_documento(self, file_path):
+        # (id, name, revisao, versao, archived, sha256, cold) ou None
+        return catalog.obter_documento(self.conexao(), file_path)
+
+    def ultima_revisao(self, project, discipline, phase, nome_base):
+        # -1 se a família ainda não existe na fase
+        return self.indice_revisoes.familia(self.conexao(), project, discipline, phase, nome_base).ultima_revisao()
+
+    # Comentários
+
+    def salvar_comentario(self, file_path, username, comment, document_id=None):
+        conn = self.conexao()
+        if document_id is None:
+            doc = catalog.obter_documento(conn, file_path)
+            document_id = doc[0] if doc else None
+        comentarios.adicionar(conn, document_id, file_path, username, comment)
+        self.registrar_acao(username, "comentário", file_path)
+
+    def obter_comentarios(self, document_id, cursor=None, limite=comentarios.TAMANHO_PAGINA):
+        # Retorna ([(id, username, timestamp, comment)], cursor da próxima página)
+        return comentarios.consultar(self.conexao(), document_id, cursor, limite)
+
+    def resumo_comentarios(self, document_ids):
+        # {document_id: (total, autor, data e texto do último)} numa só consulta
+        return comentarios.resumo(self.conexao(), document_ids)
+
+    # Upload e busca
+
+    def planejar_envio(self, project, discipline, phase, nomes, confirmado=False):
+        return lote.planejar_lote(self.conexao(), self.indice_revisoes, project, discipline, phase, nomes,
+                                  self.base_dir, confirmado)
+
+    def enviar(self, username, project, discipline, phase, plano, fontes):
+        # Retorna [(destino, reaproveitado)]; OSError desfaz o lote inteiro
+        self.pasta_fase(project, discipline, phase)
+        gravados = lote.aplicar_lote(self.conexao(), plano, fontes, self.base_dir, self.blobs_dir)
+        for file_path, _ in gravados:
+            self.registrar_acao(username, "upload", file_path)
+        for nome_base in {nome_base for _, nome_base, _ in plano.arquivos}:
+            self.indice_revisoes.invalidar(project, discipline, phase, nome_base)
+        self.fila.notificar()
+        return gravados
+
+    def buscar(self, keyword, projects, limite=200, orcamento=None, cancelado=None, incluir_frios=False):
+        return search.BuscaIncremental(self.conexao(), keyword, projects, limite, orcamento, cancelado,
+                                       incluir_frios=incluir_frios, enfileirar=self.indexar_depois)
+
+    def miniatura(self, full_path, sha256, pagina=1):
+        # None enquanto a miniatura é gerada pela fila
+        return self.fila.miniatura(full_path, sha256, pagina)
+
+    def indexar_depois(self, caminhos):
+        # PDFs fora do índice achados pela busca: a extração fica com a fila,
+        # não com o rerun. Os que já falharam na fila não voltam a cada busca.
+        conn = self.conexao()
+        na_fila = {p: status for p, status in conn.execute(
+            "SELECT path, status FROM jobs WHERE status IN (?, ?, ?)", (jobs.PENDENTE, jobs.EXECUTANDO, jobs.ERRO))}
+        novos = [c for c in caminhos if c not in na_fila and os.path.isfile(c)]
+        for caminho in novos:
+            jobs.enfileirar(conn, caminho, commit=False)
+        conn.commit()
+        if novos:
+            self.fila.notificar()
+        return len(novos) + sum(1 for c in caminhos if na_fila.get(c) in (jobs.PENDENTE, jobs.EXECUTANDO))
+
+    # Manutenção
+
+    def reindexar(self):
+        conn = self.conexao()
+        alterados, removidos = search.comparar_com_disco(conn, self.base_dir)
+        for caminho in alterados:
+            jobs.enfileirar(conn, caminho, commit=False)
+        for caminho in removidos:
+            search.remover_do_indice(conn, caminho, commit=False)
+        conn.commit()
+        self.fila.notificar()
+        return len(alterados), len(removidos)
+
+    def sincronizar_disco(self, pastas=None, completo=False):
+        # Incremental: só relista as pastas alteradas desde o último retrato
+        conn = self.conexao()
+        with metrics.medir("scanner"):
+            mudancas = scanner.varrer(conn, self.base_dir, pastas, completo)
+            enfileirados, familias = scanner.aplicar(conn, self.base_dir, mudancas)
+        for familia in familias:
+            self.indice_revisoes.invalidar(*familia)
+        if enfileirados:
+            self.fila.notificar()
+        return mudancas
+
+    def reconciliar(self):
+        resultado = catalog.reconciliar(self.conexao(), self.base_dir)
+        self.indice_revisoes.invalidar()
+        return resultado
+
+    def armazem_frio(self):
+        # Criado no primeiro uso: o app sobe mesmo com o S3 indisponível
+        if self._armazem_frio is None:
+            self._armazem_frio = frio.armazem(self.frio_destino)
+        return self._armazem_frio
+
+    def congelar_revisoes(self, dias=frio.DIAS_PADRAO, manter=frio.MANTER_PADRAO, simular=False):
+        # Retorna (movidos, bytes originais, bytes comprimidos, erros); simular: só os candidatos
+        conn = self.conexao()
+        candidatos = frio.candidatos(conn, dias, manter)
+        if simular:
+            return len(candidatos), sum(c.size or 0 for c in candidatos), 0, []
+        frio.limpar_congelados(conn, self.blobs_dir)
+        with metrics.medir("frio.congelar"):
+            return frio.congelar(conn, self.armazem_frio(), candidatos, self.blobs_dir)
+
+    def recuperar_revisao(self, file_path):
+        # False se o documento não estiver no armazenamento frio
+        with metrics.medir("frio.recuperar"):
+            recuperado = frio.recuperar(self.conexao(), self.armazem_frio(), file_path, self.base_dir,
+                                        self.blobs_dir)
+        if recuperado:
+            self.fila.notificar()
+        return recuperado
+
+    def no_frio(self, file_path):
+        doc = catalog.obter_documento(self.conexao(), file_path)
+        return bool(doc and doc[6])
+
+    def resumo_frio(self):
+        return frio.resumo(self.conexao())
+
+    def coletar_blobs(self):
+        return storage.coletar_blobs_orfaos(self.conexao(), self.blobs_dir)
+
+    def resumo_fila(self):
+        # (pendentes, em execução, com erro)
+        fila = jobs.resumo_fila(self.conexao())
+        return fila.get(jobs.PENDENTE, 0), fila.get(jobs.EXECUTANDO, 0), fila.get(jobs.ERRO, 0)
+
+    def erros_indexacao(self, limite=20):
+        # [(path, erro)] dos PDFs cujo texto não pôde ser lido
+        return self.conexao().execute("SELECT path, error FROM indexed_files WHERE error IS NOT NULL LIMIT ?",
+                                      (limite,)).fetchall()
+
+    # Histórico (os registros ainda na thread de logs são gravados antes de cada leitura)
+
+    def consultar_logs(self, filtros=None, cursor=None):
+        db.gravador_logs().flush()
+        return audit.consultar(self.conexao(), filtros, cursor)
+
+    def valores_logs(self, campo):
+        db.gravador_logs().flush()
+        return audit.valores_distintos(self.conexao(), campo)
+
+    def contadores_logs(self, filtros=None):
+        db.gravador_logs().flush()
+        return audit.contadores(self.conexao(), filtros)
+
+    def arquivar_logs(self, manter_meses):
+        db.gravador_logs().flush()
+        return audit.arquivar_antigos(self.conexao(), manter_meses)
+
+    def arquivos_logs(self):
+        # [(mês, caminho, registros, data)] dos meses já arquivados
+        return audit.arquivos(self.conexao())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Operações do gerenciador de documentos sem a interface web")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--base", default=BASE_DIR)
+    parser.add_argument("--blobs", default=BLOBS_DIR)
+    parser.add_argument("--frio", default=frio.DESTINO_PADRAO, help="diretório ou s3://bucket/prefixo")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_buscar = sub.add_parser("buscar", help="pesquisa (mesma sintaxe da interface)")
+    p_buscar.add_argument("consulta")
+    p_buscar.add_argument("--usuario", help="restringe aos projetos do usuário (padrão: todos)")
+    p_buscar.add_argument("--limite", type=int, default=50)
+    p_enviar = sub.add_parser("enviar", help="envia arquivos para uma fase como um lote")
+    p_enviar.add_argument("projeto")
+    p_enviar.add_argument("disciplina")
+    p_enviar.add_argument("fase")
+    p_enviar.add_argument("arquivos", nargs="+")
+    p_enviar.add_argument("--usuario", default="cli")
+    p_enviar.add_argument("--confirmar", action="store_true", help="aceita nova versão da mesma revisão")
+    sub.add_parser("reindexar", help="extrai o texto dos arquivos novos ou alterados")
+    sub.add_parser("reconciliar", help="reconstrói o catálogo a partir do disco")
+    sub.add_parser("fila", help="situação da fila de processamento e PDFs com erro de leitura")
+    p_congelar = sub.add_parser("congelar", help="move revisões arquivadas antigas para o armazenamento frio")
+    p_congelar.add_argument("--dias", type=int, default=frio.DIAS_PADRAO)
+    p_congelar.add_argument("--manter", type=int, default=frio.MANTER_PADRAO,
+                            help="revisões arquivadas mais recentes de cada família que ficam no disco")
+    p_congelar.add_argument("--simular", action="store_true")
+    p_recuperar = sub.add_parser("recuperar", help="traz revisões do armazenamento frio de volta para o disco")
+    p_recuperar.add_argument("arquivos", nargs="+")
+    p_sincronizar = sub.add_parser("sincronizar", help="aplica as mudanças feitas direto em disco")
+    p_sincronizar.add_argument("--completo", action="store_true", help="relista todas as pastas")
+    args = parser.parse_args(argv)
+
+    servicos = Servicos(args.db, args.base, args.blobs, args.frio)
+    conn = servicos.conexao()
+    if args.comando in ("buscar", "enviar") and catalog.catalogo_vazio(conn):
+        # Sem o observador do app: cataloga o disco antes (o envio compara com as revisões existentes)
+        print("Catálogo vazio: catalogando os arquivos em disco...", file=sys.stderr)
+        servicos.sincronizar_disco()
+    if args.comando == "buscar":
+        projetos = servicos.contexto(args.usuario).projects if args.usuario else servicos.listar_projetos()
+        for resultado in servicos.buscar(args.consulta, projetos, args.limite):
+            print(resultado["path"])
+            for pagina, trecho in resultado["paginas"]:
+                print(f"    p.{pagina}: {' '.join(trecho.split())}")
+    elif args.comando == "enviar":
+        nomes = [os.path.basename(a) for a in args.arquivos]
+        plano = servicos.planejar_envio(args.projeto, args.disciplina, args.fase, nomes, args.confirmar)
+        for nome, motivo in plano.erros:
+            print(f"{nome}: {motivo}", file=sys.stderr)
+        if plano.erros:
+            return 1
+        fontes = {os.path.basename(a): open(a, "rb") for a in args.arquivos}
+        try:
+            gravados = servicos.enviar(args.usuario, args.projeto, args.disciplina, args.fase, plano, fontes)
+        finally:
+            for f in fontes.values():
+                f.close()
+        # Sem a fila do app rodando: indexa já, no próprio processo
+        for destino, _ in gravados:
+            search.indexar_arquivo(conn, destino, servicos.base_dir)
+        db.gravador_logs().flush()
+        print(f"{len(gravados)} arquivo(s) enviado(s), {len(plano.arquivar)} arquivado(s).")
+    elif args.comando == "reindexar":
+        alterados, removidos, erros = search.sincronizar_indice(conn, servicos.base_dir)
+        print(f"{alterados} indexado(s), {removidos} removido(s), {len(erros)} erro(s).")
+    elif args.comando == "reconciliar":
+        total, removidos = servicos.reconciliar()
+        print(f"{total} documento(s) catalogado(s), {removidos} removido(s).")
+    elif args.comando == "fila":
+        pendentes, executando, com_erro = servicos.resumo_fila()
+        print(f"{pendentes} pendente(s), {executando} em execução, {com_erro} com erro.")
+        for caminho, erro in servicos.erros_indexacao(limite=-1):
+            print(f"{caminho}: {erro}")
+    elif args.comando == "congelar":
+        movidos, originais, comprimidos, erros = servicos.congelar_revisoes(args.dias, args.manter, args.simular)
+        if args.simular:
+            print(f"{movidos} revisão(ões) a mover, {originais / 1e6:.1f} MB.")
+        else:
+            print(f"{movidos} revisão(ões) movida(s) para {servicos.frio_destino}: {originais / 1e6:.1f} MB "
+                  f"liberados, {comprimidos / 1e6:.1f} MB comprimidos.")
+        for caminho, erro in erros:
+            print(f"{caminho}: {erro}", file=sys.stderr)
+        return 1 if erros else 0
+    elif args.comando == "recuperar":
+        for caminho in args.arquivos:
+            print(f"{caminho}: {'recuperado' if servicos.recuperar_revisao(caminho) else 'não está no armazenamento frio'}")
+    elif args.comando == "sincronizar":
+        # O texto dos arquivos novos fica na fila (processada pelo app ou por "reindexar")
+        mudancas = servicos.sincronizar_disco(completo=args.completo)
+        print(f"{len(mudancas.adicionados)} novo(s), {len(mudancas.alterados)} alterado(s), "
+              f"{len(mudancas.removidos)} removido(s); {mudancas.pastas_lidas}/{mudancas.pastas_total} "
+              f"pasta(s) relistada(s).")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
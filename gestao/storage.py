@@ -0,0 +1,95 @@
+import os
+import shutil
+import hashlib
+import tempfile
+
+from gestao import catalog
+
+# Gravação de uploads em blocos com SHA-256 calculado durante a cópia e um
+# repositório endereçado por conteúdo (blobs/ab/cd/<sha256>). O arquivo em
+# uploads/ é um hard link para o blob, então bytes idênticos (a mesma folha
+# enviada como nova versão ou em outro projeto) ocupam disco uma única vez.
+# O diretório de blobs precisa estar no mesmo volume de uploads/.
+
+BLOCO_UPLOAD = 1024 * 1024
+
+# O mkstemp cria com 0600; o blob vira o arquivo publicado (hard link), que
+# precisa da permissão de um open() comum para as outras contas e o Samba.
+# A umask só pode ser lida trocando-a, então isso é feito uma vez, na carga.
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+MODO_ARQUIVO = 0o666 & ~_UMASK
+
+
+def caminho_blob(blobs_dir, sha256):
+    return os.path.join(blobs_dir, sha256[:2], sha256[2:4], sha256)
+
+
+def _temporario(diretorio, sufixo=".parcial"):
+    os.makedirs(diretorio, exist_ok=True)
+    fd, caminho = tempfile.mkstemp(dir=diretorio, suffix=sufixo)
+    os.close(fd)
+    os.chmod(caminho, MODO_ARQUIVO)
+    return caminho
+
+
+def publicar(blob, destino):
+    # Cria o destino atomicamente: link (ou cópia) temporário + os.replace
+    temporario = _temporario(os.path.dirname(destino) or ".")
+    os.remove(temporario)
+    try:
+        os.link(blob, temporario)
+    except OSError:
+        # Volume sem suporte a hard link: cai para cópia comum
+        shutil.copyfile(blob, temporario)
+    try:
+        os.replace(temporario, destino)
+    except OSError:
+        os.remove(temporario)
+        raise
+
+
+def guardar_blob(fonte, blobs_dir, bloco=BLOCO_UPLOAD):
+    # Retorna (sha256, tamanho, reaproveitado, blob); nada aparece em uploads/
+    temporario = _temporario(os.path.join(blobs_dir, "tmp"))
+    h = hashlib.sha256()
+    tamanho = 0
+    try:
+        with open(temporario, "wb") as f:
+            for pedaco in iter(lambda: fonte.read(bloco), b""):
+                h.update(pedaco)
+                f.write(pedaco)
+                tamanho += len(pedaco)
+            f.flush()
+            os.fsync(f.fileno())
+        sha256 = h.hexdigest()
+        blob = caminho_blob(blobs_dir, sha256)
+        reaproveitado = os.path.exists(blob)
+        if reaproveitado:
+            os.remove(temporario)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(temporario, blob)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    return sha256, tamanho, reaproveitado, blob
+
+
+def coletar_blobs_orfaos(conn, blobs_dir):
+    # Órfão: nenhum documento do catálogo tem o conteúdo e nenhum arquivo o
+    # usa. Só o número de links não basta: onde publicar() caiu para a cópia,
+    # o blob fica com um link mesmo estando referenciado.
+    removidos, liberados = 0, 0
+    for root, dirs, files in os.walk(blobs_dir):
+        if os.path.basename(root) == "tmp":
+            continue
+        for file in files:
+            caminho = os.path.join(root, file)
+            stat = os.stat(caminho)
+            if stat.st_nlink == 1 and not catalog.conteudo_em_uso(conn, file):
+                os.remove(caminho)
+                removidos += 1
+                liberados += stat.st_size
+    return removidos, liberados
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import threading
+
+# Cache em disco, limitado por tamanho (LRU pela data de modificação, que é
+# renovada a cada acerto), de miniaturas de páginas de PDF e prévias reduzidas
+# de imagens. A chave é o SHA-256 do conteúdo + página + largura, então
+# versões com os mesmos bytes compartilham a miniatura. A renderização roda
+# nos processos da fila (jobs.FilaProcessamento), nunca na thread da página.
+
+EXTENSOES_MINIATURA = (".pdf", ".jpg", ".jpeg", ".png")
+LARGURA_PADRAO = 256
+
+
+def chave_miniatura(sha256, pagina=1, largura=LARGURA_PADRAO):
+    return f"{sha256}-p{pagina}-w{largura}"
+
+
+def renderizar(full_path, pagina=1, largura=LARGURA_PADRAO):
+    # PyMuPDF abre imagens como documentos de uma página: o mesmo caminho
+    # serve para PDFs e fotos. Retorna (bytes, extensão).
+    import fitz
+    doc = fitz.open(full_path)
+    try:
+        page = doc[min(max(pagina, 1), doc.page_count) - 1]
+        escala = largura / max(page.rect.width, 1)
+        if not full_path.lower().endswith(".pdf"):
+            # Não amplia imagens menores que a miniatura
+            escala = min(escala, 1.0)
+        pix = page.get_pixmap(matrix=fitz.Matrix(escala, escala), alpha=False)
+        try:
+            return pix.tobytes("jpg", jpg_quality=75), ".jpg"
+        except (ValueError, TypeError):
+            # PyMuPDF antigo sem saída JPEG
+            return pix.tobytes("png"), ".png"
+    finally:
+        doc.close()
+
+
+class CacheMiniaturas:
+    def __init__(self, diretorio="cache/miniaturas", limite_bytes=None):
+        self.diretorio = diretorio
+        self.limite_bytes = limite_bytes or int(os.environ.get("GESTAO_MINIATURAS_MB", 512)) * 1024 * 1024
+        self._trava = threading.Lock()
+        self._tamanho = None
+
+    def _caminhos(self, chave):
+        return [os.path.join(self.diretorio, chave[:2], chave + ext) for ext in (".jpg", ".png")]
+
+    def obter(self, sha256, pagina=1, largura=LARGURA_PADRAO):
+        # Só consulta o cache: retorna o caminho da miniatura ou None
+        for caminho in self._caminhos(chave_miniatura(sha256, pagina, largura)):
+            try:
+                os.utime(caminho)
+                return caminho
+            except FileNotFoundError:
+                continue
+        return None
+
+    def guardar(self, sha256, pagina, largura, dados, ext):
+        chave = chave_miniatura(sha256, pagina, largura)
+        destino = os.path.join(self.diretorio, chave[:2], chave + ext)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".parcial")
+        with os.fdopen(fd, "wb") as f:
+            f.write(dados)
+        os.replace(temporario, destino)
+        with self._trava:
+            if self._tamanho is not None:
+                self._tamanho += len(dados)
+        self.podar()
+        return destino
+
+    def _listar(self):
+        itens = []
+        for root, dirs, files in os.walk(self.diretorio):
+            for file in files:
+                if file.endswith(".parcial"):
+                    continue
+                caminho = os.path.join(root, file)
+                try:
+                    stat = os.stat(caminho)
+                except FileNotFoundError:
+                    continue
+                itens.append((stat.st_mtime, stat.st_size, caminho))
+        return itens
+
+    def podar(self):
+        with self._trava:
+            if self._tamanho is None:
+                self._tamanho = sum(tamanho for _, tamanho, _ in self._listar())
+            if self._tamanho <= self.limite_bytes:
+                return 0
+            # Remove as menos usadas até ficar em 90% do limite
+            removidos = 0
+            for _, tamanho, caminho in sorted(self._listar()):
+                if self._tamanho <= self.limite_bytes * 0.9:
+                    break
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    pass
+                self._tamanho -= tamanho
+                removidos += 1
+            return removidos
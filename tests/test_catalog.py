@@ -0,0 +1,21 @@
+import os
+
+from gestao import db, catalog, migrations
+
+
+def test_arvore_omite_fase_so_com_revisoes_arquivadas(tmp_path):
+    base_dir = str(tmp_path / "uploads")
+    conn = db.conectar(str(tmp_path / "gestao.db"))
+    migrations.migrar(conn)
+    for pasta, nome in ((("MEC", "FEL1"), "DOC-A r1v1.pdf"),
+                        (("MEC", "FEL2", catalog.PASTA_REVISOES, "DOC-B"), "DOC-B r0v1.pdf"),
+                        (("CIV", "FEL1", catalog.PASTA_REVISOES, "DOC-C"), "DOC-C r0v1.pdf")):
+        caminho = os.path.join(base_dir, "P1", *pasta, nome)
+        os.makedirs(os.path.dirname(caminho))
+        with open(caminho, "wb") as f:
+            f.write(nome.encode())
+        catalog.registrar_documento(conn, caminho, base_dir)
+
+    assert catalog.listar_disciplinas(conn, "P1") == ["MEC"]
+    assert catalog.listar_fases(conn, "P1", "MEC") == ["FEL1"]
+    conn.close()
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import types
+import sqlite3
+
+from gestao import db, jobs, migrations
+
+
+def test_pool_nao_reimporta_o_script_do_app(tmp_path, monkeypatch):
+    # Como sob "streamlit run": __main__ aponta para o script do app
+    marca = tmp_path / "importado"
+    script = tmp_path / "app.py"
+    script.write_text(f"open({str(marca)!r}, 'w').close()\n")
+    app = types.ModuleType("__main__")
+    app.__file__ = str(script)
+    monkeypatch.setitem(sys.modules, "__main__", app)
+
+    fila = jobs.FilaProcessamento(str(tmp_path / "gestao.db"), str(tmp_path), max_workers=2)
+    pool = fila._novo_pool()
+    try:
+        pids = {pool.submit(os.getpid).result(timeout=60) for _ in range(4)}
+    finally:
+        pool.shutdown()
+    assert os.getpid() not in pids
+    assert not marca.exists()
+    assert sys.modules["__main__"] is app
+
+
+def test_fila_sobrevive_a_erro_no_ciclo(tmp_path, monkeypatch):
+    caminho = tmp_path / "DOC-A r0v1.dwg"
+    caminho.write_bytes(b"dwg")
+    db_path = str(tmp_path / "gestao.db")
+    conn = db.conectar(db_path)
+    migrations.migrar(conn)
+    job_id = jobs.enfileirar(conn, str(caminho))
+
+    fila = jobs.FilaProcessamento(db_path, str(tmp_path), max_workers=1, intervalo=0.05)
+    reservar = fila._reservar
+    falhas = []
+
+    def reservar_com_falha(conn, quantidade):
+        if not falhas:
+            falhas.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return reservar(conn, quantidade)
+
+    monkeypatch.setattr(fila, "_reservar", reservar_com_falha)
+    fila.start()
+    try:
+        limite = time.monotonic() + 60
+        while time.monotonic() < limite:
+            status = conn.execute("SELECT status FROM jobs WHERE id=?", (job_id,)).fetchone()[0]
+            if status == jobs.CONCLUIDO:
+                break
+            time.sleep(0.1)
+        assert falhas
+        assert status == jobs.CONCLUIDO
+        assert fila._thread.is_alive()
+    finally:
+        fila.stop()
+        conn.close()
@@ -0,0 +1,43 @@
+import io
+import os
+
+import pytest
+
+from gestao import db, catalog, lote, migrations, storage
+from gestao.revisions import IndiceRevisoes
+
+
+def test_lote_desfeito_nao_deixa_rastro(tmp_path, monkeypatch):
+    base_dir = str(tmp_path / "uploads")
+    pasta = os.path.join(base_dir, "P1", "MEC", "FEL1")
+    os.makedirs(pasta)
+    anterior = os.path.join(pasta, "DOC-A r0v1.pdf")
+    with open(anterior, "wb") as f:
+        f.write(b"r0")
+    conn = db.conectar(str(tmp_path / "gestao.db"))
+    migrations.migrar(conn)
+    catalog.registrar_documento(conn, anterior, base_dir)
+
+    nomes = ["DOC-A r1v1.pdf", "DOC-B r0v1.pdf"]
+    plano = lote.planejar_lote(conn, IndiceRevisoes(), "P1", "MEC", "FEL1", nomes, base_dir)
+    assert not plano.erros and plano.arquivar
+
+    # A segunda publicação falha depois de a primeira (e o arquivamento) já estarem em disco
+    publicar = storage.publicar
+    publicacoes = []
+
+    def publicar_com_falha(blob, destino):
+        publicacoes.append(destino)
+        if len(publicacoes) == 2:
+            raise OSError("disco cheio")
+        publicar(blob, destino)
+
+    monkeypatch.setattr(storage, "publicar", publicar_com_falha)
+    fontes = {nome: io.BytesIO(nome.encode()) for nome in nomes}
+    with pytest.raises(OSError):
+        lote.aplicar_lote(conn, plano, fontes, base_dir, str(tmp_path / "blobs"))
+
+    assert sorted(os.listdir(pasta)) == ["DOC-A r0v1.pdf"]
+    assert conn.execute("SELECT path, archived FROM documents").fetchall() == [(anterior, 0)]
+    assert conn.execute("SELECT COUNT(*) FROM jobs").fetchone() == (0,)
+    conn.close()
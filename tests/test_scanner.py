@@ -0,0 +1,55 @@
+import os
+import time
+import threading
+
+from gestao import db, migrations, scanner
+
+
+def _arquivo(base_dir):
+    pasta = os.path.join(base_dir, "P1", "MEC", "FEL1")
+    os.makedirs(pasta)
+    caminho = os.path.join(pasta, "DOC-A r0v1.pdf")
+    with open(caminho, "wb") as f:
+        f.write(b"primeira")
+    return caminho
+
+
+def test_observador_sem_eventos_detecta_sobrescrita(tmp_path):
+    base_dir = str(tmp_path / "uploads")
+    caminho = _arquivo(base_dir)
+    db_path = str(tmp_path / "gestao.db")
+    conn = db.conectar(db_path)
+    migrations.migrar(conn)
+    conn.close()
+
+    completas = threading.Event()
+
+    def sincronizar(pastas, completo=False):
+        # Thread do Observador: conexão própria, como Servicos.sincronizar_disco
+        conn = db.conectar(db_path)
+        try:
+            scanner.aplicar(conn, base_dir, scanner.varrer(conn, base_dir, pastas, completo))
+        finally:
+            conn.close()
+        if completo:
+            completas.set()
+
+    observador = scanner.Observador(base_dir, sincronizar, intervalo=0.05, eventos=False, completa_a_cada=3)
+    observador.start()
+    try:
+        time.sleep(0.2)
+        # Mesmo nome, sobrescrito no lugar: o mtime da pasta não muda
+        mtime_pasta = os.stat(os.path.dirname(caminho)).st_mtime_ns
+        with open(caminho, "wb") as f:
+            f.write(b"segunda versao")
+        assert os.stat(os.path.dirname(caminho)).st_mtime_ns == mtime_pasta
+        # Duas completas: a primeira pode ter começado antes da sobrescrita
+        for _ in range(2):
+            completas.clear()
+            assert completas.wait(5)
+    finally:
+        observador.stop()
+
+    conn = db.conectar(db_path)
+    assert conn.execute("SELECT size FROM documents WHERE path=?", (caminho,)).fetchone() == (len(b"segunda versao"),)
+    conn.close()
@@ -0,0 +1,48 @@
+import os
+
+from gestao import db, catalog, migrations, search
+
+
+def _repositorio(tmp_path, paginas_por_doc):
+    base_dir = str(tmp_path / "uploads")
+    pasta = os.path.join(base_dir, "P1", "MEC", "FEL1")
+    os.makedirs(pasta)
+    conn = db.conectar(str(tmp_path / "gestao.db"))
+    migrations.migrar(conn)
+    for nome, paginas in paginas_por_doc.items():
+        caminho = os.path.join(pasta, nome)
+        with open(caminho, "wb") as f:
+            f.write(nome.encode())
+        catalog.registrar_documento(conn, caminho, base_dir, commit=False)
+        search.gravar_paginas(conn, caminho, base_dir, list(enumerate(paginas, start=1)))
+    conn.commit()
+    return conn
+
+
+def test_conteudo_le_alem_do_primeiro_bloco(tmp_path):
+    # As páginas mais relevantes são todas do mesmo arquivo: o segundo só
+    # aparece depois do primeiro bloco de limite * paginas_por_arquivo linhas
+    conn = _repositorio(tmp_path, {
+        "DOC-A r0v1.pdf": ["bomba bomba bomba"] * 20,
+        "DOC-B r0v1.pdf": ["bomba e outras palavras que diluem o termo"],
+    })
+    busca = search.BuscaIncremental(conn, "bomba", ["P1"], limite=2, paginas_por_arquivo=2)
+    resultados = list(busca)
+    assert [os.path.basename(r["path"]) for r in resultados] == ["DOC-A r0v1.pdf", "DOC-B r0v1.pdf"]
+    assert len(resultados[0]["paginas"]) == 2
+    conn.close()
+
+
+def test_conteudo_respeita_cancelamento_durante_a_leitura(tmp_path):
+    conn = _repositorio(tmp_path, {f"DOC-{i} r0v1.pdf": ["bomba"] for i in range(10)})
+    # Não cancela entre a busca por nome e a por conteúdo, só na leitura do índice
+    chamadas = []
+
+    def cancelado():
+        chamadas.append(1)
+        return len(chamadas) > 1
+
+    busca = search.BuscaIncremental(conn, "bomba", ["P1"], cancelado=cancelado)
+    assert list(busca) == []
+    assert busca.motivo_parada == "cancelada"
+    conn.close()
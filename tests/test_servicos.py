@@ -0,0 +1,26 @@
+import os
+import time
+
+from gestao import catalog, servicos
+
+
+def test_primeira_execucao_cataloga_em_segundo_plano(tmp_path):
+    base_dir = str(tmp_path / "uploads")
+    pasta = os.path.join(base_dir, "P1", "MEC", "FEL1")
+    os.makedirs(pasta)
+    with open(os.path.join(pasta, "DOC-A r0v1.dwg"), "wb") as f:
+        f.write(b"dwg")
+
+    # O construtor (fábrica do st.cache_resource) não varre o disco
+    camada = servicos.Servicos(str(tmp_path / "gestao.db"), base_dir, str(tmp_path / "blobs"),
+                               str(tmp_path / "frio"))
+    assert catalog.catalogo_vazio(camada.conexao())
+
+    camada.iniciar(fila=False, servidor_arquivos=False)
+    try:
+        limite = time.monotonic() + 10
+        while catalog.catalogo_vazio(camada.conexao()) and time.monotonic() < limite:
+            time.sleep(0.05)
+    finally:
+        camada.observador.stop()
+    assert camada.listar_disciplinas("P1") == ["MEC"]
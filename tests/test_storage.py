@@ -0,0 +1,41 @@
+import io
+import os
+import stat
+
+from gestao import db, catalog, migrations, storage
+
+
+def test_publicado_com_permissao_da_umask(tmp_path):
+    blobs_dir = tmp_path / "blobs"
+    destino = tmp_path / "uploads" / "P9" / "MEC" / "FEL1" / "DOC-A r2v1.pdf"
+    destino.parent.mkdir(parents=True)
+    _, _, _, blob = storage.guardar_blob(io.BytesIO(b"%PDF-1.4 teste"), str(blobs_dir))
+    storage.publicar(blob, str(destino))
+
+    umask = os.umask(0)
+    os.umask(umask)
+    assert stat.S_IMODE(os.stat(destino).st_mode) == 0o666 & ~umask
+    assert destino.read_bytes() == b"%PDF-1.4 teste"
+
+
+def test_blob_publicado_por_copia_nao_e_orfao(tmp_path, monkeypatch):
+    base_dir = str(tmp_path / "uploads")
+    blobs_dir = str(tmp_path / "blobs")
+    destino = os.path.join(base_dir, "P9", "MEC", "FEL1", "DOC-A r2v1.pdf")
+    os.makedirs(os.path.dirname(destino))
+    conn = db.conectar(str(tmp_path / "gestao.db"))
+    migrations.migrar(conn)
+
+    # Volume sem hard link: publicar() cai para a cópia
+    def sem_link(origem, destino):
+        raise OSError("hard link não suportado")
+
+    monkeypatch.setattr(os, "link", sem_link)
+    sha256, _, _, blob = storage.guardar_blob(io.BytesIO(b"%PDF-1.4 copia"), blobs_dir)
+    storage.publicar(blob, destino)
+    catalog.registrar_documento(conn, destino, base_dir, sha256=sha256)
+    _, _, _, sobra = storage.guardar_blob(io.BytesIO(b"lote desfeito"), blobs_dir)
+
+    assert storage.coletar_blobs_orfaos(conn, blobs_dir) == (1, len(b"lote desfeito"))
+    assert os.path.exists(blob) and not os.path.exists(sobra)
+    conn.close()